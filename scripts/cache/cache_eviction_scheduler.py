@@ -10,6 +10,7 @@ import logging
 import json
 from datetime import datetime, timedelta
 from pathlib import Path
+from typing import Dict, Any
 from resourcespace_cache import ResourceSpaceCache
 
 # Configure logging
@@ -92,7 +93,7 @@ class CacheEvictionScheduler:
             # Get least recently accessed resources
             with self.cache._get_connection() as conn:
                 cursor = conn.execute("""
-                    SELECT r.resource_id, cf.file_size
+                    SELECT r.resource_id, cf.file_path, cf.file_size
                     FROM cached_resources r
                     LEFT JOIN cached_files cf ON r.resource_id = cf.resource_id
                     ORDER BY r.last_accessed ASC
@@ -111,6 +112,10 @@ class CacheEvictionScheduler:
                     conn.execute("DELETE FROM cached_resources WHERE resource_id = ?", 
                                (resource['resource_id'],))
                     
+                # Remove its file too, or the space is never actually freed
+                if resource['file_path'] and Path(resource['file_path']).exists():
+                    Path(resource['file_path']).unlink()
+                    
                 logger.info(f"Evicted old resource {resource['resource_id']}")
                 
         # Get final stats
@@ -180,6 +185,9 @@ class CacheEvictionScheduler:
         if integrity_issues > 0:
             logger.warning(f"Fixed {integrity_issues} file integrity issues")
             
+        # 4. Correct any drift in the size ledger
+        self.cache.reconcile_size_ledger()
+            
         logger.info("=== Cache maintenance complete ===")
         return eviction_results
 
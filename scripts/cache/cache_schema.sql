@@ -116,6 +116,65 @@ CREATE TABLE IF NOT EXISTS cached_files (
     FOREIGN KEY (resource_id) REFERENCES cached_resources(resource_id) ON DELETE CASCADE
 );
 
+-- Running totals kept in step with cached_files / cached_resources by triggers,
+-- so size and count checks never have to scan tables or walk the cache directory
+CREATE TABLE IF NOT EXISTS cache_ledger (
+    name TEXT PRIMARY KEY, -- 'files' or 'resources'
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    reconciled_at DATETIME
+);
+
+INSERT OR IGNORE INTO cache_ledger (name) VALUES ('files'), ('resources');
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_files_insert
+AFTER INSERT ON cached_files
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes + COALESCE(new.file_size, 0), item_count = item_count + 1
+    WHERE name = 'files';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_files_delete
+AFTER DELETE ON cached_files
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0), item_count = item_count - 1
+    WHERE name = 'files';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_files_update
+AFTER UPDATE OF file_size ON cached_files
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0) + COALESCE(new.file_size, 0)
+    WHERE name = 'files';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_resources_insert
+AFTER INSERT ON cached_resources
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes + COALESCE(new.file_size, 0), item_count = item_count + 1
+    WHERE name = 'resources';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_resources_delete
+AFTER DELETE ON cached_resources
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0), item_count = item_count - 1
+    WHERE name = 'resources';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_resources_update
+AFTER UPDATE OF file_size ON cached_resources
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0) + COALESCE(new.file_size, 0)
+    WHERE name = 'resources';
+END;
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_resources_type ON cached_resources(resource_type);
 CREATE INDEX IF NOT EXISTS idx_resources_modified ON cached_resources(modified);
@@ -16,6 +16,8 @@ from typing import Optional, Dict, List, Any, Tuple
 from contextlib import contextmanager
 import logging
 
+from connection_manager import SQLiteConnectionManager
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -28,7 +30,8 @@ class ResourceSpaceCache:
                  cache_dir: str = "cache", 
                  default_ttl_days: int = 7,
                  rs_api_url: Optional[str] = None,
-                 rs_api_key: Optional[str] = None):
+                 rs_api_key: Optional[str] = None,
+                 db_options: Optional[Dict[str, Any]] = None):
         """
         Initialize the cache manager
         
@@ -38,6 +41,8 @@ class ResourceSpaceCache:
             default_ttl_days: Default time-to-live for cached entries in days
             rs_api_url: ResourceSpace API URL
             rs_api_key: ResourceSpace API key
+            db_options: Optional SQLiteConnectionManager tuning (journal_mode, synchronous,
+                mmap_size_mb, cache_size_mb, busy_timeout_ms)
         """
         self.db_path = cache_db_path
         self.cache_dir = Path(cache_dir)
@@ -49,22 +54,25 @@ class ResourceSpaceCache:
         # Create cache directories
         self.originals_dir.mkdir(parents=True, exist_ok=True)
         
+        self.db = SQLiteConnectionManager(self.db_path, **(db_options or {}))
+        
         self._init_database()
         
     @contextmanager
     def _get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        try:
+        """Context manager for the shared writer connection (commits on exit)"""
+        with self.db.writer() as conn:
             yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+            
+    @contextmanager
+    def _get_read_connection(self):
+        """Context manager for this thread's long-lived reader connection"""
+        with self.db.reader() as conn:
+            yield conn
+            
+    def close(self):
+        """Close all pooled database connections"""
+        self.db.close()
             
     def _init_database(self):
         """Initialize the database with schema"""
@@ -75,6 +83,14 @@ class ResourceSpaceCache:
             with self._get_connection() as conn:
                 conn.executescript(schema)
                 logger.info(f"Database initialized at {self.db_path}")
+                
+            with self._get_read_connection() as conn:
+                needs_reconcile = conn.execute(
+                    "SELECT 1 FROM cache_ledger WHERE reconciled_at IS NULL"
+                ).fetchone()
+            if needs_reconcile:
+                # Ledger was just created for an existing database; seed it from the tables
+                self.reconcile_size_ledger()
         else:
             raise FileNotFoundError("cache_schema.sql not found")
             
@@ -88,7 +104,7 @@ class ResourceSpaceCache:
         Returns:
             Resource data dict or None if not cached/expired
         """
-        with self._get_connection() as conn:
+        with self._get_read_connection() as conn:
             # Check if resource exists and is not expired
             cursor = conn.execute("""
                 SELECT r.*, cs.expires_at
@@ -102,13 +118,6 @@ class ResourceSpaceCache:
             if not row:
                 return None
                 
-            # Update last accessed time
-            conn.execute("""
-                UPDATE cached_resources 
-                SET last_accessed = datetime('now')
-                WHERE resource_id = ?
-            """, (resource_id,))
-            
             # Build resource dict
             resource = dict(row)
             
@@ -166,7 +175,15 @@ class ResourceSpaceCache:
             else:
                 resource['cached_file'] = None
                 
-            return resource
+        # Update last accessed time
+        with self._get_connection() as conn:
+            conn.execute("""
+                UPDATE cached_resources 
+                SET last_accessed = datetime('now')
+                WHERE resource_id = ?
+            """, (resource_id,))
+            
+        return resource
             
     def store_resource(self, resource_data: Dict[str, Any], ttl_override: Optional[timedelta] = None):
         """
@@ -186,12 +203,27 @@ class ResourceSpaceCache:
         with self._get_connection() as conn:
             # Store main resource data
             conn.execute("""
-                INSERT OR REPLACE INTO cached_resources (
+                INSERT INTO cached_resources (
                     resource_id, resource_type, title, creation_date,
                     file_extension, preview_extension, thumb_width, thumb_height,
                     file_size, disk_usage, archive, access, created_by,
                     modified, cache_expires_at
                 ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(resource_id) DO UPDATE SET
+                    resource_type = excluded.resource_type,
+                    title = excluded.title,
+                    creation_date = excluded.creation_date,
+                    file_extension = excluded.file_extension,
+                    preview_extension = excluded.preview_extension,
+                    thumb_width = excluded.thumb_width,
+                    thumb_height = excluded.thumb_height,
+                    file_size = excluded.file_size,
+                    disk_usage = excluded.disk_usage,
+                    archive = excluded.archive,
+                    access = excluded.access,
+                    created_by = excluded.created_by,
+                    modified = excluded.modified,
+                    cache_expires_at = excluded.cache_expires_at
             """, (
                 resource_id,
                 resource_data.get('resource_type'),
@@ -212,9 +244,14 @@ class ResourceSpaceCache:
             
             # Store cache status
             conn.execute("""
-                INSERT OR REPLACE INTO cache_status (
+                INSERT INTO cache_status (
                     resource_id, last_fetched, expires_at, is_complete
                 ) VALUES (?, datetime('now'), ?, 1)
+                ON CONFLICT(resource_id) DO UPDATE SET
+                    last_fetched = excluded.last_fetched,
+                    expires_at = excluded.expires_at,
+                    fetch_count = fetch_count + 1,
+                    is_complete = 1
             """, (resource_id, expires_at))
             
             # Store metadata fields
@@ -292,7 +329,7 @@ class ResourceSpaceCache:
     
     def is_cached_file_valid(self, resource_id: int) -> bool:
         """Check if cached file exists and is not expired"""
-        with self._get_connection() as conn:
+        with self._get_read_connection() as conn:
             cursor = conn.execute("""
                 SELECT file_path, expires_at
                 FROM cached_files
@@ -307,7 +344,7 @@ class ResourceSpaceCache:
     
     def get_cached_file_path(self, resource_id: int) -> Optional[str]:
         """Get path to cached file if valid"""
-        with self._get_connection() as conn:
+        with self._get_read_connection() as conn:
             cursor = conn.execute("""
                 SELECT file_path
                 FROM cached_files
@@ -343,7 +380,7 @@ class ResourceSpaceCache:
         # Determine file extension
         if not file_extension:
             # Try to get from resource metadata
-            with self._get_connection() as conn:
+            with self._get_read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT file_extension FROM cached_resources
                     WHERE resource_id = ?
@@ -408,10 +445,16 @@ class ResourceSpaceCache:
             
             with self._get_connection() as conn:
                 conn.execute("""
-                    INSERT OR REPLACE INTO cached_files (
+                    INSERT INTO cached_files (
                         resource_id, file_path, file_size, file_hash,
                         last_fetched, expires_at
                     ) VALUES (?, ?, ?, ?, datetime('now'), ?)
+                    ON CONFLICT(resource_id) DO UPDATE SET
+                        file_path = excluded.file_path,
+                        file_size = excluded.file_size,
+                        file_hash = excluded.file_hash,
+                        last_fetched = excluded.last_fetched,
+                        expires_at = excluded.expires_at
                 """, (resource_id, str(local_path), file_size, file_hash, expires_at))
                 
             logger.info(f"Cached file for resource {resource_id} at {local_path}")
@@ -542,18 +585,18 @@ class ResourceSpaceCache:
         query += " ORDER BY r.last_accessed DESC LIMIT ?"
         params.append(limit)
         
-        with self._get_connection() as conn:
+        with self._get_read_connection() as conn:
             cursor = conn.execute(query, params)
             return [dict(row) for row in cursor]
             
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
-        with self._get_connection() as conn:
+        with self._get_read_connection() as conn:
             stats = {}
+            ledger = {row['name']: row for row in conn.execute("SELECT * FROM cache_ledger")}
             
             # Total cached resources
-            cursor = conn.execute("SELECT COUNT(*) as count FROM cached_resources")
-            stats['total_resources'] = cursor.fetchone()['count']
+            stats['total_resources'] = ledger['resources']['item_count']
             
             # Expired resources
             cursor = conn.execute("""
@@ -564,24 +607,17 @@ class ResourceSpaceCache:
             
             # Cached files statistics
             cursor = conn.execute("""
-                SELECT 
-                    COUNT(*) as count,
-                    SUM(file_size) as total_size,
-                    COUNT(CASE WHEN expires_at < datetime('now') THEN 1 END) as expired_count
-                FROM cached_files
+                SELECT COUNT(*) as expired_count FROM cached_files
+                WHERE expires_at < datetime('now')
             """)
-            file_stats = cursor.fetchone()
             stats['cached_files'] = {
-                'count': file_stats['count'],
-                'total_size': file_stats['total_size'] or 0,
-                'expired_count': file_stats['expired_count'] or 0
+                'count': ledger['files']['item_count'],
+                'total_size': ledger['files']['total_bytes'],
+                'expired_count': cursor.fetchone()['expired_count'] or 0
             }
             
             # Cache size (metadata)
-            cursor = conn.execute("""
-                SELECT SUM(file_size) as total_size FROM cached_resources
-            """)
-            stats['metadata_size'] = cursor.fetchone()['total_size'] or 0
+            stats['metadata_size'] = ledger['resources']['total_bytes']
             
             # Most accessed resources
             cursor = conn.execute("""
@@ -594,16 +630,35 @@ class ResourceSpaceCache:
             """)
             stats['most_accessed'] = [dict(row) for row in cursor]
             
-            # Calculate cache directory size
-            cache_dir_size = 0
-            if self.cache_dir.exists():
-                for file in self.cache_dir.rglob('*'):
-                    if file.is_file():
-                        cache_dir_size += file.stat().st_size
-            stats['cache_directory_size'] = cache_dir_size
-            
-            return stats
-            
+        # Cache directory size: tracked files plus the database itself
+        db_size = 0
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.db_path + suffix):
+                db_size += os.path.getsize(self.db_path + suffix)
+        stats['cache_directory_size'] = stats['cached_files']['total_size'] + db_size
+        
+        return stats
+        
+    def reconcile_size_ledger(self) -> Dict[str, int]:
+        """Recompute the size ledger from cached_files / cached_resources to correct drift"""
+        with self._get_connection() as conn:
+            totals = {
+                'files': conn.execute(
+                    "SELECT COALESCE(SUM(file_size), 0), COUNT(*) FROM cached_files"
+                ).fetchone(),
+                'resources': conn.execute(
+                    "SELECT COALESCE(SUM(file_size), 0), COUNT(*) FROM cached_resources"
+                ).fetchone()
+            }
+            conn.executemany("""
+                UPDATE cache_ledger
+                SET total_bytes = ?, item_count = ?, reconciled_at = datetime('now')
+                WHERE name = ?
+            """, [(row[0], row[1], name) for name, row in totals.items()])
+            
+        logger.info("Size ledger reconciled")
+        return {name: row[0] for name, row in totals.items()}
+        
     def cache_resource_types(self, resource_types: List[Dict[str, Any]]):
         """Cache resource type definitions"""
         with self._get_connection() as conn:
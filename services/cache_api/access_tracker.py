@@ -0,0 +1,63 @@
+"""
+Write-behind access tracking for the ResourceSpace cache
+Buffers last-access times and hit counts in memory so reads never write
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Tuple
+
+
+class AccessTracker:
+    """Thread-safe buffer of per-resource access times and hit counts"""
+
+    def __init__(self, max_pending: int = 1000, flush_interval_seconds: int = 30):
+        """
+        Initialize the tracker
+
+        Args:
+            max_pending: Number of buffered resources that triggers an early flush
+            flush_interval_seconds: Maximum age of buffered data before a flush is due
+        """
+        self.max_pending = max_pending
+        self.flush_interval_seconds = flush_interval_seconds
+        self._pending: Dict[int, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def record(self, resource_ids: Iterable[int]):
+        """Record one access for each resource ID"""
+        now = time.time()
+        with self._lock:
+            for resource_id in resource_ids:
+                _, hits = self._pending.get(resource_id, (now, 0))
+                self._pending[resource_id] = (now, hits + 1)
+
+    @property
+    def pending_count(self) -> int:
+        """Number of resources with buffered accesses"""
+        return len(self._pending)
+
+    def should_flush(self) -> bool:
+        """Whether the buffer has hit its size or age threshold"""
+        if not self._pending:
+            return False
+        return (len(self._pending) >= self.max_pending or
+                time.monotonic() - self._last_flush >= self.flush_interval_seconds)
+
+    def drain(self) -> Dict[int, Tuple[str, int]]:
+        """
+        Take everything buffered so far
+
+        Returns:
+            Dict of resource_id -> (last access as SQLite UTC datetime string, hit count)
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+
+        return {
+            resource_id: (datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'), hits)
+            for resource_id, (ts, hits) in pending.items()
+        }
@@ -21,12 +21,21 @@ class CacheSettings(BaseModel):
     max_cache_size_mb: int = Field(default=10240, ge=100, description="Maximum cache size in MB")
     cleanup_interval_hours: int = Field(default=6, ge=1, le=24, description="Cleanup interval in hours")
     redis_ttl_seconds: int = Field(default=3600, ge=60, le=86400, description="Redis TTL in seconds")
+    adaptive_ttl_enabled: bool = Field(default=True, description="Learn per-resource TTLs from change frequency")
+    adaptive_ttl_min_hours: int = Field(default=1, ge=1, le=720, description="Shortest adaptive TTL in hours")
+    adaptive_ttl_max_days: int = Field(default=30, ge=1, le=365, description="Longest adaptive TTL in days")
     
     @validator('media_cache_ttl_days')
     def validate_ttl(cls, v):
         if v < 1 or v > 30:
             raise ValueError("TTL must be between 1 and 30 days")
         return v
+        
+    @validator('adaptive_ttl_max_days')
+    def validate_adaptive_bounds(cls, v, values):
+        if v * 24 < values.get('adaptive_ttl_min_hours', 1):
+            raise ValueError("Adaptive TTL maximum must not be below the minimum")
+        return v
 
 
 class AdminSettingsManager:
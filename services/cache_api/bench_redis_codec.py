@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark Redis record encodings
+Compares bytes per key and encode/decode time of the lightweight JSON summary (the
+old Redis value) against full records in JSON, msgpack and msgpack+zstd
+
+Usage:
+    python bench_redis_codec.py [--cache-dir cache] [--limit 500] [--rounds 20]
+
+Records are sampled from the SQLite cache in --cache-dir; without one (or when it is
+empty) synthetic records of a typical size are used.
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from redis_cache import RedisCache
+from redis_codec import RecordCodec
+
+
+def sample_records(cache_dir: str, limit: int) -> List[Dict[str, Any]]:
+    """Hydrated records from an existing cache, most accessed first"""
+    if not (Path(cache_dir) / 'cache.db').exists():
+        return []
+    from resourcespace_cache import ResourceSpaceCache
+    cache = ResourceSpaceCache(cache_dir=cache_dir)
+    try:
+        with cache._get_read_connection() as conn:
+            resource_ids = [row[0] for row in conn.execute(
+                "SELECT resource_id FROM cached_resources ORDER BY hit_count DESC LIMIT ?", (limit,)
+            )]
+        records = cache.get_cached_resources(resource_ids, stale_if_error=True, track_access=False)
+        return [{key: value for key, value in record.items() if not key.startswith('_')}
+                for record in records.values()]
+    except sqlite3.Error:
+        return []
+    finally:
+        cache.close()
+
+
+def synthetic_records(count: int) -> List[Dict[str, Any]]:
+    """Records shaped like get_cached_resource output, with ~30 fields and 3 previews"""
+    words = ['mountain', 'lake', 'studio', 'portrait', 'archive', 'press', 'event', 'logo',
+             'campaign', 'product', 'interior', 'aerial', 'night', 'winter', 'team']
+    records = []
+    for resource_id in range(1, count + 1):
+        rng = random.Random(resource_id)
+        records.append({
+            'resource_id': resource_id,
+            'resource_type': rng.randint(1, 4),
+            'title': ' '.join(rng.sample(words, 3)).title(),
+            'creation_date': '2023-05-14 10:22:31',
+            'file_extension': rng.choice(['jpg', 'png', 'tif', 'pdf', 'mp4']),
+            'preview_extension': 'jpg',
+            'thumb_width': 150,
+            'thumb_height': 100,
+            'file_size': rng.randint(10 ** 5, 10 ** 8),
+            'disk_usage': rng.randint(10 ** 5, 10 ** 8),
+            'archive': 0,
+            'access': 0,
+            'created_by': rng.randint(1, 50),
+            'modified': '2024-02-01 08:00:00',
+            'file_checksum': '%032x' % rng.getrandbits(128),
+            'last_accessed': '2024-02-03 12:00:00',
+            'hit_count': rng.randint(0, 500),
+            'cache_expires_at': '2024-02-10 12:00:00',
+            'generation': 1,
+            'expires_at': '2024-02-10 12:00:00',
+            'metadata': [{'field_id': field_id, 'field_name': f'field{field_id}',
+                          'value': ' '.join(rng.choices(words, k=rng.randint(1, 12))),
+                          'field_type': rng.choice([0, 1, 2, 3, 4, 5, 6, 7, 8, 9])}
+                         for field_id in range(1, 31)],
+            'keywords': rng.sample(words, 6),
+            'previews': {size: {'preview_type': size,
+                                'preview_path': f'https://rs.example.com/filestore/{resource_id}/{size}.jpg',
+                                'width': width, 'height': width * 2 // 3}
+                         for size, width in (('thm', 150), ('pre', 900), ('scr', 1400))}
+        })
+    return records
+
+
+def measure(values: List[Any], fn: Callable[[Any], Any], rounds: int) -> float:
+    """Mean microseconds per call"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for value in values:
+            fn(value)
+    return (time.perf_counter() - started) / (rounds * len(values)) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cache-dir', default='cache')
+    parser.add_argument('--limit', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    records = sample_records(args.cache_dir, args.limit)
+    source = f"{len(records)} cached records from {args.cache_dir}"
+    if not records:
+        records = synthetic_records(args.limit)
+        source = f"{len(records)} synthetic records"
+
+    variants = [
+        ('json summary (old)', RecordCodec('json', 0), False),
+        ('json full', RecordCodec('json', 0), True),
+        ('msgpack full', RecordCodec('msgpack', 0), True),
+        ('msgpack+zstd full', RecordCodec('msgpack', 1024), True),
+    ]
+
+    print(f"Redis record encodings over {source}, {args.rounds} rounds\n")
+    print(f"{'encoding':<22}{'bytes/key':>12}{'encode us':>12}{'decode us':>12}")
+    for name, codec, full_record in variants:
+        if full_record:
+            inputs = records
+        else:
+            inputs = [RedisCache._summary(record['resource_id'], record) for record in records]
+        encoded = [codec.encode(record, full_record=full_record) for record in inputs]
+        if name.endswith('(old)'):
+            # The old value had no header: plain json.dumps
+            encoded = [json.dumps(record).encode() for record in inputs]
+            encode_us = measure(inputs, json.dumps, args.rounds)
+        else:
+            encode_us = measure(inputs, lambda record: codec.encode(record, full_record), args.rounds)
+        decode_us = measure(encoded, RecordCodec.decode, args.rounds)
+        size = sum(len(value) for value in encoded) / len(encoded)
+        print(f"{name:<22}{size:>12.0f}{encode_us:>12.1f}{decode_us:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
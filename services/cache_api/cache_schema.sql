@@ -18,8 +18,11 @@ CREATE TABLE IF NOT EXISTS cached_resources (
     access INTEGER DEFAULT 0,
     created_by INTEGER,
     modified DATETIME,
+    file_checksum TEXT,
     last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP,
-    cache_expires_at DATETIME
+    hit_count INTEGER DEFAULT 0,
+    cache_expires_at DATETIME,
+    generation INTEGER DEFAULT 0  -- cache generation current when stored (see cache_generations)
 );
 
 -- Metadata fields cache (dynamic field-value pairs)
@@ -78,7 +81,13 @@ CREATE TABLE IF NOT EXISTS cache_status (
     expires_at DATETIME,
     fetch_count INTEGER DEFAULT 1,
     is_complete BOOLEAN DEFAULT 0,
-    etag TEXT,
+    etag TEXT, -- RS modified stamp and file checksum at fetch time; see resource_validator()
+    -- Change history behind the adaptive TTL: refreshes seen, how many found a change
+    first_seen_at DATETIME,
+    last_changed_at DATETIME,
+    check_count INTEGER DEFAULT 0,
+    change_count INTEGER DEFAULT 0,
+    ttl_seconds INTEGER,
     FOREIGN KEY (resource_id) REFERENCES cached_resources(resource_id) ON DELETE CASCADE
 );
 
@@ -105,21 +114,201 @@ CREATE TABLE IF NOT EXISTS cached_field_definitions (
     last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
 );
 
--- Cached original resource files
+-- Cached original resource files (file_path points at the shared blob for file_hash)
 CREATE TABLE IF NOT EXISTS cached_files (
     resource_id INTEGER PRIMARY KEY,
     file_path TEXT NOT NULL,
     file_size INTEGER,
     file_hash TEXT,
+    source_checksum TEXT, -- RS file_checksum when the file was fetched, for revalidation
     last_fetched DATETIME DEFAULT CURRENT_TIMESTAMP,
     expires_at DATETIME,
     FOREIGN KEY (resource_id) REFERENCES cached_resources(resource_id) ON DELETE CASCADE
 );
 
+-- Content-addressed original file store; one blob per distinct SHA-256
+-- ref_count is the number of cached_files rows pointing at the blob
+CREATE TABLE IF NOT EXISTS cached_blobs (
+    file_hash TEXT PRIMARY KEY,
+    blob_path TEXT NOT NULL UNIQUE,
+    file_size INTEGER,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_blob_ref_insert
+AFTER INSERT ON cached_files
+BEGIN
+    UPDATE cached_blobs SET ref_count = ref_count + 1 WHERE file_hash = new.file_hash;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blob_ref_delete
+AFTER DELETE ON cached_files
+BEGIN
+    UPDATE cached_blobs SET ref_count = ref_count - 1 WHERE file_hash = old.file_hash;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_blob_ref_update
+AFTER UPDATE OF file_hash ON cached_files
+WHEN old.file_hash IS NOT new.file_hash
+BEGIN
+    UPDATE cached_blobs SET ref_count = ref_count - 1 WHERE file_hash = old.file_hash;
+    UPDATE cached_blobs SET ref_count = ref_count + 1 WHERE file_hash = new.file_hash;
+END;
+
+-- Large originals being cached range by range (sparse file plus a bit per completed chunk)
+CREATE TABLE IF NOT EXISTS cached_partials (
+    resource_id INTEGER PRIMARY KEY,
+    partial_path TEXT NOT NULL,
+    file_url TEXT NOT NULL,
+    total_size INTEGER NOT NULL,
+    chunk_size INTEGER NOT NULL,
+    chunk_bitmap BLOB NOT NULL,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    validator TEXT, -- upstream ETag or Last-Modified, sent as If-Range
+    last_accessed DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (resource_id) REFERENCES cached_resources(resource_id) ON DELETE CASCADE
+);
+
+-- Resource IDs ResourceSpace recently refused (not found, access denied or erroring),
+-- remembered briefly so repeated requests for them don't each cost an API round trip
+CREATE TABLE IF NOT EXISTS negative_cache (
+    resource_id INTEGER PRIMARY KEY,
+    reason TEXT NOT NULL, -- not_found, forbidden or error
+    detail TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL
+);
+
+-- Progress markers for background sync jobs (e.g. the change-feed watermark)
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Generation floors: a resource stamped below the global floor or its type's floor is
+-- invisible to reads until refetched, and the sweeper reclaims it later
+CREATE TABLE IF NOT EXISTS cache_generations (
+    scope TEXT PRIMARY KEY,  -- 'global' or 'type:<resource_type>'
+    generation INTEGER NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Running totals kept in step with cached_files / cached_resources by triggers,
+-- so size and count checks never have to scan tables or walk the cache directory
+CREATE TABLE IF NOT EXISTS cache_ledger (
+    name TEXT PRIMARY KEY, -- 'files', 'blobs' or 'resources'
+    total_bytes INTEGER NOT NULL DEFAULT 0,
+    item_count INTEGER NOT NULL DEFAULT 0,
+    reconciled_at DATETIME
+);
+
+INSERT OR IGNORE INTO cache_ledger (name) VALUES ('files'), ('blobs'), ('resources');
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_files_insert
+AFTER INSERT ON cached_files
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes + COALESCE(new.file_size, 0), item_count = item_count + 1
+    WHERE name = 'files';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_files_delete
+AFTER DELETE ON cached_files
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0), item_count = item_count - 1
+    WHERE name = 'files';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_files_update
+AFTER UPDATE OF file_size ON cached_files
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0) + COALESCE(new.file_size, 0)
+    WHERE name = 'files';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_blobs_insert
+AFTER INSERT ON cached_blobs
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes + COALESCE(new.file_size, 0), item_count = item_count + 1
+    WHERE name = 'blobs';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_blobs_delete
+AFTER DELETE ON cached_blobs
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0), item_count = item_count - 1
+    WHERE name = 'blobs';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_resources_insert
+AFTER INSERT ON cached_resources
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes + COALESCE(new.file_size, 0), item_count = item_count + 1
+    WHERE name = 'resources';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_resources_delete
+AFTER DELETE ON cached_resources
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0), item_count = item_count - 1
+    WHERE name = 'resources';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_ledger_resources_update
+AFTER UPDATE OF file_size ON cached_resources
+BEGIN
+    UPDATE cache_ledger
+    SET total_bytes = total_bytes - COALESCE(old.file_size, 0) + COALESCE(new.file_size, 0)
+    WHERE name = 'resources';
+END;
+
+-- Full-text index over titles, metadata values and keywords (rowid = resource_id)
+-- Maintained by the ingest path; see ResourceSpaceCache._reindex_search
+CREATE VIRTUAL TABLE IF NOT EXISTS resource_search USING fts5(
+    title,
+    metadata,
+    keywords,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_resource_search_delete
+AFTER DELETE ON cached_resources
+BEGIN
+    DELETE FROM resource_search WHERE rowid = old.resource_id;
+END;
+
+-- Ordered result IDs of recent searches, so a repeated search skips both the local
+-- index and do_search; entries are dropped when a listed resource changes
+CREATE TABLE IF NOT EXISTS search_results (
+    query_key TEXT PRIMARY KEY,  -- hash of normalized query, resource types, sort and limit
+    query TEXT NOT NULL,
+    resource_ids TEXT NOT NULL,  -- JSON array in result order
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    expires_at DATETIME NOT NULL
+);
+
+-- Which cached searches list each resource
+CREATE TABLE IF NOT EXISTS search_result_members (
+    query_key TEXT NOT NULL,
+    resource_id INTEGER NOT NULL,
+    PRIMARY KEY (query_key, resource_id),
+    FOREIGN KEY (query_key) REFERENCES search_results(query_key) ON DELETE CASCADE
+);
+
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_resources_type ON cached_resources(resource_type);
 CREATE INDEX IF NOT EXISTS idx_resources_modified ON cached_resources(modified);
 CREATE INDEX IF NOT EXISTS idx_resources_accessed ON cached_resources(last_accessed);
+CREATE INDEX IF NOT EXISTS idx_resources_hits ON cached_resources(hit_count);
 CREATE INDEX IF NOT EXISTS idx_metadata_resource ON cached_metadata(resource_id);
 CREATE INDEX IF NOT EXISTS idx_metadata_field ON cached_metadata(field_id);
 CREATE INDEX IF NOT EXISTS idx_keywords_resource ON cached_keywords(resource_id);
@@ -127,6 +316,14 @@ CREATE INDEX IF NOT EXISTS idx_keywords_keyword ON cached_keywords(keyword);
 CREATE INDEX IF NOT EXISTS idx_previews_resource ON cached_previews(resource_id);
 CREATE INDEX IF NOT EXISTS idx_cache_expires ON cache_status(expires_at);
 CREATE INDEX IF NOT EXISTS idx_files_expires ON cached_files(expires_at);
+CREATE INDEX IF NOT EXISTS idx_partials_accessed ON cached_partials(last_accessed);
+CREATE INDEX IF NOT EXISTS idx_files_hash ON cached_files(file_hash);
+CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON cached_blobs(ref_count) WHERE ref_count <= 0;
+CREATE INDEX IF NOT EXISTS idx_resources_checksum ON cached_resources(file_checksum);
+CREATE INDEX IF NOT EXISTS idx_resources_generation ON cached_resources(resource_type, generation);
+CREATE INDEX IF NOT EXISTS idx_negative_expires ON negative_cache(expires_at);
+CREATE INDEX IF NOT EXISTS idx_search_results_expires ON search_results(expires_at);
+CREATE INDEX IF NOT EXISTS idx_search_members_resource ON search_result_members(resource_id);
 
 -- Cache management views
 CREATE VIEW IF NOT EXISTS expired_resources AS
@@ -0,0 +1,161 @@
+"""
+Change-feed sync for the ResourceSpace cache
+Polls ResourceSpace for resources modified since a stored watermark and refreshes
+exactly those, so freshness no longer depends on short TTLs
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from metrics import change_feed_runs, change_feed_resources, change_feed_watermark
+from resourcespace_wrapper import thread_pool
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_KEY = 'change_feed_watermark'
+
+# Format of RS 'modified' stamps (RS server local time)
+RS_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _parse_stamp(value: Any) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        return datetime.strptime(str(value)[:19], RS_TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+class ChangeFeedSync:
+    """
+    Watermark-driven refresh of resources modified upstream
+
+    Each run pages through do_search ordered by modified date, newest first, until it
+    reaches the watermark (less an overlap for clock skew and same-second edits). The
+    changed IDs we hold are refreshed through the conditional revalidation path, then
+    the watermark moves to the newest stamp seen.
+    """
+
+    def __init__(self, wrapper, page_size: int = 200, max_pages: int = 10,
+                 overlap_seconds: int = 120):
+        """
+        Initialize the sync job
+
+        Args:
+            wrapper: ResourceSpaceWrapper whose caches are kept fresh
+            page_size: Resources requested per do_search call
+            max_pages: Most pages read per run; a longer backlog expires the whole cache
+            overlap_seconds: How far before the watermark each run looks again
+        """
+        self.wrapper = wrapper
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.overlap = timedelta(seconds=overlap_seconds)
+
+    async def _recent_changes(self, offset: int, count: int) -> List[Dict[str, Any]]:
+        """One page of resources, most recently modified first"""
+        results = await self.wrapper._make_api_call('do_search', {
+            'param1': '',
+            'param2': '',  # all resource types
+            'param3': 'modified',
+            'param4': 0,  # active archive state
+            'param5': count,
+            'param6': 'desc',
+            'param7': offset
+        })
+        if not isinstance(results, list):
+            raise ValueError(f"Unexpected do_search response: {str(results)[:200]}")
+        return [row for row in results if isinstance(row, dict) and 'ref' in row]
+
+    async def sync(self) -> Dict[str, Any]:
+        """
+        Run one pass of the change feed
+
+        The watermark only moves after the changed resources were handled, so a
+        failed run is simply repeated by the next one.
+
+        Returns:
+            Dict describing what was refreshed and the new watermark
+        """
+        try:
+            return await self._sync()
+        except Exception:
+            change_feed_runs.labels(outcome='failed').inc()
+            raise
+
+    async def _sync(self) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        cache = self.wrapper.cache
+        stored = await loop.run_in_executor(thread_pool, cache.get_sync_state, WATERMARK_KEY)
+        watermark = _parse_stamp(stored)
+
+        if watermark is None:
+            # First run: start from the newest change rather than refreshing the whole repository
+            newest = await self._recent_changes(0, 1)
+            watermark = _parse_stamp(newest[0].get('modified')) if newest else None
+            if watermark is None:
+                watermark = datetime.now()
+            await loop.run_in_executor(
+                thread_pool, cache.set_sync_state, WATERMARK_KEY, watermark.strftime(RS_TIMESTAMP_FORMAT)
+            )
+            change_feed_watermark.set(watermark.timestamp())
+            change_feed_runs.labels(outcome='initialized').inc()
+            logger.info(f"Change feed initialized at {watermark}")
+            return {'initialized': True, 'watermark': watermark.strftime(RS_TIMESTAMP_FORMAT)}
+
+        since = watermark - self.overlap
+        changed: List[int] = []
+        newest = watermark
+        reached_watermark = False
+
+        for page in range(self.max_pages):
+            rows = await self._recent_changes(page * self.page_size, self.page_size)
+            for row in rows:
+                modified = _parse_stamp(row.get('modified'))
+                if modified is None:
+                    raise ValueError("do_search results carry no 'modified' stamp; cannot follow changes")
+                if modified < since:
+                    reached_watermark = True
+                    break
+                changed.append(int(row['ref']))
+                newest = max(newest, modified)
+            if reached_watermark or len(rows) < self.page_size:
+                reached_watermark = True
+                break
+
+        if reached_watermark:
+            stats = await self.wrapper.refresh_changed_resources(changed) if changed else {}
+            outcome = 'ok'
+        else:
+            # More changes than we are willing to page through: have everything revalidate
+            # lazily instead (cheap when unchanged) and carry on from the newest change
+            expired = await self.wrapper.expire_all()
+            stats = {'expired': expired}
+            outcome = 'truncated'
+            logger.warning(f"Change feed backlog exceeds {self.max_pages} pages; "
+                           f"expired {expired} entries for revalidation")
+
+        # The overlap re-collects changes already handled, so only a stamp past the old
+        # watermark or a refresh that found new content means searches may be out of date
+        if outcome == 'ok' and (newest > watermark or stats.get('refreshed') or stats.get('evicted')):
+            # Changed (or new) resources may now match searches that didn't list them
+            await self.wrapper.invalidate_search_results()
+
+        for action, count in stats.items():
+            change_feed_resources.labels(action=action).inc(count)
+
+        await loop.run_in_executor(
+            thread_pool, cache.set_sync_state, WATERMARK_KEY, newest.strftime(RS_TIMESTAMP_FORMAT)
+        )
+        change_feed_watermark.set(newest.timestamp())
+        change_feed_runs.labels(outcome=outcome).inc()
+
+        return {
+            'changed': len(changed),
+            'watermark': newest.strftime(RS_TIMESTAMP_FORMAT),
+            'truncated': outcome == 'truncated',
+            **stats
+        }
@@ -0,0 +1,236 @@
+"""
+Circuit breaker for calls to ResourceSpace (async API calls and blocking file downloads)
+Trips on a high error or slow-call rate so an outage fails fast instead of
+holding every cache miss for the full client timeout
+"""
+
+import time
+import threading
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Optional, Tuple
+
+from metrics import circuit_breaker_state, circuit_breaker_transitions, circuit_breaker_rejections
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Gauge values for circuit_breaker_state
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """Upstream calls are being rejected until the breaker's cool-down has passed"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker driven by a sliding window of call outcomes
+
+    A call counts as failed if it raised an upstream error or took longer than
+    slow_call_seconds. Once the window holds at least minimum_calls outcomes and
+    the failed share reaches failure_rate_threshold, the breaker opens and rejects
+    calls for open_seconds. It then lets half_open_max_calls trial calls through:
+    if they all succeed it closes, if any fails it opens again.
+    """
+
+    def __init__(self, name: str = 'resourcespace',
+                 failure_rate_threshold: float = 0.5,
+                 slow_call_seconds: float = 5.0,
+                 minimum_calls: int = 10,
+                 window_seconds: float = 60,
+                 open_seconds: float = 30,
+                 half_open_max_calls: int = 3):
+        """
+        Initialize the breaker
+
+        Args:
+            name: Label for logs and metrics
+            failure_rate_threshold: Failed share of recent calls (0-1) that opens the breaker
+            slow_call_seconds: Calls slower than this count as failures
+            minimum_calls: Calls needed in the window before the rate is trusted
+            window_seconds: How far back outcomes are considered
+            open_seconds: How long calls are rejected before trial calls are allowed
+            half_open_max_calls: Trial calls that must succeed to close again
+        """
+        self.name = name
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        # Used from the event loop and from file-download threads
+        self._lock = threading.Lock()
+        self._outcomes: Deque[Tuple[float, bool]] = deque()  # (monotonic time, failed)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trial_calls = 0
+        self._trial_successes = 0
+        circuit_breaker_state.labels(name=name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the cool-down has passed"""
+        with self._lock:
+            return self._current_state()
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected outright"""
+        return self.state == OPEN
+
+    def retry_after(self) -> float:
+        """Seconds until trial calls are allowed again (0 unless open)"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+        return self._state
+
+    def _transition(self, state: str):
+        if state == self._state:
+            return
+        logger.warning(f"Circuit '{self.name}' {self._state} -> {state}")
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state in (OPEN, HALF_OPEN):
+            self._trial_calls = 0
+            self._trial_successes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+        circuit_breaker_state.labels(name=self.name).set(_STATE_VALUES[state])
+        circuit_breaker_transitions.labels(name=self.name, state=state).inc()
+
+    def before_call(self) -> bool:
+        """
+        Reserve a call slot
+
+        Returns:
+            True when the slot is a half-open trial call
+
+        Raises:
+            CircuitOpenError: the breaker is open, or half-open with all trial slots taken
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._trial_calls < self.half_open_max_calls:
+                self._trial_calls += 1
+                return True
+            retry_after = max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+        circuit_breaker_rejections.labels(name=self.name).inc()
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record_success(self, elapsed_seconds: float):
+        """Record a completed call; a slow one still counts as a failure"""
+        if elapsed_seconds >= self.slow_call_seconds:
+            logger.warning(f"Circuit '{self.name}' slow call: {elapsed_seconds:.1f}s")
+            self.record_failure()
+            return
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._trial_successes += 1
+                if self._trial_successes >= self.half_open_max_calls:
+                    self._transition(CLOSED)
+                return
+            self._record(False)
+
+    def release_trial(self):
+        """Give back a trial slot whose call ended without an outcome (e.g. cancelled)"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._trial_calls > 0:
+                self._trial_calls -= 1
+
+    def record_failure(self):
+        """Record a call that failed because of upstream"""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            self._record(True)
+
+    def _record(self, failed: bool):
+        now = time.monotonic()
+        self._outcomes.append((now, failed))
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            self._outcomes.popleft()
+
+        if self._state != CLOSED or len(self._outcomes) < self.minimum_calls:
+            return
+        failures = sum(1 for _, f in self._outcomes if f)
+        if failures / len(self._outcomes) >= self.failure_rate_threshold:
+            self._transition(OPEN)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]],
+                   is_failure: Optional[Callable[[BaseException], bool]] = None) -> Any:
+        """
+        Run an upstream call through the breaker
+
+        Args:
+            fn: Coroutine factory making the call
+            is_failure: Decides whether an exception reflects upstream health
+                (defaults to every exception)
+
+        Raises:
+            CircuitOpenError: without calling fn, while the breaker is open
+        """
+        trial = self.before_call()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except BaseException as e:
+            self._record_error(e, trial, started, is_failure)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def call_sync(self, fn: Callable[[], Any],
+                  is_failure: Optional[Callable[[BaseException], bool]] = None) -> Any:
+        """
+        Run a blocking upstream call (from a file-download thread) through the breaker
+
+        Args:
+            fn: Function making the call
+            is_failure: Decides whether an exception reflects upstream health
+                (defaults to every exception)
+
+        Raises:
+            CircuitOpenError: without calling fn, while the breaker is open
+        """
+        trial = self.before_call()
+        started = time.monotonic()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._record_error(e, trial, started, is_failure)
+            raise
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def _record_error(self, error: BaseException, trial: bool, started: float,
+                      is_failure: Optional[Callable[[BaseException], bool]]):
+        if not isinstance(error, Exception):
+            # Cancelled (client went away): says nothing about upstream, but the
+            # trial slot must not stay taken or half-open would reject every call
+            if trial:
+                self.release_trial()
+        elif is_failure is None or is_failure(error):
+            self.record_failure()
+        else:
+            self.record_success(time.monotonic() - started)
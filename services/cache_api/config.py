@@ -20,6 +20,100 @@ class Settings(BaseSettings):
     MAX_CACHE_SIZE_GB: float = 10.0
     MIN_FREE_SPACE_GB: float = 5.0
     
+    # SQLite tuning
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_CACHE_SIZE_MB: int = 64
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    
+    # Write-behind access tracking
+    ACCESS_FLUSH_INTERVAL_SECONDS: int = 30
+    ACCESS_FLUSH_MAX_PENDING: int = 1000
+    
+    # Bulk ingestion
+    STORE_BATCH_SIZE: int = 500
+    INGEST_CONCURRENCY: int = 4
+    
+    # Original file downloads
+    FILE_DOWNLOAD_CHUNK_KB: int = 1024
+    FILE_WRITE_BUFFER_KB: int = 4096
+    FILE_FSYNC_POLICY: str = "large"  # always, large or never
+    FILE_FSYNC_MIN_SIZE_MB: int = 64
+    
+    # Range-partial caching of large originals
+    FILE_CHUNK_SIZE_MB: int = 4
+    FILE_RANGE_WINDOW_MB: int = 16  # max bytes returned for an open-ended Range request
+    PARTIAL_FILE_IDLE_HOURS: int = 24
+    
+    # Request coalescing (Redis locks extend it across replicas; needs Redis)
+    SINGLEFLIGHT_REDIS_LOCKS: bool = False
+    SINGLEFLIGHT_LOCK_TIMEOUT_SECONDS: int = 30
+    
+    # Stale-while-revalidate (how long past expiry metadata may be served while it refreshes; 0 disables)
+    STALE_WHILE_REVALIDATE_SECONDS: int = 3600
+    
+    # Stale-if-error (how long past expiry cached data may be served while ResourceSpace is down)
+    STALE_IF_ERROR_SECONDS: int = 604800  # 7 days
+    
+    # Upstream circuit breaker (trips on failed or slow ResourceSpace calls)
+    CIRCUIT_FAILURE_RATE: float = 0.5
+    CIRCUIT_SLOW_CALL_SECONDS: float = 5.0
+    CIRCUIT_MIN_CALLS: int = 10
+    CIRCUIT_WINDOW_SECONDS: int = 60
+    CIRCUIT_OPEN_SECONDS: int = 30
+    CIRCUIT_HALF_OPEN_CALLS: int = 3
+    
+    # Negative cache (how long refused resource IDs are answered locally)
+    NEGATIVE_CACHE_NOT_FOUND_SECONDS: int = 300
+    NEGATIVE_CACHE_FORBIDDEN_SECONDS: int = 60
+    NEGATIVE_CACHE_ERROR_SECONDS: int = 15
+    NEGATIVE_CACHE_MAX_ENTRIES: int = 10000
+    
+    # Change-feed sync (polls RS for resources modified since the last run)
+    CHANGE_FEED_ENABLED: bool = True
+    CHANGE_FEED_INTERVAL_SECONDS: int = 300
+    CHANGE_FEED_PAGE_SIZE: int = 200
+    CHANGE_FEED_MAX_PAGES: int = 10
+    CHANGE_FEED_OVERLAP_SECONDS: int = 120
+    
+    # Adaptive TTLs (bounds and on/off are admin settings; this is the share of a
+    # resource's observed change interval used as its TTL)
+    ADAPTIVE_TTL_CHANGE_FACTOR: float = 0.5
+    
+    # Refresh-ahead (revalidates popular entries before they expire; hours are local, e.g. "1-6")
+    REFRESH_AHEAD_ENABLED: bool = True
+    REFRESH_AHEAD_INTERVAL_MINUTES: int = 30
+    REFRESH_AHEAD_HORIZON_HOURS: int = 24
+    REFRESH_AHEAD_MAX_PER_RUN: int = 500
+    REFRESH_AHEAD_RATE_PER_SECOND: float = 5.0
+    REFRESH_AHEAD_MIN_HITS: int = 2
+    REFRESH_AHEAD_ACTIVE_DAYS: int = 7
+    REFRESH_AHEAD_OFF_PEAK_HOURS: str = ""
+    
+    # Generation sweep (reclaims entries hidden by a global or per-type invalidation)
+    GENERATION_SWEEP_INTERVAL_MINUTES: int = 5
+    GENERATION_SWEEP_BATCH_SIZE: int = 500
+    GENERATION_SWEEP_MAX_BATCHES: int = 20
+    
+    # Webhook events from ResourceSpace hooks (endpoint disabled while the secret is empty)
+    EVENTS_WEBHOOK_SECRET: str = ""
+    EVENTS_COALESCE_SECONDS: float = 2.0
+    EVENTS_MAX_PENDING: int = 1000
+    
+    # In-process L1 cache in front of Redis (kept coherent across replicas over Redis pub/sub)
+    L1_CACHE_ENABLED: bool = True
+    L1_MAX_ENTRIES: int = 5000
+    L1_MAX_MB: int = 64
+    L1_TTL_SECONDS: int = 60
+    
+    # Answer searches from the local index even with fewer hits than the limit (only
+    # when the cache holds the whole collection; otherwise just full pages are local)
+    SEARCH_LOCAL_COMPLETE: bool = False
+    
+    # Search result cache (ordered result IDs per normalized query; 0 disables)
+    SEARCH_CACHE_TTL_SECONDS: int = 300
+    
     # Redis settings
     REDIS_ENABLED: bool = False
     REDIS_HOST: str = "redis"
@@ -27,9 +121,14 @@ class Settings(BaseSettings):
     REDIS_DB: int = 0
     REDIS_PASSWORD: Optional[str] = None
     REDIS_TTL_SECONDS: int = 3600  # 1 hour for hot cache
+    REDIS_FULL_RECORDS: bool = False  # store fully hydrated records instead of summaries
+    REDIS_CODEC: str = "msgpack"  # msgpack or json, for new writes (old values stay readable)
+    REDIS_COMPRESS_MIN_BYTES: int = 1024  # zstd-compress records at least this large (0 disables)
+    REDIS_EARLY_REFRESH_BETA: float = 1.0  # XFetch eagerness for renewing hot keys before expiry (0 disables)
     
     # Cleanup settings
     CLEANUP_INTERVAL_HOURS: int = 6
+    LEDGER_RECONCILE_INTERVAL_HOURS: int = 24
     
     # Admin settings
     CONFIG_FILE_PATH: str = "/app/config/cache_config.json"
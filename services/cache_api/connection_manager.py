@@ -0,0 +1,132 @@
+"""
+SQLite connection manager for the ResourceSpace cache
+Keeps one long-lived reader connection per thread and a single shared writer
+"""
+
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteConnectionManager:
+    """Pooled SQLite connections tuned for a read-heavy cache"""
+
+    def __init__(self, db_path: str,
+                 journal_mode: str = "WAL",
+                 synchronous: str = "NORMAL",
+                 mmap_size_mb: int = 256,
+                 cache_size_mb: int = 64,
+                 busy_timeout_ms: int = 5000):
+        """
+        Initialize the connection manager
+
+        Args:
+            db_path: Path to SQLite database file
+            journal_mode: SQLite journal mode (WAL lets readers run alongside the writer)
+            synchronous: SQLite synchronous level
+            mmap_size_mb: Memory-mapped I/O size per connection in MB
+            cache_size_mb: Page cache size per connection in MB
+            busy_timeout_ms: How long to wait on a locked database
+        """
+        self.db_path = db_path
+        self.journal_mode = journal_mode.upper()
+        self.synchronous = synchronous.upper()
+        self.mmap_size = mmap_size_mb * 1024 * 1024
+        self.cache_size_kb = cache_size_mb * 1024
+        self.busy_timeout_ms = busy_timeout_ms
+
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._write_lock = threading.RLock()
+        self._writer = self._connect()
+        self._after_commit: List[Callable[[], None]] = []
+
+        # journal_mode is persistent, so it only needs to be set once
+        mode = self._writer.execute(f"PRAGMA journal_mode = {self.journal_mode}").fetchone()[0]
+        logger.info(f"SQLite journal mode for {self.db_path}: {mode}")
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the tuned pragmas applied"""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        # Negative cache_size is interpreted as KiB rather than pages
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    def _reader_connection(self) -> sqlite3.Connection:
+        """Get (or lazily open) the reader connection for the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Context manager for read-only work on this thread's connection"""
+        conn = self._reader_connection()
+        try:
+            yield conn
+        finally:
+            # End any implicit read transaction so the WAL can checkpoint
+            if conn.in_transaction:
+                conn.rollback()
+
+    @contextmanager
+    def writer(self):
+        """Context manager for the shared writer connection (one transaction)"""
+        with self._write_lock:
+            conn = self._writer
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                self._after_commit.clear()
+                raise
+            callbacks, self._after_commit = self._after_commit, []
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"After-commit callback failed: {e}")
+
+    def after_commit(self, callback: Callable[[], None]):
+        """
+        Run callback once the current writer transaction has committed
+
+        For side effects outside the database (e.g. deleting files) that must not
+        happen if the transaction rolls back; dropped on rollback. Only call this
+        inside writer().
+        """
+        self._after_commit.append(callback)
+
+    def close(self):
+        """Close every connection owned by the manager"""
+        with self._readers_lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to close reader connection: {e}")
+            self._readers.clear()
+        self._local = threading.local()
+
+        with self._write_lock:
+            self._writer.close()
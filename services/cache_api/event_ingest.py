@@ -0,0 +1,153 @@
+"""
+Webhook event ingestion for the ResourceSpace cache
+Collects resource change notifications pushed by ResourceSpace hooks and applies them
+in coalesced batches, so a burst of edits costs one invalidation pass instead of many
+"""
+
+import asyncio
+import hashlib
+import hmac
+import logging
+from typing import Dict, Optional, Set
+
+from metrics import events_received, events_coalesced, event_batches, event_batch_resources
+
+logger = logging.getLogger(__name__)
+
+UPDATE = 'update'
+UPLOAD = 'upload'
+CREATE = 'create'
+DELETE = 'delete'
+
+EVENT_ACTIONS = {
+    'HookAfterUpdateResource': UPDATE,
+    'HookResourceUpload': UPLOAD,
+    'HookAfterCreateResource': CREATE,
+    'HookBeforeDeleteResource': DELETE,
+    UPDATE: UPDATE,
+    UPLOAD: UPLOAD,
+    CREATE: CREATE,
+    DELETE: DELETE
+}
+
+SIGNATURE_PREFIX = 'sha256='
+
+
+def event_action(event: str) -> Optional[str]:
+    """Map a hook name (or a plain action name) to the action applied, None if not relevant"""
+    return EVENT_ACTIONS.get(event) or EVENT_ACTIONS.get(event.lower())
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """
+    Check an X-RS-Signature header against the raw request body
+
+    The sender signs the body with HMAC-SHA256 using the shared secret and sends
+    'sha256=<hex digest>'.
+    """
+    if not secret or not signature or not signature.startswith(SIGNATURE_PREFIX):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len(SIGNATURE_PREFIX):].strip().lower())
+
+
+class EventCoalescer:
+    """
+    Buffers change events per resource and applies them together after a short window
+
+    Every event for a resource within the window folds into one pending change. A
+    delete supersedes anything else; a create clears cached refusals; updates and
+    uploads refresh the cached copy, and uploads also drop the cached original.
+    Batches are applied one at a time, in arrival order.
+    """
+
+    def __init__(self, wrapper, window_seconds: float = 2.0, max_pending: int = 1000):
+        """
+        Initialize the coalescer
+
+        Args:
+            wrapper: ResourceSpaceWrapper whose caches the events are applied to
+            window_seconds: How long events are collected before a batch is applied
+            max_pending: Pending resources that trigger an immediate flush
+        """
+        self.wrapper = wrapper
+        self.window_seconds = window_seconds
+        self.max_pending = max_pending
+        self._pending: Dict[int, Set[str]] = {}
+        self._timer: Optional[asyncio.Task] = None
+        self._flushes: Set[asyncio.Task] = set()
+        self._apply_lock = asyncio.Lock()
+
+    @property
+    def pending_count(self) -> int:
+        return len(self._pending)
+
+    def add(self, resource_id: int, action: str):
+        """Queue one change; the batch is applied once the window closes"""
+        events_received.labels(action=action).inc()
+        actions = self._pending.setdefault(int(resource_id), set())
+        if actions:
+            events_coalesced.inc()
+        actions.add(action)
+
+        if len(self._pending) >= self.max_pending:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = self._track(self._flush_after_window())
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.window_seconds)
+        self._timer = None
+        await self.flush()
+
+    def _schedule_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._track(self.flush())
+
+    def _track(self, coro) -> asyncio.Task:
+        task = asyncio.ensure_future(coro)
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+        return task
+
+    async def flush(self) -> Dict[str, int]:
+        """
+        Apply everything pending as one batch
+
+        Returns:
+            Dict of counts per action taken (empty if nothing was pending)
+        """
+        batch, self._pending = self._pending, {}
+        if not batch:
+            return {}
+
+        evict_ids = [rid for rid, actions in batch.items() if actions & {DELETE, CREATE}]
+        refresh_ids = [rid for rid, actions in batch.items()
+                       if DELETE not in actions and actions & {UPDATE, UPLOAD}]
+        file_changed_ids = [rid for rid, actions in batch.items()
+                            if DELETE not in actions and UPLOAD in actions]
+
+        async with self._apply_lock:
+            try:
+                stats = await self.wrapper.apply_resource_changes(evict_ids, refresh_ids, file_changed_ids)
+            except Exception as e:
+                event_batches.labels(outcome='failed').inc()
+                logger.error(f"Failed to apply {len(batch)} resource change events: {e}")
+                return {}
+
+        for action, count in stats.items():
+            event_batch_resources.labels(action=action).inc(count)
+        event_batches.labels(outcome='ok').inc()
+        logger.info(f"Applied resource change events for {len(batch)} resources: {stats}")
+        return stats
+
+    async def close(self):
+        """Apply anything still pending and wait for running batches"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flushes:
+            await asyncio.gather(*set(self._flushes), return_exceptions=True)
+        await self.flush()
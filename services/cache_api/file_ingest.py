@@ -0,0 +1,156 @@
+"""
+Streaming ingest for original files downloaded into the ResourceSpace cache
+Hashes and counts bytes while writing, so a download is only ever read once
+"""
+
+import hashlib
+import os
+import tempfile
+import time
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ('always', 'large', 'never')
+
+
+class IngestInterrupted(Exception):
+    """The byte stream failed part way; temp_path still holds the bytes received so far"""
+
+    def __init__(self, temp_path: Path, bytes_written: int, cause: BaseException):
+        super().__init__(f"Download interrupted after {bytes_written} bytes: {cause}")
+        self.temp_path = temp_path
+        self.bytes_written = bytes_written
+
+
+@dataclass
+class IngestResult:
+    """A fully written temp file and what was learned while writing it"""
+    temp_path: Path
+    file_hash: str
+    file_size: int
+    elapsed_seconds: float
+
+    @property
+    def throughput_bytes_per_second(self) -> float:
+        """Average write rate for the download (network and disk together)"""
+        if self.elapsed_seconds <= 0:
+            return 0.0
+        return self.file_size / self.elapsed_seconds
+
+
+class StreamingIngest:
+    """Write a byte stream to a temp file, then move it into place atomically"""
+
+    def __init__(self, temp_dir: Path,
+                 chunk_size: int = 1024 * 1024,
+                 buffer_size: int = 4 * 1024 * 1024,
+                 fsync_policy: str = 'large',
+                 fsync_min_bytes: int = 64 * 1024 * 1024):
+        """
+        Initialize the ingest stage
+
+        Args:
+            temp_dir: Directory for in-flight downloads (must share a filesystem with the final path)
+            chunk_size: Bytes requested from the network per read
+            buffer_size: Userspace write buffer for the temp file
+            fsync_policy: 'always' fsyncs every file, 'large' only files of at least
+                fsync_min_bytes, 'never' leaves flushing to the OS
+            fsync_min_bytes: Size threshold for the 'large' policy
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"fsync_policy must be one of {FSYNC_POLICIES}, got {fsync_policy!r}")
+
+        self.temp_dir = Path(temp_dir)
+        self.chunk_size = chunk_size
+        self.buffer_size = buffer_size
+        self.fsync_policy = fsync_policy
+        self.fsync_min_bytes = fsync_min_bytes
+
+    def _should_fsync(self, file_size: int) -> bool:
+        if self.fsync_policy == 'always':
+            return True
+        if self.fsync_policy == 'large':
+            return file_size >= self.fsync_min_bytes
+        return False
+
+    def ingest(self, chunks: Iterable[bytes], prefix: str = '',
+               keep_partial: bool = False) -> IngestResult:
+        """
+        Stream chunks into a new temp file, hashing and counting as they are written
+
+        Args:
+            chunks: Byte chunks, e.g. response.iter_content(ingest.chunk_size)
+            prefix: Temp file name prefix (useful when looking at in-flight downloads)
+            keep_partial: On a stream error, keep the temp file and raise IngestInterrupted
+                so the caller can resume from it
+
+        Returns:
+            IngestResult for the complete temp file; the caller moves or removes it
+        """
+        fd, temp_name = tempfile.mkstemp(dir=self.temp_dir, prefix=prefix, suffix='.part')
+        temp_path = Path(temp_name)
+        sha256 = hashlib.sha256()
+        file_size = 0
+        started = time.monotonic()
+
+        try:
+            with os.fdopen(fd, 'wb', buffering=self.buffer_size) as f:
+                for chunk in chunks:
+                    if not chunk:
+                        continue
+                    sha256.update(chunk)
+                    f.write(chunk)
+                    file_size += len(chunk)
+
+                f.flush()
+                if self._should_fsync(file_size):
+                    os.fsync(f.fileno())
+        except Exception as e:
+            if keep_partial and file_size > 0:
+                raise IngestInterrupted(temp_path, file_size, e) from e
+            temp_path.unlink(missing_ok=True)
+            raise
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        return IngestResult(
+            temp_path=temp_path,
+            file_hash=sha256.hexdigest(),
+            file_size=file_size,
+            elapsed_seconds=time.monotonic() - started
+        )
+
+    def commit(self, temp_path: Path, final_path: Path, file_size: int):
+        """
+        Atomically rename a fully written temp file to its final path
+
+        Readers see either no file or the complete file, never a partial one.
+        """
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(temp_path, final_path)
+
+        if self._should_fsync(file_size):
+            # Persist the rename itself, not just the file contents
+            self._fsync_directory(final_path.parent)
+
+    @staticmethod
+    def _fsync_directory(directory: Path):
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY)
+        except OSError as e:
+            logger.warning(f"Could not open {directory} to fsync: {e}")
+            return
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def discard(self, result: Optional[IngestResult]):
+        """Remove a temp file that is not going to be committed"""
+        if result is not None:
+            result.temp_path.unlink(missing_ok=True)
@@ -0,0 +1,158 @@
+"""
+Bulk cache invalidation for the ResourceSpace cache
+Purges resources selected by ID, type, modified range or search query from every
+tier (Redis, SQLite, blobs on disk, partial downloads) as a tracked background job
+"""
+
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from metrics import invalidation_jobs, invalidated_resources
+from resourcespace_wrapper import thread_pool
+from search_query import build_fts_query
+
+logger = logging.getLogger(__name__)
+
+# Format of RS 'modified' stamps stored in cached_resources
+RS_TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+@dataclass
+class InvalidationJob:
+    """Progress of one bulk purge"""
+    job_id: str
+    criteria: Dict[str, Any]
+    status: str = 'pending'  # pending, running, completed or failed
+    total: int = 0
+    processed: int = 0
+    removed: int = 0
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    finished_at: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class CacheInvalidator:
+    """
+    Runs bulk purges in batches, off the event loop
+
+    Explicit IDs alone are purged as given, so Redis entries and cached refusals
+    are dropped even when SQLite holds nothing for them. Any other criterion
+    selects from SQLite, and all given criteria must match. Each batch is one
+    SQLite transaction plus one pipelined Redis call, and the job's progress is
+    updated after every batch.
+    """
+
+    def __init__(self, wrapper, batch_size: int = 500, max_jobs: int = 100):
+        """
+        Initialize the invalidator
+
+        Args:
+            wrapper: ResourceSpaceWrapper whose caches are purged
+            batch_size: Resources purged per transaction
+            max_jobs: Finished jobs kept for progress queries
+        """
+        self.wrapper = wrapper
+        self.batch_size = batch_size
+        self.max_jobs = max_jobs
+        self._jobs: 'OrderedDict[str, InvalidationJob]' = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def _criteria(resource_ids: Optional[List[int]] = None,
+                  resource_types: Optional[List[int]] = None,
+                  modified_from: Optional[datetime] = None,
+                  modified_to: Optional[datetime] = None,
+                  query: Optional[str] = None) -> Dict[str, Any]:
+        criteria = {
+            'resource_ids': [int(rid) for rid in resource_ids] if resource_ids else None,
+            'resource_types': list(resource_types) if resource_types else None,
+            'modified_from': modified_from.strftime(RS_TIMESTAMP_FORMAT) if modified_from else None,
+            'modified_to': modified_to.strftime(RS_TIMESTAMP_FORMAT) if modified_to else None,
+            'query': query.strip() if query and query.strip() else None
+        }
+        criteria = {key: value for key, value in criteria.items() if value is not None}
+        if not criteria:
+            raise ValueError("At least one invalidation criterion is required")
+        if 'query' in criteria and not build_fts_query(criteria['query']):
+            raise ValueError(f"Query can't be matched against the local index: {criteria['query']!r}")
+        return criteria
+
+    def start(self, **criteria) -> InvalidationJob:
+        """
+        Start a purge in the background
+
+        Args:
+            **criteria: resource_ids, resource_types, modified_from, modified_to and/or query
+
+        Returns:
+            The job, to poll with get_job
+
+        Raises:
+            ValueError: no criterion was given, or the query can't be answered locally
+        """
+        job = InvalidationJob(job_id=uuid.uuid4().hex, criteria=self._criteria(**criteria))
+        self._jobs[job.job_id] = job
+        while len(self._jobs) > self.max_jobs:
+            oldest = next(iter(self._jobs))
+            if oldest in self._tasks:
+                break
+            self._jobs.pop(oldest)
+
+        task = asyncio.ensure_future(self._run(job))
+        self._tasks[job.job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job.job_id, None))
+        return job
+
+    async def invalidate(self, **criteria) -> InvalidationJob:
+        """Run a purge and wait for it to finish"""
+        job = self.start(**criteria)
+        task = self._tasks.get(job.job_id)
+        if task:
+            await asyncio.shield(task)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[InvalidationJob]:
+        return self._jobs.get(job_id)
+
+    async def _run(self, job: InvalidationJob):
+        loop = asyncio.get_event_loop()
+        criteria = dict(job.criteria)
+        job.status = 'running'
+        try:
+            if set(criteria) == {'resource_ids'}:
+                resource_ids = list(dict.fromkeys(criteria['resource_ids']))
+            else:
+                resource_ids = await loop.run_in_executor(
+                    thread_pool, lambda: self.wrapper.cache.find_resource_ids(**criteria)
+                )
+            job.total = len(resource_ids)
+
+            for i in range(0, len(resource_ids), self.batch_size):
+                batch = resource_ids[i:i + self.batch_size]
+                job.removed += await self.wrapper.evict_resources(batch)
+                job.processed += len(batch)
+                invalidated_resources.inc(len(batch))
+
+            job.status = 'completed'
+            invalidation_jobs.labels(outcome='completed').inc()
+            logger.info(f"Invalidation {job.job_id} purged {job.processed} resources ({job.criteria})")
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            invalidation_jobs.labels(outcome='failed').inc()
+            logger.error(f"Invalidation {job.job_id} failed after {job.processed}/{job.total}: {e}")
+        finally:
+            job.finished_at = datetime.now().isoformat()
+
+    async def close(self):
+        """Wait for running purges"""
+        if self._tasks:
+            await asyncio.gather(*set(self._tasks.values()), return_exceptions=True)
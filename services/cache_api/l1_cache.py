@@ -0,0 +1,117 @@
+"""
+In-process L1 cache for hot resource metadata
+Bounded LRU in front of Redis (L2) and SQLite (L3), kept coherent across replicas
+by the Redis invalidation channel
+"""
+
+import json
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from metrics import l1_cache_entries, l1_cache_bytes, l1_cache_evictions
+
+logger = logging.getLogger(__name__)
+
+
+def _estimate_size(value: Dict[str, Any]) -> int:
+    """Rough in-memory footprint of a resource dict: its JSON length"""
+    try:
+        return len(json.dumps(value, default=str))
+    except (TypeError, ValueError):
+        return 4096
+
+
+class L1Cache:
+    """
+    LRU cache bounded by entry count and by estimated bytes, with a per-entry TTL
+
+    Only used from the event loop, so it takes no locks. Values are copied on the
+    way out because callers annotate the dicts they get back.
+    """
+
+    def __init__(self, max_entries: int = 5000, max_bytes: int = 64 * 1024 * 1024,
+                 ttl_seconds: float = 60):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Most resources held
+            max_bytes: Most estimated bytes held
+            ttl_seconds: How long an entry is served before it must be re-read from L2/L3
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self._entries: 'OrderedDict[int, Tuple[float, int, Dict[str, Any]]]' = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get(self, resource_id: int) -> Optional[Dict[str, Any]]:
+        """A copy of the cached resource, or None if absent or past its TTL"""
+        entry = self._entries.get(resource_id)
+        if entry is None:
+            return None
+        expires, _, value = entry
+        if time.monotonic() >= expires:
+            self._remove(resource_id)
+            return None
+        self._entries.move_to_end(resource_id)
+        return dict(value)
+
+    def put(self, resource_id: int, value: Dict[str, Any], ttl_seconds: Optional[float] = None):
+        """Cache a resource, evicting the least recently used ones to stay within bounds"""
+        value = {key: item for key, item in value.items() if not key.startswith('_')}
+        size = _estimate_size(value)
+        self._remove(resource_id)
+        if size > self.max_bytes:
+            return
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        if ttl <= 0:
+            return
+
+        self._entries[resource_id] = (time.monotonic() + ttl, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            l1_cache_evictions.inc()
+        self._update_gauges()
+
+    def invalidate(self, resource_ids: Iterable[int]):
+        """Drop these resources"""
+        for resource_id in resource_ids:
+            self._remove(int(resource_id))
+        self._update_gauges()
+
+    def clear(self):
+        """Drop everything"""
+        self._entries.clear()
+        self._bytes = 0
+        self._update_gauges()
+
+    def _remove(self, resource_id: int):
+        entry = self._entries.pop(resource_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _update_gauges(self):
+        l1_cache_entries.set(len(self._entries))
+        l1_cache_bytes.set(self._bytes)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': True,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl_seconds
+        }
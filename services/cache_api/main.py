@@ -4,11 +4,11 @@ ResourceSpace Cache API Microservice
 FastAPI-based caching service for ResourceSpace metadata and files
 """
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Response
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Response, Request
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, BinaryIO, Iterator, Tuple
 from pathlib import Path
 import logging
 import asyncio
@@ -20,9 +20,17 @@ from prometheus_client import Counter, Histogram, Gauge, generate_latest
 
 from config import settings
 from resourcespace_wrapper import ResourceSpaceWrapper
-from models import ResourceResponse, SearchRequest, PrefetchRequest, CacheStats
+from models import ResourceResponse, SearchRequest, PrefetchRequest, CacheStats, EventBatch, InvalidationRequest
 from redis_cache import redis_cache
 from admin_settings import AdminSettingsManager, CacheSettings, ensure_config_file
+from access_tracker import AccessTracker
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from negative_cache import ResourceUnavailable, FORBIDDEN
+from change_feed import ChangeFeedSync
+from event_ingest import EventCoalescer, event_action, verify_signature
+from invalidation import CacheInvalidator
+from refresh_ahead import RefreshAhead
+from l1_cache import L1Cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -45,12 +53,17 @@ scheduler = AsyncIOScheduler()
 # Global instances
 rs_wrapper: Optional[ResourceSpaceWrapper] = None
 admin_settings: Optional[AdminSettingsManager] = None
+change_feed: Optional[ChangeFeedSync] = None
+event_coalescer: Optional[EventCoalescer] = None
+invalidator: Optional[CacheInvalidator] = None
+refresh_ahead: Optional[RefreshAhead] = None
+invalidation_listener: Optional[asyncio.Task] = None
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage application lifecycle"""
-    global rs_wrapper, admin_settings
+    global rs_wrapper, admin_settings, change_feed, event_coalescer, invalidator, refresh_ahead
     
     # Ensure config file exists
     ensure_config_file(settings.CONFIG_FILE_PATH)
@@ -76,9 +89,66 @@ async def lifespan(app: FastAPI):
         cache_dir=settings.CACHE_DIR,
         cache_ttl_days=admin_settings.get_setting('media_cache_ttl_days'),
         rs_user=settings.RS_USER,
-        redis_cache=redis_cache if admin_settings.get_setting('redis_enabled') else None
+        redis_cache=redis_cache if admin_settings.get_setting('redis_enabled') else None,
+        db_options={
+            'journal_mode': settings.SQLITE_JOURNAL_MODE,
+            'synchronous': settings.SQLITE_SYNCHRONOUS,
+            'mmap_size_mb': settings.SQLITE_MMAP_SIZE_MB,
+            'cache_size_mb': settings.SQLITE_CACHE_SIZE_MB,
+            'busy_timeout_ms': settings.SQLITE_BUSY_TIMEOUT_MS
+        },
+        access_tracker=AccessTracker(
+            max_pending=settings.ACCESS_FLUSH_MAX_PENDING,
+            flush_interval_seconds=settings.ACCESS_FLUSH_INTERVAL_SECONDS
+        ),
+        store_batch_size=settings.STORE_BATCH_SIZE,
+        ingest_concurrency=settings.INGEST_CONCURRENCY,
+        file_ingest_options={
+            'chunk_size': settings.FILE_DOWNLOAD_CHUNK_KB * 1024,
+            'buffer_size': settings.FILE_WRITE_BUFFER_KB * 1024,
+            'fsync_policy': settings.FILE_FSYNC_POLICY,
+            'fsync_min_bytes': settings.FILE_FSYNC_MIN_SIZE_MB * 1024 * 1024
+        },
+        file_chunk_size=settings.FILE_CHUNK_SIZE_MB * 1024 * 1024,
+        partial_idle_hours=settings.PARTIAL_FILE_IDLE_HOURS,
+        singleflight_redis_locks=settings.SINGLEFLIGHT_REDIS_LOCKS,
+        singleflight_lock_timeout=settings.SINGLEFLIGHT_LOCK_TIMEOUT_SECONDS,
+        stale_while_revalidate_seconds=settings.STALE_WHILE_REVALIDATE_SECONDS,
+        stale_if_error_seconds=settings.STALE_IF_ERROR_SECONDS,
+        circuit_breaker=CircuitBreaker(
+            name='resourcespace',
+            failure_rate_threshold=settings.CIRCUIT_FAILURE_RATE,
+            slow_call_seconds=settings.CIRCUIT_SLOW_CALL_SECONDS,
+            minimum_calls=settings.CIRCUIT_MIN_CALLS,
+            window_seconds=settings.CIRCUIT_WINDOW_SECONDS,
+            open_seconds=settings.CIRCUIT_OPEN_SECONDS,
+            half_open_max_calls=settings.CIRCUIT_HALF_OPEN_CALLS
+        ),
+        negative_ttls={
+            'not_found': settings.NEGATIVE_CACHE_NOT_FOUND_SECONDS,
+            'forbidden': settings.NEGATIVE_CACHE_FORBIDDEN_SECONDS,
+            'error': settings.NEGATIVE_CACHE_ERROR_SECONDS
+        },
+        negative_max_entries=settings.NEGATIVE_CACHE_MAX_ENTRIES,
+        adaptive_ttl_options={
+            'adaptive_ttl': admin_settings.get_setting('adaptive_ttl_enabled'),
+            'min_ttl_seconds': admin_settings.get_setting('adaptive_ttl_min_hours') * 3600,
+            'max_ttl_seconds': admin_settings.get_setting('adaptive_ttl_max_days') * 86400,
+            'ttl_change_factor': settings.ADAPTIVE_TTL_CHANGE_FACTOR
+        },
+        l1_cache=L1Cache(
+            max_entries=settings.L1_MAX_ENTRIES,
+            max_bytes=settings.L1_MAX_MB * 1024 * 1024,
+            ttl_seconds=settings.L1_TTL_SECONDS
+        ) if settings.L1_CACHE_ENABLED else None,
+        search_cache_ttl_seconds=settings.SEARCH_CACHE_TTL_SECONDS,
+        search_local_complete=settings.SEARCH_LOCAL_COMPLETE,
+        early_refresh_beta=settings.REDIS_EARLY_REFRESH_BETA
     )
     
+    # Drop L1 entries other replicas changed
+    start_invalidation_listener()
+    
     # Schedule cleanup tasks
     scheduler.add_job(
         cleanup_expired_cache,
@@ -88,6 +158,84 @@ async def lifespan(app: FastAPI):
         replace_existing=True
     )
     
+    # Schedule low-priority size ledger reconciliation
+    scheduler.add_job(
+        reconcile_size_ledger,
+        'interval',
+        hours=settings.LEDGER_RECONCILE_INTERVAL_HOURS,
+        id='size_ledger_reconcile',
+        replace_existing=True
+    )
+    
+    # Schedule write-behind access log flush
+    scheduler.add_job(
+        rs_wrapper.flush_access_log,
+        'interval',
+        seconds=settings.ACCESS_FLUSH_INTERVAL_SECONDS,
+        id='access_log_flush',
+        replace_existing=True
+    )
+    
+    # Schedule change-feed sync (refreshes exactly the resources modified upstream)
+    if settings.CHANGE_FEED_ENABLED:
+        change_feed = ChangeFeedSync(
+            rs_wrapper,
+            page_size=settings.CHANGE_FEED_PAGE_SIZE,
+            max_pages=settings.CHANGE_FEED_MAX_PAGES,
+            overlap_seconds=settings.CHANGE_FEED_OVERLAP_SECONDS
+        )
+        scheduler.add_job(
+            sync_change_feed,
+            'interval',
+            seconds=settings.CHANGE_FEED_INTERVAL_SECONDS,
+            id='change_feed_sync',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+    
+    # Schedule refresh-ahead of popular entries nearing expiry
+    if settings.REFRESH_AHEAD_ENABLED:
+        refresh_ahead = RefreshAhead(
+            rs_wrapper,
+            horizon_seconds=settings.REFRESH_AHEAD_HORIZON_HOURS * 3600,
+            max_per_run=settings.REFRESH_AHEAD_MAX_PER_RUN,
+            rate_per_second=settings.REFRESH_AHEAD_RATE_PER_SECOND,
+            min_hits=settings.REFRESH_AHEAD_MIN_HITS,
+            active_days=settings.REFRESH_AHEAD_ACTIVE_DAYS,
+            off_peak_hours=settings.REFRESH_AHEAD_OFF_PEAK_HOURS
+        )
+        scheduler.add_job(
+            run_refresh_ahead,
+            'interval',
+            minutes=settings.REFRESH_AHEAD_INTERVAL_MINUTES,
+            id='refresh_ahead',
+            replace_existing=True,
+            max_instances=1,
+            coalesce=True
+        )
+    
+    # Lazily reclaim entries hidden by a generation bump
+    scheduler.add_job(
+        sweep_old_generations,
+        'interval',
+        minutes=settings.GENERATION_SWEEP_INTERVAL_MINUTES,
+        id='generation_sweep',
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True
+    )
+    
+    # Batch resource change events pushed by ResourceSpace hooks
+    event_coalescer = EventCoalescer(
+        rs_wrapper,
+        window_seconds=settings.EVENTS_COALESCE_SECONDS,
+        max_pending=settings.EVENTS_MAX_PENDING
+    )
+    
+    # Bulk purges across every cache tier
+    invalidator = CacheInvalidator(rs_wrapper, batch_size=settings.STORE_BATCH_SIZE)
+    
     # Schedule Redis metrics update
     scheduler.add_job(
         update_redis_metrics,
@@ -104,11 +252,32 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     scheduler.shutdown()
+    await stop_invalidation_listener()
+    await event_coalescer.close()
+    await invalidator.close()
+    await rs_wrapper.close()
     if redis_cache.enabled:
         await redis_cache.disconnect()
     logger.info("Cleanup complete")
 
 
+def start_invalidation_listener():
+    """Follow the Redis invalidation channel while both Redis and the L1 cache are on"""
+    global invalidation_listener
+    if invalidation_listener is None and rs_wrapper.l1_cache is not None and redis_cache.enabled:
+        invalidation_listener = asyncio.create_task(
+            redis_cache.listen_invalidations(rs_wrapper.apply_remote_invalidation)
+        )
+
+
+async def stop_invalidation_listener():
+    global invalidation_listener
+    if invalidation_listener is not None:
+        invalidation_listener.cancel()
+        await asyncio.gather(invalidation_listener, return_exceptions=True)
+        invalidation_listener = None
+
+
 # Create FastAPI app
 app = FastAPI(
     title="ResourceSpace Cache API",
@@ -139,6 +308,9 @@ async def cleanup_expired_cache():
             logger.info(f"Using media TTL of {current_ttl} days for cleanup")
             logger.info(f"Max cache size: {max_cache_size} MB")
             
+        # Persist buffered access times so LRU eviction sees them
+        await rs_wrapper.flush_access_log()
+        
         stats = rs_wrapper.cleanup_cache(max_cache_size_mb=max_cache_size)
         logger.info(f"Cache cleanup complete: {stats}")
         
@@ -150,6 +322,50 @@ async def cleanup_expired_cache():
         logger.error(f"Cache cleanup failed: {e}")
 
 
+async def reconcile_size_ledger():
+    """Background task to correct drift between the size ledger and the file store"""
+    logger.info("Reconciling cache size ledger...")
+    try:
+        loop = asyncio.get_event_loop()
+        result = await loop.run_in_executor(None, rs_wrapper.cache.reconcile_size_ledger)
+        logger.info(f"Size ledger reconciliation complete: {result}")
+    except Exception as e:
+        logger.error(f"Size ledger reconciliation failed: {e}")
+
+
+async def run_refresh_ahead():
+    """Background task to revalidate popular entries before they expire"""
+    try:
+        result = await refresh_ahead.run()
+        logger.info(f"Refresh-ahead complete: {result}")
+    except Exception as e:
+        logger.error(f"Refresh-ahead failed: {e}")
+
+
+async def sweep_old_generations():
+    """Background task to delete entries hidden by a generation bump"""
+    try:
+        result = await rs_wrapper.sweep_old_generations(
+            batch_size=settings.GENERATION_SWEEP_BATCH_SIZE,
+            max_batches=settings.GENERATION_SWEEP_MAX_BATCHES
+        )
+        if result['resources_removed']:
+            logger.info(f"Generation sweep complete: {result}")
+    except Exception as e:
+        logger.error(f"Generation sweep failed: {e}")
+
+
+async def sync_change_feed():
+    """Background task to apply upstream changes since the last watermark"""
+    try:
+        result = await change_feed.sync()
+        logger.info(f"Change feed sync complete: {result}")
+    except CircuitOpenError as e:
+        logger.warning(f"Change feed sync skipped: {e}")
+    except Exception as e:
+        logger.error(f"Change feed sync failed: {e}")
+
+
 async def update_redis_metrics():
     """Update Redis metrics for Prometheus"""
     try:
@@ -184,8 +400,29 @@ async def root():
     }
 
 
+def _upstream_unavailable(error: CircuitOpenError) -> HTTPException:
+    """503 for a request that needed ResourceSpace while the circuit breaker is open"""
+    return HTTPException(
+        status_code=503,
+        detail=f"ResourceSpace unavailable: {error}",
+        headers={"Retry-After": str(max(int(error.retry_after), 1))}
+    )
+
+
+def _resource_unavailable(error: ResourceUnavailable) -> HTTPException:
+    """403 for a resource we may not see, 502 for one ResourceSpace fails to return"""
+    if error.reason == FORBIDDEN:
+        return HTTPException(status_code=403, detail=f"Access to resource {error.resource_id} denied")
+    return HTTPException(status_code=502, detail=str(error))
+
+
+def _stale_headers(reason: str) -> Dict[str, str]:
+    """Headers marking a response as served from an expired cache entry"""
+    return {"X-Cache-Stale": "true", "X-Cache-Stale-Reason": reason}
+
+
 @app.get("/resource/{resource_id}", response_model=ResourceResponse)
-async def get_resource(resource_id: int):
+async def get_resource(resource_id: int, response: Response):
     """Get resource metadata"""
     with request_duration.time():
         try:
@@ -207,20 +444,137 @@ async def get_resource(resource_id: int):
                 redis_misses.inc()
                 raise HTTPException(status_code=404, detail=f"Resource {resource_id} not found")
                 
+            if resource.get('_stale_if_error'):
+                # Expired copy served because ResourceSpace couldn't be reached
+                response.headers.update(_stale_headers('upstream-unavailable'))
+            elif resource.get('_stale'):
+                # Expired copy served while a background refresh runs
+                response.headers.update(_stale_headers('revalidating'))
+                
             return ResourceResponse.from_cache_data(resource)
             
         except HTTPException:
             raise
+        except CircuitOpenError as e:
+            raise _upstream_unavailable(e)
+        except ResourceUnavailable as e:
+            raise _resource_unavailable(e)
         except Exception as e:
             logger.exception(f"Error getting resource {resource_id}: {e}")
             raise HTTPException(status_code=500, detail=str(e))
 
 
+def _media_type(ext: str) -> str:
+    """Determine proper media type from a file extension"""
+    ext = (ext or '').lower()
+    if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
+        return f'image/{ext}'
+    elif ext in ['mp4', 'webm', 'ogg']:
+        return f'video/{ext}'
+    elif ext in ['mp3', 'wav', 'ogg']:
+        return f'audio/{ext}'
+    elif ext == 'pdf':
+        return 'application/pdf'
+    return 'application/octet-stream'
+
+
+def _parse_range_header(value: str) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """
+    Parse a single-range Range header
+    
+    Returns:
+        (first, last) where last is None for "bytes=N-" and first is None for a
+        suffix range "bytes=-N" (last then holds N); None if unsupported or invalid
+    """
+    unit, _, spec = value.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            return (None, int(last)) if last else None
+        first_byte = int(first)
+        last_byte = int(last) if last else None
+    except ValueError:
+        return None
+    if last_byte is not None and last_byte < first_byte:
+        return None
+    return first_byte, last_byte
+
+
+def _iter_file_range(f: BinaryIO, first: int, last: int, block_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Yield bytes first..last of an open file, closing it when done"""
+    try:
+        f.seek(first)
+        remaining = last - first + 1
+        while remaining > 0:
+            data = f.read(min(block_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        f.close()
+
+
+async def _get_file_range(resource_id: int, byte_range: Tuple[Optional[int], Optional[int]]) -> Response:
+    """Serve a Range request, caching only the chunks it covers"""
+    resource = await rs_wrapper.get_resource_async(resource_id, fetch_file=False)
+    if not resource:
+        raise HTTPException(status_code=404, detail=f"Resource {resource_id} not found")
+    ext = resource.get('file_extension')
+    
+    first, last = byte_range
+    if first is None:
+        # Suffix range: the first chunk tells us the file size
+        located = await rs_wrapper.get_file_range_async(resource_id, 0, 0, ext)
+        if not located:
+            raise HTTPException(status_code=404, detail=f"File for resource {resource_id} not available")
+        total = located[1]
+        first, last = max(total - last, 0), total - 1
+    elif last is None:
+        # Open-ended ranges (video players send "bytes=N-") get one window at a time
+        last = first + settings.FILE_RANGE_WINDOW_MB * 1024 * 1024 - 1
+        
+    located = await rs_wrapper.get_file_range_async(resource_id, first, last, ext)
+    if not located:
+        cache_misses.inc()
+        raise HTTPException(status_code=404, detail=f"File for resource {resource_id} not available")
+    path, total, complete = located
+    
+    if first >= total:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+    if complete and byte_range[1] is None:
+        last = total - 1
+    last = min(last, total - 1)
+    
+    # Open now so a partial file being promoted to the blob store can't vanish under us
+    f = open(path, 'rb')
+    return StreamingResponse(
+        _iter_file_range(f, first, last),
+        status_code=206,
+        media_type=_media_type(ext),
+        headers={
+            "Content-Range": f"bytes {first}-{last}/{total}",
+            "Content-Length": str(last - first + 1),
+            "Cache-Control": "public, max-age=86400",
+            "X-Resource-ID": str(resource_id),
+            "X-Cache-Partial": "0" if complete else "1",
+            "Accept-Ranges": "bytes"
+        }
+    )
+
+
 @app.get("/file/{resource_id}")
-async def get_file(resource_id: int):
-    """Get original resource file"""
+async def get_file(resource_id: int, request: Request):
+    """Get original resource file (honours single byte-range requests)"""
     with request_duration.time():
         try:
+            range_header = request.headers.get('range')
+            byte_range = _parse_range_header(range_header) if range_header else None
+            if byte_range:
+                return await _get_file_range(resource_id, byte_range)
+                
             # Get resource with file using async method
             resource = await rs_wrapper.get_resource_async(resource_id, fetch_file=True)
             
@@ -229,7 +583,7 @@ async def get_file(resource_id: int):
                 
             if not resource.get('cached_file'):
                 # Try to fetch file
-                file_path = rs_wrapper.cache.fetch_and_cache_file(
+                file_path = await rs_wrapper.fetch_file_async(
                     resource_id,
                     file_extension=resource.get('file_extension')
                 )
@@ -245,28 +599,28 @@ async def get_file(resource_id: int):
                 cache_misses.inc()
                 raise HTTPException(status_code=404, detail="Cached file not found")
                 
-            # Determine proper media type
-            ext = resource.get('file_extension', '').lower()
-            media_type = 'application/octet-stream'
-            if ext in ['jpg', 'jpeg', 'png', 'gif', 'webp']:
-                media_type = f'image/{ext}'
-            elif ext in ['mp4', 'webm', 'ogg']:
-                media_type = f'video/{ext}'
-            elif ext in ['mp3', 'wav', 'ogg']:
-                media_type = f'audio/{ext}'
-            elif ext == 'pdf':
-                media_type = 'application/pdf'
+            headers = {
+                "Cache-Control": "public, max-age=86400",
+                "X-Resource-ID": str(resource_id),
+                "Accept-Ranges": "bytes"  # Support range requests for video
+            }
+            if (resource.get('cached_file') or {}).get('stale'):
+                # Expired original served because it couldn't be refreshed
+                headers.update(_stale_headers('upstream-unavailable'))
+                headers["Cache-Control"] = "no-cache"
                 
             return FileResponse(
                 path=path,
-                media_type=media_type,
-                headers={
-                    "Cache-Control": "public, max-age=86400",
-                    "X-Resource-ID": str(resource_id),
-                    "Accept-Ranges": "bytes"  # Support range requests for video
-                }
+                media_type=_media_type(resource.get('file_extension', '')),
+                headers=headers
             )
             
+        except HTTPException:
+            raise
+        except CircuitOpenError as e:
+            raise _upstream_unavailable(e)
+        except ResourceUnavailable as e:
+            raise _resource_unavailable(e)
         except Exception as e:
             logger.error(f"Error getting file for resource {resource_id}: {e}")
             raise HTTPException(status_code=500, detail=str(e))
@@ -316,7 +670,8 @@ async def search_resources(request: SearchRequest):
             results = await rs_wrapper.search_resources_async(
                 search=request.query,
                 resource_types=request.resource_types,
-                limit=request.limit
+                limit=request.limit,
+                sort=request.sort
             )
             
             # Track cache performance
@@ -332,6 +687,8 @@ async def search_resources(request: SearchRequest):
                 "results": [ResourceResponse.from_cache_data(r) for r in results]
             }
             
+        except CircuitOpenError as e:
+            raise _upstream_unavailable(e)
         except Exception as e:
             logger.error(f"Search error: {e}")
             raise HTTPException(status_code=500, detail=str(e))
@@ -343,7 +700,7 @@ async def prefetch_resources(request: PrefetchRequest, background_tasks: Backgro
     try:
         # Add prefetch task to background
         background_tasks.add_task(
-            rs_wrapper.prefetch_resources,
+            rs_wrapper.prefetch_resources_async,
             request.resource_ids,
             request.include_files
         )
@@ -387,12 +744,17 @@ async def get_cache_status():
                 "hit_rate": hit_rate,
                 "total_hits": int(cache_hits._value.get()),
                 "total_misses": int(cache_misses._value.get()),
-                "most_accessed": stats['most_accessed']
+                "most_accessed": stats['most_accessed'],
+                "negative_entries": stats['negative_entries']
             },
             "redis_status": redis_status,
+            "l1_status": rs_wrapper.l1_cache.get_stats() if rs_wrapper.l1_cache is not None else {
+                'enabled': False
+            },
             "settings": current_settings,
             "ttl_config": {
                 "media_ttl_days": current_settings.get('media_cache_ttl_days', 7),
+                "adaptive_ttl": stats['ttl'],
                 "redis_ttl_seconds": current_settings.get('redis_ttl_seconds', 3600)
             }
         }
@@ -406,10 +768,9 @@ async def get_cache_status():
 async def evict_resource(resource_id: int):
     """Manually evict a resource from cache"""
     try:
-        # Delete from cache
-        with rs_wrapper.cache._get_connection() as conn:
-            conn.execute("DELETE FROM cached_resources WHERE resource_id = ?", (resource_id,))
-            
+        # Delete from every tier, including a cached not-found/forbidden result
+        await rs_wrapper.evict_resource(resource_id)
+        
         return {"status": "success", "message": f"Resource {resource_id} evicted from cache"}
         
     except Exception as e:
@@ -417,6 +778,67 @@ async def evict_resource(resource_id: int):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/events", status_code=202)
+async def ingest_events(request: Request):
+    """
+    Accept resource change notifications from ResourceSpace hooks
+    
+    The body is an EventBatch signed with HMAC-SHA256 of the raw body in the
+    X-RS-Signature header. Events are coalesced per resource and applied shortly
+    after, so the response only confirms they were queued.
+    """
+    if not settings.EVENTS_WEBHOOK_SECRET:
+        raise HTTPException(status_code=503, detail="Event ingestion is not configured")
+        
+    body = await request.body()
+    if not verify_signature(settings.EVENTS_WEBHOOK_SECRET, body, request.headers.get('X-RS-Signature')):
+        raise HTTPException(status_code=401, detail="Invalid event signature")
+        
+    try:
+        batch = EventBatch.model_validate_json(body)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+        
+    accepted = 0
+    for event in batch.events:
+        action = event_action(event.event)
+        if action is None:
+            continue
+        event_coalescer.add(event.resource_id, action)
+        accepted += 1
+        
+    return {
+        "status": "accepted",
+        "accepted": accepted,
+        "ignored": len(batch.events) - accepted,
+        "pending": event_coalescer.pending_count
+    }
+
+
+@app.post("/cache/invalidate", status_code=202)
+async def invalidate_cache(request: InvalidationRequest):
+    """Purge resources by ID, type, modified range and/or search query from every tier"""
+    criteria = request.model_dump(exclude={'wait'})
+    try:
+        if request.wait:
+            job = await invalidator.invalidate(**criteria)
+        else:
+            job = invalidator.start(**criteria)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+        
+    return job.to_dict()
+
+
+@app.get("/cache/invalidate/{job_id}")
+async def get_invalidation(job_id: str):
+    """Progress of a bulk purge"""
+    job = invalidator.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Invalidation job not found")
+    return job.to_dict()
+
+
 @app.get("/metrics")
 async def get_metrics():
     """Prometheus metrics endpoint"""
@@ -454,12 +876,14 @@ async def update_admin_settings(updates: Dict[str, Any]):
                 if connected:
                     # Update wrapper
                     rs_wrapper.redis_cache = redis_cache
+                    start_invalidation_listener()
                     logger.info("Redis enabled at runtime")
                 else:
                     redis_cache.enabled = False
                     logger.error("Failed to connect to Redis at runtime")
             elif not updates['redis_enabled'] and redis_cache.enabled:
                 # Disable Redis
+                await stop_invalidation_listener()
                 await redis_cache.disconnect()
                 redis_cache.enabled = False
                 rs_wrapper.redis_cache = None
@@ -469,6 +893,11 @@ async def update_admin_settings(updates: Dict[str, Any]):
         if 'media_cache_ttl_days' in updates:
             rs_wrapper.cache.default_ttl = timedelta(days=updates['media_cache_ttl_days'])
             
+        # Adaptive TTL bounds apply from the next store or revalidation
+        rs_wrapper.cache.adaptive_ttl = new_settings.adaptive_ttl_enabled
+        rs_wrapper.cache.min_ttl = timedelta(hours=new_settings.adaptive_ttl_min_hours)
+        rs_wrapper.cache.max_ttl = timedelta(days=new_settings.adaptive_ttl_max_days)
+            
         return {
             "success": True,
             "settings": new_settings.dict(),
@@ -494,16 +923,38 @@ async def trigger_cache_cleanup(background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/admin/cache/invalidate-all")
+async def invalidate_all(resource_type: Optional[int] = None):
+    """
+    Invalidate the whole cache, or one resource type, in constant time
+    
+    Bumps the cache generation so existing entries stop being served; the
+    generation sweep reclaims their space in the background.
+    """
+    try:
+        generation = await rs_wrapper.invalidate_generation(resource_type)
+        return {
+            "success": True,
+            "generation": generation,
+            "scope": "global" if resource_type is None else f"type:{resource_type}"
+        }
+    except Exception as e:
+        logger.error(f"Error invalidating cache generation: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
     try:
-        # Check if cache is accessible
-        stats = rs_wrapper.get_cache_stats()
+        # Check if cache is accessible (a ledger read, not the full stats scan)
+        total_resources = rs_wrapper.get_resource_count()
         return {
             "status": "healthy",
             "cache_accessible": True,
-            "total_resources": stats['total_resources']
+            "total_resources": total_resources,
+            # Cached data is still served while this is open, so it doesn't make us unhealthy
+            "upstream_circuit": rs_wrapper.circuit_breaker.state
         }
     except Exception:
         return JSONResponse(
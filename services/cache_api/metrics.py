@@ -0,0 +1,202 @@
+"""
+Prometheus metrics recorded below the API layer
+Request-level metrics live in main.py; these are emitted by the cache and wrapper modules
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Original file downloads
+file_download_throughput = Histogram(
+    'file_download_throughput_bytes_per_second',
+    'Throughput of each original file download',
+    buckets=(256e3, 1e6, 4e6, 16e6, 32e6, 64e6, 128e6, 256e6, 512e6, 1e9)
+)
+file_download_bytes = Counter('file_download_bytes_total', 'Bytes downloaded for original files')
+file_download_failures = Counter('file_download_failures_total', 'Original file downloads that failed')
+file_dedup_hits = Counter(
+    'file_dedup_hits_total',
+    'Original file requests satisfied by an existing blob',
+    ['stage']  # 'checksum' skipped the download, 'hash' discarded it after hashing
+)
+
+# Request coalescing
+singleflight_requests = Counter(
+    'singleflight_requests_total',
+    'Cache-miss fetches by coalescing role',
+    ['operation', 'role']  # leader fetched, follower shared an in-process fetch, remote waited on another replica
+)
+upstream_calls_saved = Counter(
+    'upstream_calls_saved_total',
+    'Upstream fetches avoided because a concurrent identical fetch was shared',
+    ['operation']
+)
+
+# Stale-while-revalidate
+stale_served = Counter('stale_served_total', 'Expired cache entries served while a background refresh runs')
+stale_revalidations = Counter(
+    'stale_revalidations_total',
+    'Background refreshes of entries served stale',
+    ['outcome']  # refreshed, failed, or deduplicated onto a refresh already running
+)
+stale_if_error_served = Counter(
+    'stale_if_error_served_total',
+    'Expired cache entries served because upstream could not be reached',
+    ['kind']  # metadata or file
+)
+
+# Upstream circuit breaker
+circuit_breaker_state = Gauge(
+    'circuit_breaker_state',
+    'Upstream circuit breaker state (0=closed, 1=half-open, 2=open)',
+    ['name']
+)
+circuit_breaker_transitions = Counter(
+    'circuit_breaker_transitions_total',
+    'Upstream circuit breaker state changes by new state',
+    ['name', 'state']
+)
+circuit_breaker_rejections = Counter(
+    'circuit_breaker_rejections_total',
+    'Upstream calls rejected without being attempted because the breaker was open',
+    ['name']
+)
+
+# Negative cache
+negative_cache_hits = Counter(
+    'negative_cache_hits_total',
+    'Lookups answered by a cached refusal instead of an upstream call',
+    ['reason', 'tier']  # reason: not_found, forbidden or error; tier: redis or sqlite
+)
+negative_cache_stores = Counter(
+    'negative_cache_stores_total',
+    'Refusals from ResourceSpace remembered in the negative cache',
+    ['reason']
+)
+
+# Conditional revalidation
+cache_revalidations = Counter(
+    'cache_revalidations_total',
+    'Expired entries checked against ResourceSpace by outcome',
+    ['kind', 'outcome']  # kind: metadata or file; outcome: revalidated (unchanged, expiry extended) or refetched
+)
+
+# Change-feed sync
+change_feed_runs = Counter(
+    'change_feed_runs_total',
+    'Change-feed sync runs by outcome',
+    ['outcome']  # ok, truncated (backlog too long, cache expired), initialized or failed
+)
+change_feed_resources = Counter(
+    'change_feed_resources_total',
+    'Resources handled by the change-feed sync',
+    ['action']  # refreshed, unchanged, evicted, uncached or expired
+)
+change_feed_watermark = Gauge(
+    'change_feed_watermark_timestamp_seconds',
+    'Modified stamp up to which upstream changes have been applied'
+)
+
+# Webhook event ingestion
+events_received = Counter(
+    'events_received_total',
+    'Resource change events received from ResourceSpace hooks',
+    ['action']  # update, upload, create or delete
+)
+events_coalesced = Counter(
+    'events_coalesced_total',
+    'Events folded into a change already pending for the same resource'
+)
+event_batches = Counter(
+    'event_batches_total',
+    'Coalesced event batches applied to the cache tiers by outcome',
+    ['outcome']  # ok or failed
+)
+event_batch_resources = Counter(
+    'event_batch_resources_total',
+    'Resources handled by applied event batches',
+    ['action']  # evicted, files_dropped, refreshed, unchanged, uncached or expired
+)
+
+# Bulk invalidation
+invalidation_jobs = Counter(
+    'invalidation_jobs_total',
+    'Bulk cache invalidation jobs by outcome',
+    ['outcome']  # completed or failed
+)
+invalidated_resources = Counter(
+    'invalidated_resources_total',
+    'Resources purged from every cache tier by bulk invalidation'
+)
+
+# Refresh-ahead sweep
+refresh_ahead_runs = Counter(
+    'refresh_ahead_runs_total',
+    'Refresh-ahead sweep runs by outcome',
+    ['outcome']  # ok, interrupted (breaker opened) or skipped (off-peak window, breaker open)
+)
+refresh_ahead_resources = Counter(
+    'refresh_ahead_resources_total',
+    'Popular resources revalidated ahead of expiry',
+    ['action']  # refreshed, unchanged, evicted or uncached
+)
+
+# Adaptive TTLs
+adaptive_ttl_seconds = Histogram(
+    'adaptive_ttl_seconds',
+    'TTL assigned to each stored or revalidated resource',
+    buckets=(900, 3600, 4 * 3600, 12 * 3600, 86400, 3 * 86400, 7 * 86400, 14 * 86400, 30 * 86400, 90 * 86400)
+)
+resource_change_observations = Counter(
+    'resource_change_observations_total',
+    'Refreshes of cached resources by whether upstream had changed (changed / total = staleness rate)',
+    ['outcome']  # changed or unchanged
+)
+
+# Tiered lookups (L1 in-process, L2 Redis, L3 SQLite)
+cache_tier_lookups = Counter(
+    'cache_tier_lookups_total',
+    'Metadata lookups per cache tier by result (hits / (hits + misses) = tier hit rate)',
+    ['tier', 'result']  # tier: l1, l2 or l3; result: hit or miss
+)
+l1_cache_entries = Gauge(
+    'l1_cache_entries',
+    'Resources held in the in-process L1 cache'
+)
+l1_cache_bytes = Gauge(
+    'l1_cache_bytes',
+    'Estimated bytes held in the in-process L1 cache'
+)
+l1_cache_evictions = Counter(
+    'l1_cache_evictions_total',
+    'Resources evicted from the L1 cache to stay within its bounds'
+)
+
+# Redis record encoding
+redis_record_bytes = Histogram(
+    'redis_record_bytes',
+    'Encoded size of resource records written to Redis',
+    buckets=(128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536)
+)
+
+# Search result cache
+search_result_cache_lookups = Counter(
+    'search_result_cache_lookups_total',
+    'Searches answered from (or missing) the search result cache',
+    ['result']  # hit or miss
+)
+search_result_cache_invalidations = Counter(
+    'search_result_cache_invalidations_total',
+    'Cached searches dropped because a listed resource changed or everything was invalidated',
+    ['scope']  # resources or all
+)
+
+# Probabilistic early expiration (XFetch) of Redis copies
+redis_early_refreshes = Counter(
+    'redis_early_refreshes_total',
+    'Redis copies renewed ahead of expiry by XFetch, by outcome',
+    ['outcome']  # refreshed, failed, or deduplicated (a renewal was already running)
+)
+redis_stampede_reads_avoided = Counter(
+    'redis_stampede_reads_avoided_total',
+    'Reads served by an early-renewed Redis copy after the copy it replaced would have expired'
+)
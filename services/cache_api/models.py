@@ -64,6 +64,7 @@ class SearchRequest(BaseModel):
     query: str = Field(..., description="Search query")
     resource_types: Optional[List[int]] = Field(None, description="Filter by resource type IDs")
     limit: int = Field(100, ge=1, le=500, description="Maximum results")
+    sort: str = Field("relevance", description="ResourceSpace order_by (relevance, date, colour, ...)")
 
 
 class PrefetchRequest(BaseModel):
@@ -81,4 +82,25 @@ class CacheStats(BaseModel):
     hit_rate: float = Field(..., description="Cache hit rate (0-1)")
     total_hits: int = Field(..., description="Total cache hits")
     total_misses: int = Field(..., description="Total cache misses")
-    most_accessed: List[Dict[str, Any]] = Field(..., description="Most accessed resources")
\ No newline at end of file
+    most_accessed: List[Dict[str, Any]] = Field(..., description="Most accessed resources")
+
+
+class ResourceEvent(BaseModel):
+    """Resource change notification sent by a ResourceSpace hook"""
+    event: str = Field(..., description="Hook name (e.g. HookAfterUpdateResource) or update/upload/create/delete")
+    resource_id: int = Field(..., description="Resource that changed")
+
+
+class EventBatch(BaseModel):
+    """Batch of resource change notifications"""
+    events: List[ResourceEvent] = Field(..., max_length=1000, description="Change events, oldest first")
+
+
+class InvalidationRequest(BaseModel):
+    """Bulk invalidation request; every given criterion must match"""
+    resource_ids: Optional[List[int]] = Field(None, description="Resource IDs to purge")
+    resource_types: Optional[List[int]] = Field(None, description="Purge cached resources of these types")
+    modified_from: Optional[datetime] = Field(None, description="Purge resources modified at or after this")
+    modified_to: Optional[datetime] = Field(None, description="Purge resources modified at or before this")
+    query: Optional[str] = Field(None, description="Purge cached resources matching this full-text query")
+    wait: bool = Field(False, description="Wait for the purge to finish instead of returning a job to poll")
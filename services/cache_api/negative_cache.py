@@ -0,0 +1,61 @@
+"""
+Negative results for resource lookups
+Why ResourceSpace refused a resource ID, so the refusal can be cached and answered locally
+"""
+
+from typing import Any, Optional
+
+import httpx
+
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+ERROR = 'error'
+
+NEGATIVE_REASONS = (NOT_FOUND, FORBIDDEN, ERROR)
+
+_FORBIDDEN_HINTS = ('access', 'permission', 'denied', 'forbidden', 'not allowed', 'unauthori')
+_NOT_FOUND_HINTS = ('not found', 'no resource', 'invalid resource', 'does not exist')
+
+
+class ResourceUnavailable(Exception):
+    """ResourceSpace won't return a resource: it doesn't exist, we may not see it, or it errors"""
+
+    def __init__(self, resource_id: int, reason: str, detail: str = '', cached: bool = False):
+        super().__init__(f"Resource {resource_id} unavailable ({reason}){': ' + detail if detail else ''}")
+        self.resource_id = resource_id
+        self.reason = reason
+        self.detail = detail
+        self.cached = cached  # answered from the negative cache rather than upstream
+
+
+def classify_api_result(data: Any) -> Optional[str]:
+    """
+    Reason a get_resource_data result is unusable, or None if it is a resource
+
+    RS answers an unknown (or invisible) ref with false or an empty result, an
+    explicit failure with {'success': false, 'error': ...}, and misconfiguration
+    with a plain-text body.
+    """
+    if isinstance(data, dict) and data.get('success') is False:
+        message = str(data.get('error', '')).lower()
+        if any(hint in message for hint in _FORBIDDEN_HINTS):
+            return FORBIDDEN
+        if any(hint in message for hint in _NOT_FOUND_HINTS):
+            return NOT_FOUND
+        return ERROR
+    if not data:
+        return NOT_FOUND
+    if isinstance(data, str):
+        lowered = data.lower()
+        return FORBIDDEN if any(hint in lowered for hint in _FORBIDDEN_HINTS) else ERROR
+    return None
+
+
+def classify_http_error(error: httpx.HTTPStatusError) -> str:
+    """Reason for an HTTP error status returned for one resource"""
+    status = error.response.status_code
+    if status in (401, 403):
+        return FORBIDDEN
+    if status in (404, 410):
+        return NOT_FOUND
+    return ERROR
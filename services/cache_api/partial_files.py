@@ -0,0 +1,373 @@
+"""
+Chunked, resumable cache for large original files
+Stores fixed-size byte ranges in a sparse file per resource and tracks them with a chunk bitmap,
+so clients can be served the ranges they ask for before the whole file has been downloaded
+"""
+
+import os
+import re
+import logging
+import requests
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from circuit_breaker import CircuitBreaker
+from connection_manager import SQLiteConnectionManager
+
+logger = logging.getLogger(__name__)
+
+_CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+def is_upstream_failure(error: BaseException) -> bool:
+    """Whether a download error says ResourceSpace is unhealthy (as opposed to a bad request)"""
+    if isinstance(error, requests.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    return isinstance(error, (requests.ConnectionError, requests.Timeout))
+
+
+def open_download(url: str, timeout: int, circuit_breaker: Optional[CircuitBreaker] = None,
+                  **kwargs) -> requests.Response:
+    """
+    Start a streamed GET, through the breaker if there is one
+
+    Only the request up to the response headers counts as the breaker's call; reading
+    a large body is not a slow call.
+
+    Raises:
+        CircuitOpenError: the breaker is rejecting calls
+        requests.RequestException: the request failed or returned an error status
+    """
+    def request() -> requests.Response:
+        response = requests.get(url, stream=True, timeout=timeout, **kwargs)
+        try:
+            response.raise_for_status()
+        except requests.HTTPError:
+            response.close()
+            raise
+        return response
+
+    if circuit_breaker is None:
+        return request()
+    return circuit_breaker.call_sync(request, is_failure=is_upstream_failure)
+
+
+class RangeNotSupported(Exception):
+    """Upstream answered a ranged request with the whole file (no Range support, or the file changed)"""
+
+
+@dataclass
+class PartialFile:
+    """A partially downloaded original and the chunks it holds"""
+    resource_id: int
+    path: Path
+    file_url: str
+    total_size: int
+    chunk_size: int
+    bitmap: bytearray
+    validator: Optional[str] = None
+
+    @property
+    def chunk_count(self) -> int:
+        return (self.total_size + self.chunk_size - 1) // self.chunk_size
+
+    @property
+    def chunks_done(self) -> int:
+        return sum(bin(byte).count('1') for byte in self.bitmap)
+
+    @property
+    def is_complete(self) -> bool:
+        return self.chunks_done >= self.chunk_count
+
+    def has_chunk(self, index: int) -> bool:
+        return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+
+    def missing_runs(self, first: int, last: int) -> List[Tuple[int, int]]:
+        """Consecutive runs of missing chunk indexes in [first, last], so each run is one request"""
+        runs: List[Tuple[int, int]] = []
+        for index in range(first, min(last, self.chunk_count - 1) + 1):
+            if self.has_chunk(index):
+                continue
+            if runs and runs[-1][1] == index - 1:
+                runs[-1] = (runs[-1][0], index)
+            else:
+                runs.append((index, index))
+        return runs
+
+
+def _empty_bitmap(total_size: int, chunk_size: int) -> bytearray:
+    chunk_count = (total_size + chunk_size - 1) // chunk_size
+    return bytearray((chunk_count + 7) // 8)
+
+
+def _set_bits(bitmap: bytearray, indexes: List[int]):
+    for index in indexes:
+        bitmap[index >> 3] |= 1 << (index & 7)
+
+
+class PartialFileStore:
+    """Sparse chunk files under partials/ with their bitmaps in the cached_partials table"""
+
+    def __init__(self, db: SQLiteConnectionManager, partials_dir: Path,
+                 chunk_size: int = 4 * 1024 * 1024,
+                 timeout: int = 30,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        """
+        Initialize the store
+
+        Args:
+            db: Connection manager for the cache database
+            partials_dir: Directory for sparse partial files
+            chunk_size: Size of each cached byte range
+            timeout: Connect/read timeout for upstream range requests
+            circuit_breaker: Optional breaker guarding upstream range requests
+        """
+        self.db = db
+        self.partials_dir = Path(partials_dir)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.circuit_breaker = circuit_breaker
+        self.partials_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, resource_id: int) -> Path:
+        return self.partials_dir / f"{resource_id}.part"
+
+    def get(self, resource_id: int) -> Optional[PartialFile]:
+        """Load the partial file for a resource, if any chunks have been cached"""
+        with self.db.reader() as conn:
+            row = conn.execute("""
+                SELECT resource_id, partial_path, file_url, total_size, chunk_size, chunk_bitmap, validator
+                FROM cached_partials WHERE resource_id = ?
+            """, (resource_id,)).fetchone()
+
+        if not row:
+            return None
+        return PartialFile(
+            resource_id=row['resource_id'],
+            path=Path(row['partial_path']),
+            file_url=row['file_url'],
+            total_size=row['total_size'],
+            chunk_size=row['chunk_size'],
+            bitmap=bytearray(row['chunk_bitmap']),
+            validator=row['validator']
+        )
+
+    def _create(self, resource_id: int, file_url: str, total_size: int,
+                validator: Optional[str], path: Optional[Path] = None) -> PartialFile:
+        """Register a new sparse partial file of total_size bytes"""
+        path = path or self._path(resource_id)
+        if not path.exists():
+            with open(path, 'wb') as f:
+                f.truncate(total_size)
+
+        partial = PartialFile(
+            resource_id=resource_id,
+            path=path,
+            file_url=file_url,
+            total_size=total_size,
+            chunk_size=self.chunk_size,
+            bitmap=_empty_bitmap(total_size, self.chunk_size),
+            validator=validator
+        )
+        with self.db.writer() as conn:
+            conn.execute("""
+                INSERT INTO cached_partials (
+                    resource_id, partial_path, file_url, total_size, chunk_size,
+                    chunk_bitmap, chunks_done, validator
+                ) VALUES (?, ?, ?, ?, ?, ?, 0, ?)
+                ON CONFLICT(resource_id) DO UPDATE SET
+                    partial_path = excluded.partial_path,
+                    file_url = excluded.file_url,
+                    total_size = excluded.total_size,
+                    chunk_size = excluded.chunk_size,
+                    chunk_bitmap = excluded.chunk_bitmap,
+                    chunks_done = 0,
+                    validator = excluded.validator,
+                    last_accessed = datetime('now')
+            """, (resource_id, str(path), file_url, total_size, self.chunk_size,
+                  bytes(partial.bitmap), validator))
+        return partial
+
+    def _mark_chunks(self, partial: PartialFile, indexes: List[int]):
+        """Persist newly completed chunks, merging with chunks other requests finished meanwhile"""
+        with self.db.writer() as conn:
+            row = conn.execute(
+                "SELECT chunk_bitmap FROM cached_partials WHERE resource_id = ?",
+                (partial.resource_id,)
+            ).fetchone()
+            if row is None:
+                # Evicted or finalized while we were downloading
+                return
+            bitmap = bytearray(row['chunk_bitmap'])
+            _set_bits(bitmap, indexes)
+            partial.bitmap = bitmap
+            conn.execute("""
+                UPDATE cached_partials
+                SET chunk_bitmap = ?, chunks_done = ?, file_url = ?, last_accessed = datetime('now')
+                WHERE resource_id = ?
+            """, (bytes(bitmap), partial.chunks_done, partial.file_url, partial.resource_id))
+
+    def remove(self, resource_id: int):
+        """Forget a partial file and delete its data"""
+        with self.db.writer() as conn:
+            rows = conn.execute(
+                "DELETE FROM cached_partials WHERE resource_id = ? RETURNING partial_path",
+                (resource_id,)
+            ).fetchall()
+        for row in rows:
+            Path(row['partial_path']).unlink(missing_ok=True)
+
+    def _request(self, file_url: str, first_byte: int, last_byte: Optional[int],
+                 validator: Optional[str]) -> requests.Response:
+        headers = {'Range': f"bytes={first_byte}-{'' if last_byte is None else last_byte}"}
+        if validator:
+            # If the file changed upstream we get a 200 with the new content instead of a stale range
+            headers['If-Range'] = validator
+        response = open_download(file_url, self.timeout, self.circuit_breaker, headers=headers)
+        if response.status_code != 206:
+            response.close()
+            raise RangeNotSupported(f"Upstream returned {response.status_code} for a ranged request")
+        return response
+
+    def _write_run(self, partial: PartialFile, response: requests.Response, first_chunk: int):
+        """Write a 206 body into the sparse file, persisting each chunk as soon as it is complete"""
+        offset = first_chunk * partial.chunk_size
+        chunk_index = first_chunk
+        chunk_filled = 0
+
+        with response, open(partial.path, 'r+b') as f:
+            f.seek(offset)
+            for data in response.iter_content(chunk_size=min(partial.chunk_size, 1024 * 1024)):
+                if not data:
+                    continue
+                f.write(data)
+                chunk_filled += len(data)
+
+                completed = []
+                while chunk_index < partial.chunk_count:
+                    chunk_len = min(partial.chunk_size, partial.total_size - chunk_index * partial.chunk_size)
+                    if chunk_filled < chunk_len:
+                        break
+                    chunk_filled -= chunk_len
+                    completed.append(chunk_index)
+                    chunk_index += 1
+                if completed:
+                    # Data must be in the file before the bitmap claims it
+                    f.flush()
+                    self._mark_chunks(partial, completed)
+
+    def fetch_range(self, resource_id: int, file_url: str, first_byte: int,
+                    last_byte: Optional[int], partial: Optional[PartialFile] = None) -> PartialFile:
+        """
+        Make sure the chunks covering first_byte..last_byte are cached
+
+        Args:
+            resource_id: Resource ID
+            file_url: Upstream URL of the original file
+            first_byte: First byte needed
+            last_byte: Last byte needed (None for end of file)
+            partial: Already loaded partial file, if any
+
+        Returns:
+            The partial file with the requested chunks present
+
+        Raises:
+            RangeNotSupported: upstream won't serve ranges (or the file changed); fall back to a full download
+        """
+        first = first_byte // self.chunk_size
+
+        if partial is None:
+            # The first request both discovers the file size and fills the chunks it covers
+            start = first * self.chunk_size
+            end = None if last_byte is None else (last_byte // self.chunk_size + 1) * self.chunk_size - 1
+            response = self._request(file_url, start, end, None)
+            match = _CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+            if not match:
+                response.close()
+                raise RangeNotSupported("Upstream 206 response has no usable Content-Range")
+
+            validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+            partial = self._create(resource_id, file_url, int(match.group(3)), validator)
+            self._write_run(partial, response, first)
+            return partial
+
+        partial.file_url = file_url
+        last = partial.chunk_count - 1 if last_byte is None else last_byte // partial.chunk_size
+        for run_first, run_last in partial.missing_runs(first, last):
+            response = self._request(
+                file_url,
+                run_first * partial.chunk_size,
+                min((run_last + 1) * partial.chunk_size, partial.total_size) - 1,
+                partial.validator
+            )
+            self._write_run(partial, response, run_first)
+
+        return partial
+
+    def adopt(self, resource_id: int, temp_path: Path, bytes_written: int, total_size: int,
+              file_url: str, validator: Optional[str]) -> Optional[PartialFile]:
+        """
+        Keep the head of an interrupted sequential download so it can be resumed
+
+        Args:
+            temp_path: Temp file holding bytes 0..bytes_written-1
+            bytes_written: Bytes received before the download failed
+            total_size: Full size reported by upstream
+
+        Returns:
+            The new partial file, or None if not even one chunk was complete
+        """
+        complete_chunks = bytes_written // self.chunk_size
+        if complete_chunks == 0 or bytes_written >= total_size:
+            return None
+
+        path = self._path(resource_id)
+        os.replace(temp_path, path)
+        with open(path, 'r+b') as f:
+            f.truncate(total_size)
+
+        partial = self._create(resource_id, file_url, total_size, validator, path=path)
+        self._mark_chunks(partial, list(range(complete_chunks)))
+        logger.info(f"Kept {complete_chunks} chunks of interrupted download for resource {resource_id}")
+        return partial
+
+    def evict_idle(self, idle_hours: float, force: bool = False) -> Tuple[int, int]:
+        """
+        Drop partial files that haven't been read or extended recently
+
+        Returns:
+            Tuple of (partials_removed, bytes_freed)
+        """
+        with self.db.writer() as conn:
+            if force:
+                rows = conn.execute("""
+                    DELETE FROM cached_partials
+                    RETURNING partial_path, chunks_done, chunk_size
+                """).fetchall()
+            else:
+                rows = conn.execute("""
+                    DELETE FROM cached_partials
+                    WHERE last_accessed < datetime('now', ?)
+                    RETURNING partial_path, chunks_done, chunk_size
+                """, (f'-{idle_hours} hours',)).fetchall()
+
+        bytes_freed = 0
+        for row in rows:
+            try:
+                Path(row['partial_path']).unlink(missing_ok=True)
+                bytes_freed += row['chunks_done'] * row['chunk_size']
+            except OSError as e:
+                logger.error(f"Failed to remove partial file {row['partial_path']}: {e}")
+
+        return len(rows), bytes_freed
+
+    def stats(self) -> Dict[str, int]:
+        """Count and approximate size of cached partial files"""
+        with self.db.reader() as conn:
+            row = conn.execute("""
+                SELECT COUNT(*) AS count,
+                       COALESCE(SUM(MIN(chunks_done * chunk_size, total_size)), 0) AS size
+                FROM cached_partials
+            """).fetchone()
+        return {'partial_count': row['count'], 'partial_size': row['size']}
@@ -1,17 +1,83 @@
 """
 Redis cache wrapper for ResourceSpace Cache API
-Provides an optional hot cache layer for lightweight metadata
+Provides an optional hot cache layer for resource metadata (lightweight summaries,
+or fully hydrated records with REDIS_FULL_RECORDS)
 """
 
 import json
+import math
+import time
+import uuid
+import random
+import asyncio
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
 import redis
 from redis.exceptions import RedisError
 from config import settings
+from redis_codec import RecordCodec
+from metrics import redis_record_bytes
 
 logger = logging.getLogger(__name__)
 
+# Hash of resource_id -> hit count, fed by the write-behind access log
+RESOURCE_HITS_KEY = "resource_hits"
+
+# Every write and delete is announced here so replicas drop their in-process (L1) copies
+INVALIDATION_CHANNEL = "cache:invalidations"
+INVALIDATION_POLL_SECONDS = 1.0
+
+# Cached search result lists, and the sets indexing them (all of them, and per listed resource)
+SEARCH_INDEX_KEY = "search:index"
+
+# Identifies this process's own announcements on the channel
+INSTANCE_ID = uuid.uuid4().hex
+
+# Delete a lock only if it still holds our token (it may have expired and been re-taken)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def _lock_key(resource_id: int, scope: str = "") -> str:
+    return f"resource:{resource_id}:lock" + (f":{scope}" if scope else "")
+
+
+def _negative_key(resource_id: int) -> str:
+    return f"resource:{resource_id}:negative"
+
+
+def xfetch_due(delta: float, expiry: float, beta: float = 1.0, now: Optional[float] = None) -> bool:
+    """
+    XFetch: whether a reader should recompute a value ahead of its expiry
+    
+    Renews with a probability that rises as expiry nears, sooner for values that are
+    slow to recompute (delta seconds), so one reader renews a hot key before it
+    expires instead of all of them missing at once. beta > 1 favours renewing earlier.
+    """
+    if delta <= 0 or beta <= 0:
+        return False
+    now = time.time() if now is None else now
+    return now - delta * beta * math.log(1.0 - random.random()) >= expiry
+
+
+def _search_key(query_key: str) -> str:
+    return f"search:{query_key}"
+
+
+def _search_members_key(resource_id: int) -> str:
+    return f"resource:{resource_id}:searches"
+
+
+def _invalidation_message(resource_ids: Optional[Iterable[int]] = None) -> str:
+    """Channel payload naming the changed resources (None: everything)"""
+    if resource_ids is None:
+        return json.dumps({'origin': INSTANCE_ID, 'all': True})
+    return json.dumps({'origin': INSTANCE_ID, 'ids': [int(rid) for rid in resource_ids]})
+
 
 class RedisCache:
     """Redis cache wrapper with fallback handling"""
@@ -20,6 +86,10 @@ class RedisCache:
         self.client: Optional[redis.asyncio.Redis] = None
         self.enabled = settings.REDIS_ENABLED
         self.ttl = settings.REDIS_TTL_SECONDS
+        self.full_records = settings.REDIS_FULL_RECORDS
+        self.codec = RecordCodec(settings.REDIS_CODEC, settings.REDIS_COMPRESS_MIN_BYTES)
+        # Resource records are binary; everything else goes through the text client
+        self.binary_client: Optional[redis.asyncio.Redis] = None
         
     async def connect(self) -> bool:
         """Initialize Redis connection"""
@@ -28,15 +98,8 @@ class RedisCache:
             return False
             
         try:
-            self.client = redis.asyncio.Redis(
-                host=settings.REDIS_HOST,
-                port=settings.REDIS_PORT,
-                db=settings.REDIS_DB,
-                password=settings.REDIS_PASSWORD,
-                decode_responses=True,
-                socket_timeout=5,
-                socket_connect_timeout=5
-            )
+            self.client = self._new_client(decode_responses=True)
+            self.binary_client = self._new_client(decode_responses=False)
             
             # Test connection
             await self.client.ping()
@@ -47,123 +110,464 @@ class RedisCache:
             logger.error(f"Failed to connect to Redis: {e}")
             self.enabled = False
             self.client = None
+            self.binary_client = None
             return False
             
+    @staticmethod
+    def _new_client(decode_responses: bool) -> redis.asyncio.Redis:
+        return redis.asyncio.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            password=settings.REDIS_PASSWORD,
+            decode_responses=decode_responses,
+            socket_timeout=5,
+            socket_connect_timeout=5
+        )
+            
     async def disconnect(self):
         """Close Redis connection"""
         if self.client:
             await self.client.close()
+        if self.binary_client:
+            await self.binary_client.close()
             
     async def get_resource(self, resource_id: int) -> Optional[Dict[str, Any]]:
-        """Get resource metadata from Redis"""
-        if not self.enabled or not self.client:
+        """
+        Get resource metadata from Redis
+        
+        Returns:
+            The stored record, with '_full_record' set when it is the fully hydrated
+            one and '_xfetch' holding (compute seconds, expiry, renewed_from), or None
+            on a miss
+        """
+        if not self.enabled or not self.binary_client:
             return None
             
         try:
             key = f"resource:{resource_id}"
-            data = await self.client.get(key)
+            data = await self.binary_client.get(key)
             if data:
-                # Increment hit counter
-                await self.increment_hits(resource_id)
-                return json.loads(data)
+                # Hits are counted by the caller's access log, not per read
+                return self._decode_record(data)
             return None
             
-        except (RedisError, json.JSONDecodeError) as e:
+        except (RedisError, ValueError) as e:
             logger.error(f"Redis get error for resource {resource_id}: {e}")
             return None
             
-    async def set_resource(self, resource_id: int, data: Dict[str, Any], ttl: Optional[int] = None):
-        """Set resource metadata in Redis"""
-        if not self.enabled or not self.client:
+    async def get_resources(self, resource_ids: List[int], chunk_size: int = 500) -> Dict[int, Dict[str, Any]]:
+        """
+        Get several resources with one MGET per chunk, pipelined into a single round trip
+        
+        Returns:
+            Dict of resource_id -> record (as get_resource) for every ID found
+        """
+        if not self.enabled or not self.binary_client or not resource_ids:
+            return {}
+            
+        resource_ids = list(dict.fromkeys(int(rid) for rid in resource_ids))
+        try:
+            async with self.binary_client.pipeline(transaction=False) as pipe:
+                for i in range(0, len(resource_ids), chunk_size):
+                    pipe.mget([f"resource:{resource_id}" for resource_id in resource_ids[i:i + chunk_size]])
+                values = [value for chunk in await pipe.execute() for value in chunk]
+                
+        except RedisError as e:
+            logger.error(f"Redis multi-get error for {len(resource_ids)} resources: {e}")
+            return {}
+            
+        records = {}
+        for resource_id, value in zip(resource_ids, values):
+            if not value:
+                continue
+            try:
+                record = self._decode_record(value)
+            except ValueError as e:
+                logger.error(f"Redis get error for resource {resource_id}: {e}")
+                continue
+            if record is not None:
+                records[resource_id] = record
+        return records
+            
+    async def set_resource(self, resource_id: int, data: Dict[str, Any], ttl: Optional[int] = None,
+                           compute_seconds: float = 0.0, changed: bool = False):
+        """
+        Set resource metadata in Redis
+        
+        With full_records the record is stored as given (minus '_' annotations and the
+        replica-local cached_file), so data must be the hydrated SQLite shape; otherwise
+        only a lightweight summary is kept.
+        
+        Args:
+            resource_id: Resource ID
+            data: Resource data
+            ttl: Seconds to keep it (default: the configured TTL)
+            compute_seconds: How long producing data took, stored for early refresh (xfetch_due)
+            changed: The data is new, so other replicas must drop their L1 copies
+        """
+        if not self.enabled or not self.binary_client:
             return
             
         try:
             key = f"resource:{resource_id}"
-            # Store only lightweight metadata
-            metadata = {
-                'resource_id': resource_id,
-                'title': data.get('title') or data.get('field8'),
-                'resource_type': data.get('resource_type'),
-                'file_extension': data.get('file_extension'),
-                'thumb_url': data.get('thumb_url'),
-                'creation_date': data.get('creation_date'),
-                'modified': data.get('modified')
-            }
+            ttl = ttl or self.ttl
+            value = self._encode_record(resource_id, data, ttl, compute_seconds)
             
-            await self.client.set(
-                key, 
-                json.dumps(metadata),
-                ex=ttl or self.ttl
-            )
+            async with self.binary_client.pipeline(transaction=False) as pipe:
+                pipe.set(key, value, ex=ttl)
+                if changed:
+                    pipe.publish(INVALIDATION_CHANNEL, _invalidation_message([resource_id]))
+                await pipe.execute()
             
-        except (RedisError, json.JSONEncodeError) as e:
+        except (RedisError, ValueError, TypeError) as e:
             logger.error(f"Redis set error for resource {resource_id}: {e}")
             
+    async def set_resources(self, resources: Dict[int, Dict[str, Any]],
+                            ttls: Optional[Dict[int, int]] = None,
+                            compute_seconds: float = 0.0,
+                            renewed_from: Optional[Dict[int, float]] = None,
+                            changed: Optional[List[int]] = None):
+        """
+        Set several resources in one pipelined round trip
+        
+        Only changed resources are announced to other replicas (one message): copying
+        unchanged data from SQLite or renewing it early leaves their L1 copies valid.
+        
+        Args:
+            resources: Dict of resource_id -> data (as for set_resource)
+            ttls: Optional per-resource TTLs in seconds; others get the default TTL
+            compute_seconds: How long producing each resource took, on average
+            renewed_from: For early refreshes, the expiry of the copy each one replaces
+            changed: IDs whose data is new (announced even if not written here)
+        """
+        if not self.enabled or not self.binary_client or not (resources or changed):
+            return
+            
+        ttls = ttls or {}
+        renewed_from = renewed_from or {}
+        try:
+            async with self.binary_client.pipeline(transaction=False) as pipe:
+                for resource_id, data in resources.items():
+                    ttl = ttls.get(resource_id) or self.ttl
+                    try:
+                        value = self._encode_record(resource_id, data, ttl, compute_seconds,
+                                                    renewed_from.get(resource_id))
+                    except (ValueError, TypeError) as e:
+                        logger.error(f"Redis set error for resource {resource_id}: {e}")
+                        continue
+                    pipe.set(f"resource:{resource_id}", value, ex=ttl)
+                if changed:
+                    pipe.publish(INVALIDATION_CHANNEL, _invalidation_message(changed))
+                await pipe.execute()
+                
+        except RedisError as e:
+            logger.error(f"Redis bulk set error for {len(resources)} resources: {e}")
+            
+    def _encode_record(self, resource_id: int, data: Dict[str, Any], ttl: int,
+                       compute_seconds: float = 0.0, renewed_from: Optional[float] = None) -> bytes:
+        """The stored value: the full record or its summary, with the codec header"""
+        if self.full_records:
+            record = {
+                field: item for field, item in data.items()
+                if not field.startswith('_') and field != 'cached_file'
+            }
+        else:
+            record = self._summary(resource_id, data)
+        # Early refresh inputs travel with the value (see xfetch_due)
+        record['xfetch'] = [round(compute_seconds, 4), time.time() + ttl, renewed_from]
+        value = self.codec.encode(record, full_record=self.full_records)
+        redis_record_bytes.observe(len(value))
+        return value
+        
+    def _decode_record(self, value: bytes) -> Optional[Dict[str, Any]]:
+        """Decode a stored value, moving codec flags and early refresh inputs into '_' annotations"""
+        record, full_record = self.codec.decode(value)
+        if record is None:
+            return None
+        if full_record:
+            record['_full_record'] = True
+        xfetch = record.pop('xfetch', None)
+        if xfetch:
+            record['_xfetch'] = tuple(xfetch)
+        return record
+            
+    @staticmethod
+    def _summary(resource_id: int, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Lightweight metadata kept when full records are off"""
+        return {
+            'resource_id': resource_id,
+            'title': data.get('title') or data.get('field8'),
+            'resource_type': data.get('resource_type'),
+            'file_extension': data.get('file_extension'),
+            'thumb_url': data.get('thumb_url'),
+            'creation_date': data.get('creation_date'),
+            'modified': data.get('modified'),
+            'generation': data.get('generation')
+        }
+        
     async def delete_resource(self, resource_id: int):
-        """Delete resource from Redis"""
+        """Delete resource (and any negative result for it) from Redis"""
         if not self.enabled or not self.client:
             return
             
         try:
-            key = f"resource:{resource_id}"
-            await self.client.delete(key)
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.delete(f"resource:{resource_id}", _negative_key(resource_id))
+                pipe.publish(INVALIDATION_CHANNEL, _invalidation_message([resource_id]))
+                await pipe.execute()
             
         except RedisError as e:
             logger.error(f"Redis delete error for resource {resource_id}: {e}")
             
+    async def delete_resources(self, resource_ids: List[int], chunk_size: int = 500):
+        """Delete several resources (and their negative results) with pipelined UNLINKs"""
+        if not self.enabled or not self.client or not resource_ids:
+            return
+            
+        try:
+            # UNLINK frees the values off Redis' main thread, so large purges don't stall readers
+            async with self.client.pipeline(transaction=False) as pipe:
+                for i in range(0, len(resource_ids), chunk_size):
+                    keys = []
+                    for resource_id in resource_ids[i:i + chunk_size]:
+                        keys += [f"resource:{resource_id}", _negative_key(resource_id)]
+                    pipe.unlink(*keys)
+                pipe.publish(INVALIDATION_CHANNEL, _invalidation_message(resource_ids))
+                await pipe.execute()
+                
+        except RedisError as e:
+            logger.error(f"Redis bulk delete error for {len(resource_ids)} resources: {e}")
+            
+    async def get_negative(self, resource_id: int) -> Optional[Dict[str, Any]]:
+        """Get a cached refusal ({'reason', 'detail'}) for a resource ID"""
+        if not self.enabled or not self.client:
+            return None
+            
+        try:
+            data = await self.client.get(_negative_key(resource_id))
+            return json.loads(data) if data else None
+            
+        except (RedisError, json.JSONDecodeError) as e:
+            logger.error(f"Redis negative get error for resource {resource_id}: {e}")
+            return None
+            
+    async def set_negative(self, resource_id: int, reason: str, detail: str, ttl: int):
+        """Remember a refusal for a resource ID; also drops its positive entry"""
+        if not self.enabled or not self.client:
+            return
+            
+        try:
+            # Short TTLs keep the number of negative keys bounded by the refusal rate
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(_negative_key(resource_id), json.dumps({'reason': reason, 'detail': detail}), ex=ttl)
+                if reason != 'error':
+                    pipe.delete(f"resource:{resource_id}")
+                pipe.publish(INVALIDATION_CHANNEL, _invalidation_message([resource_id]))
+                await pipe.execute()
+                
+        except RedisError as e:
+            logger.error(f"Redis negative set error for resource {resource_id}: {e}")
+            
+    async def get_search_result(self, query_key: str) -> Optional[List[int]]:
+        """Ordered resource IDs of a cached search, or None"""
+        if not self.enabled or not self.client:
+            return None
+            
+        try:
+            data = await self.client.get(_search_key(query_key))
+            return json.loads(data) if data else None
+            
+        except (RedisError, json.JSONDecodeError) as e:
+            logger.error(f"Redis search result get error: {e}")
+            return None
+            
+    async def set_search_result(self, query_key: str, resource_ids: List[int], ttl: int):
+        """Cache a search's ordered result IDs, indexed by each listed resource"""
+        if not self.enabled or not self.client:
+            return
+            
+        try:
+            key = _search_key(query_key)
+            async with self.client.pipeline(transaction=False) as pipe:
+                pipe.set(key, json.dumps(resource_ids), ex=ttl)
+                pipe.sadd(SEARCH_INDEX_KEY, key)
+                pipe.expire(SEARCH_INDEX_KEY, ttl)
+                for resource_id in resource_ids:
+                    pipe.sadd(_search_members_key(resource_id), key)
+                    pipe.expire(_search_members_key(resource_id), ttl)
+                await pipe.execute()
+                
+        except RedisError as e:
+            logger.error(f"Redis search result set error: {e}")
+            
+    async def delete_search_results(self, resource_ids: Optional[List[int]] = None):
+        """Drop cached searches listing any of these resources (None: every cached search)"""
+        if not self.enabled or not self.client:
+            return
+            
+        try:
+            if resource_ids is None:
+                index_keys = [SEARCH_INDEX_KEY]
+            else:
+                index_keys = [_search_members_key(resource_id) for resource_id in resource_ids]
+            async with self.client.pipeline(transaction=False) as pipe:
+                for index_key in index_keys:
+                    pipe.smembers(index_key)
+                keys = set().union(*await pipe.execute()) if index_keys else set()
+            # Index sets may still name keys that expired; unlinking those is harmless
+            if keys or resource_ids is None:
+                await self.client.unlink(*keys, *index_keys)
+                
+        except RedisError as e:
+            logger.error(f"Redis search result delete error: {e}")
+            
+    async def publish_invalidation(self, resource_ids: Optional[List[int]] = None):
+        """Tell other replicas to drop their L1 copies of these resources (None: all of them)"""
+        if not self.enabled or not self.client:
+            return
+            
+        try:
+            await self.client.publish(INVALIDATION_CHANNEL, _invalidation_message(resource_ids))
+            
+        except RedisError as e:
+            logger.error(f"Redis invalidation publish error: {e}")
+            
+    async def listen_invalidations(self, handler: Callable[[Optional[List[int]]], None],
+                                   retry_seconds: float = 5.0):
+        """
+        Apply other replicas' invalidations until cancelled
+        
+        Args:
+            handler: Called with the invalidated resource IDs, or None for everything
+            retry_seconds: Pause before resubscribing after a connection error
+        """
+        while self.enabled and self.client:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything published while we were not listening is unknown: start clean
+                handler(None)
+                while True:
+                    # A poll timeout shorter than the client's socket_timeout: a quiet
+                    # channel returns None here instead of raising a read timeout
+                    message = await pubsub.get_message(ignore_subscribe_messages=True,
+                                                       timeout=INVALIDATION_POLL_SECONDS)
+                    if message is None or message.get('type') != 'message':
+                        continue
+                    try:
+                        self._apply_invalidation(message['data'], handler)
+                    except Exception as e:
+                        # One bad message must not stop the listener
+                        logger.error(f"Ignoring invalidation message {str(message.get('data'))[:200]!r}: {e}")
+                        
+            except Exception as e:
+                logger.error(f"Redis invalidation channel error: {e}")
+                await asyncio.sleep(retry_seconds)
+            finally:
+                await pubsub.aclose()
+                
+    @staticmethod
+    def _apply_invalidation(data: str, handler: Callable[[Optional[List[int]]], None]):
+        payload = json.loads(data)
+        if not isinstance(payload, dict):
+            raise ValueError("payload is not an object")
+        if payload.get('origin') == INSTANCE_ID:
+            return
+        if payload.get('all'):
+            handler(None)
+        else:
+            handler([int(rid) for rid in payload.get('ids', [])])
+                
     async def increment_hits(self, resource_id: int):
         """Increment resource hit counter"""
         if not self.enabled or not self.client:
             return
             
         try:
-            key = f"resource_hits:{resource_id}"
-            await self.client.incr(key)
+            await self.client.hincrby(RESOURCE_HITS_KEY, str(resource_id), 1)
             
         except RedisError as e:
             logger.error(f"Redis incr error for resource {resource_id}: {e}")
             
+    async def record_access_batch(self, batch: Dict[int, Tuple[str, int]]):
+        """Apply a flushed access log batch with one pipelined HINCRBY per resource"""
+        if not self.enabled or not self.client or not batch:
+            return
+            
+        try:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for resource_id, (_, hits) in batch.items():
+                    pipe.hincrby(RESOURCE_HITS_KEY, str(resource_id), hits)
+                await pipe.execute()
+                
+        except RedisError as e:
+            logger.error(f"Redis access log flush error: {e}")
+            
     async def get_hits(self, resource_id: int) -> int:
         """Get resource hit count"""
         if not self.enabled or not self.client:
             return 0
             
         try:
-            key = f"resource_hits:{resource_id}"
-            hits = await self.client.get(key)
+            hits = await self.client.hget(RESOURCE_HITS_KEY, str(resource_id))
             return int(hits) if hits else 0
             
         except (RedisError, ValueError) as e:
             logger.error(f"Redis get hits error for resource {resource_id}: {e}")
             return 0
             
-    async def acquire_lock(self, resource_id: int, timeout: int = 10) -> bool:
-        """Acquire a lock to prevent duplicate fetches"""
+    async def acquire_lock(self, resource_id: int, timeout: int = 10,
+                           scope: str = "", token: str = "1") -> bool:
+        """
+        Acquire a lock to prevent duplicate fetches
+        
+        Args:
+            resource_id: Resource ID
+            timeout: Lock expiry in seconds
+            scope: Optional operation name so e.g. metadata and file fetches lock separately
+            token: Value identifying the holder, checked again on release
+        """
         if not self.enabled or not self.client:
             return True  # If Redis is disabled, always allow
             
         try:
-            key = f"resource:{resource_id}:lock"
+            key = _lock_key(resource_id, scope)
             # Use SET NX (set if not exists) with expiration
-            result = await self.client.set(key, "1", nx=True, ex=timeout)
+            result = await self.client.set(key, token, nx=True, ex=timeout)
             return bool(result)
             
         except RedisError as e:
             logger.error(f"Redis lock error for resource {resource_id}: {e}")
             return True  # Allow operation on error
             
-    async def release_lock(self, resource_id: int):
-        """Release resource lock"""
+    async def release_lock(self, resource_id: int, scope: str = "", token: Optional[str] = None):
+        """Release resource lock (only if still held with token, when one is given)"""
         if not self.enabled or not self.client:
             return
             
         try:
-            key = f"resource:{resource_id}:lock"
-            await self.client.delete(key)
+            key = _lock_key(resource_id, scope)
+            if token is None:
+                await self.client.delete(key)
+            else:
+                await self.client.eval(RELEASE_LOCK_SCRIPT, 1, key, token)
             
         except RedisError as e:
             logger.error(f"Redis unlock error for resource {resource_id}: {e}")
             
+    async def lock_exists(self, resource_id: int, scope: str = "") -> bool:
+        """Check whether someone currently holds the resource lock"""
+        if not self.enabled or not self.client:
+            return False
+            
+        try:
+            return bool(await self.client.exists(_lock_key(resource_id, scope)))
+            
+        except RedisError as e:
+            logger.error(f"Redis lock check error for resource {resource_id}: {e}")
+            return False
+            
     async def get_cache_status(self) -> Dict[str, Any]:
         """Get Redis cache statistics"""
         status = {
@@ -172,7 +576,9 @@ class RedisCache:
             'keys': 0,
             'memory_used': 0,
             'hits': 0,
-            'misses': 0
+            'misses': 0,
+            'codec': self.codec.codec,
+            'full_records': self.full_records
         }
         
         if not self.enabled or not self.client:
@@ -0,0 +1,112 @@
+"""
+Binary encoding for resource records kept in Redis
+Every value starts with a two-byte header naming its codec and flags, so the codec can
+change (or compression be switched on) without flushing Redis: readers decode any
+format they know, and the old header-less JSON values are still understood
+"""
+
+import json
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import msgpack
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+# Codec IDs (first header byte). Never reuse a retired ID.
+CODEC_JSON = 1
+CODEC_MSGPACK = 2
+CODECS = {'json': CODEC_JSON, 'msgpack': CODEC_MSGPACK}
+
+# Flags (second header byte)
+FLAG_ZSTD = 0x01         # body is zstd-compressed
+FLAG_FULL_RECORD = 0x02  # body is the fully hydrated record, not the lightweight summary
+
+# Values written before the header existed are plain JSON objects
+LEGACY_JSON_PREFIX = b'{'
+
+_compressor = zstandard.ZstdCompressor(level=3)
+_decompressor = zstandard.ZstdDecompressor()
+
+
+def _pack(codec: int, record: Dict[str, Any]) -> bytes:
+    if codec == CODEC_MSGPACK:
+        return msgpack.packb(record, use_bin_type=True, default=str)
+    return json.dumps(record, default=str, separators=(',', ':')).encode()
+
+
+def _unpack(codec: int, body: bytes) -> Dict[str, Any]:
+    if codec == CODEC_MSGPACK:
+        return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+
+class RecordCodec:
+    """Encodes records with the configured codec; decodes every known format"""
+
+    def __init__(self, codec: str = 'msgpack', compress_min_bytes: int = 1024):
+        """
+        Initialize the codec
+
+        Args:
+            codec: 'msgpack' or 'json', used for new writes
+            compress_min_bytes: zstd-compress encoded bodies at least this large (0 disables)
+
+        Raises:
+            ValueError: unknown codec name
+        """
+        if codec not in CODECS:
+            raise ValueError(f"Unknown Redis codec {codec!r} (expected one of {sorted(CODECS)})")
+        self.codec = codec
+        self.codec_id = CODECS[codec]
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, record: Dict[str, Any], full_record: bool = False) -> bytes:
+        """
+        Encode a record with a format header
+
+        Args:
+            record: JSON-compatible dict (other values are stored as strings)
+            full_record: Whether this is the fully hydrated record
+
+        Returns:
+            Header plus (possibly compressed) body
+        """
+        body = _pack(self.codec_id, record)
+        flags = FLAG_FULL_RECORD if full_record else 0
+        if self.compress_min_bytes and len(body) >= self.compress_min_bytes:
+            compressed = _compressor.compress(body)
+            if len(compressed) < len(body):
+                body = compressed
+                flags |= FLAG_ZSTD
+        return bytes((self.codec_id, flags)) + body
+
+    @staticmethod
+    def decode(value: bytes) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Decode a value written by any codec version
+
+        Returns:
+            (record, full_record); the record is None for a format this version
+            doesn't know, which callers treat as a miss
+
+        Raises:
+            ValueError: corrupt body (including JSON and msgpack decode errors)
+        """
+        if value.startswith(LEGACY_JSON_PREFIX):
+            return json.loads(value), False
+        if len(value) < 2:
+            raise ValueError("Truncated Redis record")
+
+        codec_id, flags = value[0], value[1]
+        if codec_id not in CODECS.values():
+            logger.warning(f"Skipping Redis record with unknown codec {codec_id}")
+            return None, False
+        body = value[2:]
+        if flags & FLAG_ZSTD:
+            try:
+                body = _decompressor.decompress(body)
+            except zstandard.ZstdError as e:
+                raise ValueError(f"Corrupt compressed Redis record: {e}") from e
+        return _unpack(codec_id, body), bool(flags & FLAG_FULL_RECORD)
@@ -0,0 +1,124 @@
+"""
+Refresh-ahead sweep for the ResourceSpace cache
+Revalidates popular resources shortly before they expire, so entries that are read
+every day don't all miss at once when their TTL runs out
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from circuit_breaker import CircuitOpenError
+from metrics import refresh_ahead_runs, refresh_ahead_resources
+from resourcespace_wrapper import thread_pool
+
+logger = logging.getLogger(__name__)
+
+
+def parse_hour_window(value: str) -> Optional[Tuple[int, int]]:
+    """
+    Parse an 'H-H' window of local hours; the end is exclusive and may wrap past midnight
+
+    Returns:
+        (start, end) hours, or None for an empty value (any time)
+
+    Raises:
+        ValueError: malformed window
+    """
+    if not value or not value.strip():
+        return None
+    start, _, end = value.partition('-')
+    window = (int(start), int(end))
+    if not all(0 <= hour <= 24 for hour in window):
+        raise ValueError(f"Hours out of range in window {value!r}")
+    return window
+
+
+def in_hour_window(window: Optional[Tuple[int, int]], now: Optional[datetime] = None) -> bool:
+    """Whether now falls inside the window (always true without one)"""
+    if window is None:
+        return True
+    hour = (now or datetime.now()).hour
+    start, end = window
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+class RefreshAhead:
+    """
+    Bounded-rate refresh of popular entries nearing expiry
+
+    Each run picks resources that expire within the horizon and were hit at least
+    min_hits times in the last active_days, most popular first, and revalidates
+    them through the conditional refresh path (one cheap call when unchanged). Runs
+    only inside the off-peak window, if one is set, and stops as soon as the
+    upstream breaker opens. The horizon should cover the gap until the next run
+    (or the next off-peak window), or popular entries can still expire in between.
+    """
+
+    def __init__(self, wrapper, horizon_seconds: int = 12 * 3600, max_per_run: int = 500,
+                 rate_per_second: float = 5.0, min_hits: int = 2, active_days: int = 7,
+                 off_peak_hours: str = ''):
+        """
+        Initialize the sweep
+
+        Args:
+            wrapper: ResourceSpaceWrapper whose caches are kept warm
+            horizon_seconds: Refresh entries expiring within this many seconds
+            max_per_run: Most resources refreshed per run
+            rate_per_second: Upper bound on resources refreshed per second
+            min_hits: Hits a resource needs to be refreshed ahead of expiry
+            active_days: Only resources accessed within this many days
+            off_peak_hours: Local-hour window such as '1-6' or '22-5' (empty: any time)
+        """
+        self.wrapper = wrapper
+        self.horizon_seconds = horizon_seconds
+        self.max_per_run = max_per_run
+        self.rate_per_second = rate_per_second
+        self.min_hits = min_hits
+        self.active_days = active_days
+        self.off_peak = parse_hour_window(off_peak_hours)
+
+    async def run(self) -> Dict[str, Any]:
+        """
+        Refresh the current candidates
+
+        Returns:
+            Dict of counts per action taken, or the reason the run was skipped
+        """
+        if not in_hour_window(self.off_peak):
+            refresh_ahead_runs.labels(outcome='skipped').inc()
+            return {'skipped': 'outside off-peak window'}
+        if self.wrapper.circuit_breaker.is_open:
+            refresh_ahead_runs.labels(outcome='skipped').inc()
+            return {'skipped': 'upstream circuit open'}
+
+        loop = asyncio.get_event_loop()
+        candidates = await loop.run_in_executor(
+            thread_pool, self.wrapper.cache.get_refresh_candidates,
+            self.horizon_seconds, self.max_per_run, self.min_hits, self.active_days
+        )
+
+        totals: Dict[str, int] = {'candidates': len(candidates)}
+        batch_size = max(1, int(self.rate_per_second))
+        outcome = 'ok'
+        for i in range(0, len(candidates), batch_size):
+            batch = candidates[i:i + batch_size]
+            started = time.monotonic()
+            try:
+                stats = await self.wrapper.refresh_changed_resources(batch)
+            except CircuitOpenError as e:
+                logger.warning(f"Refresh-ahead stopped after {i} resources: {e}")
+                outcome = 'interrupted'
+                break
+            for action, count in stats.items():
+                totals[action] = totals.get(action, 0) + count
+                refresh_ahead_resources.labels(action=action).inc(count)
+            # Spread the batches so the sweep never exceeds its rate
+            await asyncio.sleep(max(len(batch) / self.rate_per_second - (time.monotonic() - started), 0))
+
+        refresh_ahead_runs.labels(outcome=outcome).inc()
+        return totals
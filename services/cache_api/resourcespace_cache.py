@@ -9,18 +9,109 @@ import json
 import os
 import hashlib
 import shutil
+import time
 import requests
 from pathlib import Path
 from datetime import datetime, timedelta
-from typing import Optional, Dict, List, Any, Tuple
+from typing import Optional, Dict, List, Any, Tuple, Iterator
 from contextlib import contextmanager
 import logging
 from urllib.parse import urlencode
 
+from connection_manager import SQLiteConnectionManager
+from access_tracker import AccessTracker
+from search_query import build_fts_query
+from file_ingest import StreamingIngest, IngestInterrupted
+from partial_files import (PartialFileStore, PartialFile, RangeNotSupported,
+                           is_upstream_failure, open_download)
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from metrics import (cache_revalidations, file_download_throughput, file_download_bytes,
+                     file_download_failures, file_dedup_hits, adaptive_ttl_seconds,
+                     resource_change_observations)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Stay well below SQLite's bound-parameter limit for IN (...) lists
+SQLITE_MAX_BATCH_PARAMS = 500
+
+# Column weights for bm25 ranking: title, metadata, keywords
+SEARCH_RANK_WEIGHTS = (10.0, 1.0, 5.0)
+
+# Columns added after the initial schema, applied to existing databases on startup
+SCHEMA_COLUMN_MIGRATIONS = [
+    ('cached_resources', 'hit_count', 'INTEGER DEFAULT 0'),
+    ('cached_resources', 'file_checksum', 'TEXT'),
+    ('cached_files', 'source_checksum', 'TEXT'),
+    ('cached_resources', 'generation', 'INTEGER DEFAULT 0'),
+    ('cache_status', 'first_seen_at', 'DATETIME'),
+    ('cache_status', 'last_changed_at', 'DATETIME'),
+    ('cache_status', 'check_count', 'INTEGER DEFAULT 0'),
+    ('cache_status', 'change_count', 'INTEGER DEFAULT 0'),
+    ('cache_status', 'ttl_seconds', 'INTEGER'),
+]
+
+# A resource row (aliased r) is visible only if stamped at or above both the global
+# generation floor and its resource type's floor
+VISIBLE_GENERATION_SQL = """r.generation >= COALESCE((
+    SELECT MAX(generation) FROM cache_generations
+    WHERE scope IN ('global', 'type:' || r.resource_type)
+), 0)"""
+
+# Generation newly stored rows are stamped with: the highest floor set so far
+CURRENT_GENERATION_SQL = "(SELECT COALESCE(MAX(generation), 0) FROM cache_generations)"
+
+# How long generation floors read for Redis entries are reused before re-reading SQLite
+GENERATION_FLOORS_TTL_SECONDS = 2.0
+
+# Distinct resource types, one index seek each on idx_resources_generation (no table scan)
+DISTINCT_RESOURCE_TYPES_SQL = """
+    WITH RECURSIVE types(resource_type) AS (
+        SELECT MIN(resource_type) FROM cached_resources
+        UNION ALL
+        SELECT (SELECT MIN(resource_type) FROM cached_resources WHERE resource_type > types.resource_type)
+        FROM types WHERE types.resource_type IS NOT NULL
+    )
+    SELECT resource_type FROM types WHERE resource_type IS NOT NULL
+"""
+
+
+def is_visible_generation(floors: Dict[str, int], generation: Optional[int],
+                          resource_type: Optional[int]) -> bool:
+    """Whether an entry stamped with generation is still visible under these floors"""
+    floor = max(floors.get('global', 0), floors.get(f'type:{resource_type}', 0))
+    return (generation or 0) >= floor
+
+
+def resource_validator(resource_data: Dict[str, Any]) -> Optional[str]:
+    """
+    Cheap change token for a resource: its RS modified stamp plus its file checksum
+    
+    Both come back from get_resource_data alone, so comparing tokens tells whether
+    the fields, previews and original need fetching again. None if RS gave no stamp.
+    """
+    modified = resource_data.get('modified')
+    if not modified:
+        return None
+    return f"{modified}/{resource_data.get('file_checksum') or ''}"
+
+
+def _parse_db_time(value: Any) -> Optional[datetime]:
+    """Parse a timestamp column written from a Python datetime"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def _chunked(items: List[Any], size: int) -> Iterator[List[Any]]:
+    """Yield successive slices of at most size items"""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
 
 class ResourceSpaceCache:
     """SQLite cache manager for ResourceSpace metadata"""
@@ -29,7 +120,21 @@ class ResourceSpaceCache:
                  cache_dir: str = "cache", 
                  default_ttl_days: int = 7,
                  rs_api_url: Optional[str] = None,
-                 rs_api_key: Optional[str] = None):
+                 rs_api_key: Optional[str] = None,
+                 db_options: Optional[Dict[str, Any]] = None,
+                 access_tracker: Optional[AccessTracker] = None,
+                 store_batch_size: int = 500,
+                 file_ingest_options: Optional[Dict[str, Any]] = None,
+                 file_chunk_size: int = 4 * 1024 * 1024,
+                 partial_idle_hours: float = 24,
+                 stale_grace_seconds: int = 0,
+                 stale_if_error_seconds: int = 0,
+                 negative_max_entries: int = 10000,
+                 adaptive_ttl: bool = False,
+                 min_ttl_seconds: int = 3600,
+                 max_ttl_seconds: int = 30 * 86400,
+                 ttl_change_factor: float = 0.5,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
         """
         Initialize the cache manager
         
@@ -39,33 +144,74 @@ class ResourceSpaceCache:
             default_ttl_days: Default time-to-live for cached entries in days
             rs_api_url: ResourceSpace API URL
             rs_api_key: ResourceSpace API key
+            db_options: Optional SQLiteConnectionManager tuning (journal_mode, synchronous,
+                mmap_size_mb, cache_size_mb, busy_timeout_ms)
+            access_tracker: Optional buffer for write-behind access tracking
+            store_batch_size: Resources written per transaction by store_resources()
+            file_ingest_options: Optional StreamingIngest tuning (chunk_size, buffer_size,
+                fsync_policy, fsync_min_bytes)
+            file_chunk_size: Byte range size for partially cached originals
+            partial_idle_hours: Drop partial originals not extended for this long
+            stale_grace_seconds: How long past expiry an entry may still be served as stale
+            stale_if_error_seconds: How long past expiry an entry may be served when upstream fails
+            negative_max_entries: Most resource IDs kept in the negative cache
+            adaptive_ttl: Derive each resource's TTL from how often it has changed
+            min_ttl_seconds: Shortest adaptive TTL (for volatile resources)
+            max_ttl_seconds: Longest adaptive TTL (for stable resources)
+            ttl_change_factor: Share of the observed change interval used as the TTL
+            circuit_breaker: Optional breaker guarding download URL lookups and downloads
         """
         self.cache_dir = Path(cache_dir)
         self.db_path = str(self.cache_dir / cache_db_path)
         self.originals_dir = self.cache_dir / "originals"
+        self.blobs_dir = self.cache_dir / "blobs"
+        self.partials_dir = self.cache_dir / "partials"
         self.default_ttl = timedelta(days=default_ttl_days)
         self.rs_api_url = rs_api_url
         self.rs_api_key = rs_api_key
+        self.access_tracker = access_tracker or AccessTracker()
+        self.store_batch_size = store_batch_size
+        self.partial_idle_hours = partial_idle_hours
+        self.stale_grace = timedelta(seconds=stale_grace_seconds)
+        self.stale_if_error = timedelta(seconds=stale_if_error_seconds)
+        self.negative_max_entries = negative_max_entries
+        self.adaptive_ttl = adaptive_ttl
+        self.min_ttl = timedelta(seconds=min_ttl_seconds)
+        self.max_ttl = timedelta(seconds=max_ttl_seconds)
+        self.ttl_change_factor = ttl_change_factor
+        self.circuit_breaker = circuit_breaker
+        self._generation_floors: Optional[Tuple[float, Dict[str, int]]] = None
+        # Floors the last completed sweep left no hidden rows under
+        self._swept_floors: Optional[Dict[str, int]] = None
         
-        # Create cache directories
+        # Create cache directories (originals/ holds in-flight downloads and pre-blob files)
         self.originals_dir.mkdir(parents=True, exist_ok=True)
+        self.blobs_dir.mkdir(parents=True, exist_ok=True)
+        
+        self.ingest = StreamingIngest(self.originals_dir, **(file_ingest_options or {}))
+        
+        self.db = SQLiteConnectionManager(self.db_path, **(db_options or {}))
         
         self._init_database()
         
+        self.partials = PartialFileStore(self.db, self.partials_dir, chunk_size=file_chunk_size,
+                                         circuit_breaker=circuit_breaker)
+        
     @contextmanager
     def _get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        conn.execute("PRAGMA foreign_keys = ON")
-        try:
+        """Context manager for the shared writer connection (commits on exit)"""
+        with self.db.writer() as conn:
             yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+            
+    @contextmanager
+    def _get_read_connection(self):
+        """Context manager for this thread's long-lived reader connection"""
+        with self.db.reader() as conn:
+            yield conn
+            
+    def close(self):
+        """Close all pooled database connections"""
+        self.db.close()
             
     def _init_database(self):
         """Initialize the database with schema"""
@@ -79,100 +225,677 @@ class ResourceSpaceCache:
                 schema = f.read()
             
             with self._get_connection() as conn:
+                self._migrate_schema(conn)
                 conn.executescript(schema)
                 logger.info(f"Database initialized at {self.db_path}")
+                
+            self._backfill_search_index()
+            self._adopt_legacy_files()
+            
+            with self._get_read_connection() as conn:
+                needs_reconcile = conn.execute(
+                    "SELECT 1 FROM cache_ledger WHERE reconciled_at IS NULL"
+                ).fetchone()
+            if needs_reconcile:
+                # Ledger was just created for an existing database; seed it from the tables
+                self.reconcile_size_ledger(check_files=False)
         else:
             raise FileNotFoundError(f"cache_schema.sql not found at {schema_path}")
             
-    def get_cached_resource(self, resource_id: int) -> Optional[Dict[str, Any]]:
+    def _migrate_schema(self, conn: sqlite3.Connection):
+        """Add columns introduced after a database was first created"""
+        for table, column, definition in SCHEMA_COLUMN_MIGRATIONS:
+            columns = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if columns and column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                logger.info(f"Added column {table}.{column}")
+                
+    def _backfill_search_index(self):
+        """Index resources cached before the full-text index existed"""
+        with self._get_read_connection() as conn:
+            if conn.execute("SELECT 1 FROM resource_search LIMIT 1").fetchone():
+                return
+            resource_ids = [row['resource_id'] for row in
+                            conn.execute("SELECT resource_id FROM cached_resources")]
+                            
+        if not resource_ids:
+            return
+            
+        for chunk in _chunked(resource_ids, SQLITE_MAX_BATCH_PARAMS):
+            with self._get_connection() as conn:
+                self._reindex_search(conn, chunk)
+                
+        logger.info(f"Built full-text index for {len(resource_ids)} cached resources")
+        
+    def _reindex_search(self, conn: sqlite3.Connection, resource_ids: List[int]):
+        """Rebuild full-text rows for the given resources from the cache tables"""
+        placeholders = ','.join(['?'] * len(resource_ids))
+        conn.execute(f"DELETE FROM resource_search WHERE rowid IN ({placeholders})", resource_ids)
+        conn.execute(f"""
+            INSERT INTO resource_search (rowid, title, metadata, keywords)
+            SELECT r.resource_id,
+                   r.title,
+                   (SELECT group_concat(m.value, ' ') FROM cached_metadata m
+                    WHERE m.resource_id = r.resource_id),
+                   (SELECT group_concat(k.keyword, ' ') FROM cached_keywords k
+                    WHERE k.resource_id = r.resource_id)
+            FROM cached_resources r
+            WHERE r.resource_id IN ({placeholders})
+        """, resource_ids)
+        
+    def optimize_search_index(self):
+        """Merge full-text index segments (run from periodic maintenance)"""
+        with self._get_connection() as conn:
+            conn.execute("INSERT INTO resource_search (resource_search) VALUES ('optimize')")
+            
+    def get_cached_resource(self, resource_id: int, allow_stale: bool = False,
+                            stale_if_error: bool = False,
+                            track_access: bool = True) -> Optional[Dict[str, Any]]:
         """
         Get a cached resource by ID
         
         Args:
             resource_id: ResourceSpace resource ID
+            allow_stale: Also return entries expired less than stale_grace ago
+            stale_if_error: Also return entries expired less than stale_if_error ago
+            track_access: Count this as an access (off for background revalidation)
             
         Returns:
             Resource data dict or None if not cached/expired
         """
+        return self.get_cached_resources(
+            [resource_id], allow_stale=allow_stale, stale_if_error=stale_if_error,
+            track_access=track_access
+        ).get(resource_id)
+        
+    def get_cached_resources(self, resource_ids: List[int], allow_stale: bool = False,
+                             stale_if_error: bool = False,
+                             track_access: bool = True) -> Dict[int, Dict[str, Any]]:
+        """
+        Get several cached resources with a fixed number of set-based queries
+        
+        Args:
+            resource_ids: ResourceSpace resource IDs
+            allow_stale: Also return entries expired less than stale_grace ago,
+                with '_stale' set so the caller can refresh them
+            stale_if_error: Use the (longer) stale_if_error window instead, for when
+                upstream can't be reached
+            track_access: Count this as an access (off for background revalidation)
+            
+        Returns:
+            Dict of resource_id -> resource data for every ID that is cached and not expired
+        """
+        resource_ids = list(dict.fromkeys(int(rid) for rid in resource_ids))
+        resources: Dict[int, Dict[str, Any]] = {}
+        if not resource_ids:
+            return resources
+            
+        if stale_if_error:
+            grace_seconds = int(self.stale_if_error.total_seconds())
+        elif allow_stale:
+            grace_seconds = int(self.stale_grace.total_seconds())
+        else:
+            grace_seconds = 0
+        
+        with self._get_read_connection() as conn:
+            for chunk in _chunked(resource_ids, SQLITE_MAX_BATCH_PARAMS):
+                resources.update(self._hydrate_resources(conn, chunk, grace_seconds))
+                
+        # Access times are buffered and written later by flush_access_log()
+        if track_access:
+            self.access_tracker.record(resources)
+        return resources
+        
+    def flush_access_log(self) -> Dict[int, Tuple[str, int]]:
+        """
+        Write buffered access times and hit counts in a single executemany
+        
+        Returns:
+            The flushed batch of resource_id -> (last_accessed, hits)
+        """
+        batch = self.access_tracker.drain()
+        if not batch:
+            return batch
+            
         with self._get_connection() as conn:
-            # Check if resource exists and is not expired
-            cursor = conn.execute("""
-                SELECT r.*, cs.expires_at
-                FROM cached_resources r
-                JOIN cache_status cs ON r.resource_id = cs.resource_id
-                WHERE r.resource_id = ?
-                AND cs.expires_at > datetime('now')
-            """, (resource_id,))
+            conn.executemany("""
+                UPDATE cached_resources
+                SET last_accessed = MAX(COALESCE(last_accessed, ''), ?),
+                    hit_count = COALESCE(hit_count, 0) + ?
+                WHERE resource_id = ?
+            """, [(accessed, hits, rid) for rid, (accessed, hits) in batch.items()])
             
-            row = cursor.fetchone()
-            if not row:
-                return None
+        logger.info(f"Flushed access log for {len(batch)} resources")
+        return batch
+        
+    def get_uncached_ids(self, resource_ids: List[int]) -> List[int]:
+        """Return the IDs that are not cached or have expired, without counting an access"""
+        resource_ids = list(dict.fromkeys(int(rid) for rid in resource_ids))
+        cached = set()
+        
+        with self._get_read_connection() as conn:
+            for chunk in _chunked(resource_ids, SQLITE_MAX_BATCH_PARAMS):
+                cursor = conn.execute(f"""
+                    SELECT r.resource_id FROM cached_resources r
+                    JOIN cache_status cs ON cs.resource_id = r.resource_id
+                    WHERE r.resource_id IN ({','.join(['?'] * len(chunk))})
+                    AND cs.expires_at > datetime('now')
+                    AND {VISIBLE_GENERATION_SQL}
+                """, chunk)
+                cached.update(row['resource_id'] for row in cursor)
                 
-            # Update last accessed time
+        return [rid for rid in resource_ids if rid not in cached]
+        
+    def get_refresh_candidates(self, horizon_seconds: int, limit: int,
+                               min_hits: int = 1, active_days: int = 7) -> List[int]:
+        """
+        Popular resources that expire within the horizon, most popular first
+        
+        Args:
+            horizon_seconds: How far ahead to look for expiries
+            limit: Most IDs returned
+            min_hits: Hits a resource needs to be worth refreshing
+            active_days: Only resources accessed within this many days
+            
+        Returns:
+            Resource IDs ranked by hit count, then last access
+        """
+        with self._get_read_connection() as conn:
+            cursor = conn.execute(f"""
+                SELECT r.resource_id FROM cache_status cs
+                JOIN cached_resources r ON r.resource_id = cs.resource_id
+                WHERE cs.expires_at > datetime('now')
+                AND cs.expires_at <= datetime('now', ?)
+                AND r.hit_count >= ?
+                AND r.last_accessed > datetime('now', ?)
+                AND {VISIBLE_GENERATION_SQL}
+                ORDER BY r.hit_count DESC, r.last_accessed DESC
+                LIMIT ?
+            """, (f'+{int(horizon_seconds)} seconds', min_hits, f'-{int(active_days)} days', limit))
+            return [row['resource_id'] for row in cursor]
+            
+    def get_negative_results(self, resource_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Look up resource IDs ResourceSpace recently refused
+        
+        Returns:
+            Dict of resource_id -> {'reason', 'detail', 'expires_at'} for unexpired entries
+        """
+        resource_ids = list(dict.fromkeys(int(rid) for rid in resource_ids))
+        results = {}
+        
+        with self._get_read_connection() as conn:
+            for chunk in _chunked(resource_ids, SQLITE_MAX_BATCH_PARAMS):
+                cursor = conn.execute(f"""
+                    SELECT resource_id, reason, detail, expires_at FROM negative_cache
+                    WHERE resource_id IN ({','.join(['?'] * len(chunk))})
+                    AND expires_at > datetime('now')
+                """, chunk)
+                for row in cursor:
+                    results[row['resource_id']] = {
+                        'reason': row['reason'],
+                        'detail': row['detail'],
+                        'expires_at': row['expires_at']
+                    }
+                    
+        return results
+        
+    def store_negative_results(self, results: List[Tuple[int, str, str, int]]):
+        """
+        Remember resource IDs ResourceSpace refused
+        
+        A not-found or forbidden answer also drops any positive entry for the ID.
+        The table is then trimmed to negative_max_entries, soonest-expiring first.
+        
+        Args:
+            results: (resource_id, reason, detail, ttl_seconds) tuples
+        """
+        if not results:
+            return
+            
+        gone = [rid for rid, reason, _, _ in results if reason != 'error']
+        
+        with self._get_connection() as conn:
+            conn.executemany("""
+                INSERT INTO negative_cache (resource_id, reason, detail, created_at, expires_at)
+                VALUES (?, ?, ?, datetime('now'), datetime('now', ?))
+                ON CONFLICT(resource_id) DO UPDATE SET
+                    reason = excluded.reason,
+                    detail = excluded.detail,
+                    created_at = excluded.created_at,
+                    expires_at = excluded.expires_at
+            """, [(rid, reason, detail, f'+{ttl} seconds') for rid, reason, detail, ttl in results])
+            
+            for chunk in _chunked(gone, SQLITE_MAX_BATCH_PARAMS):
+                conn.execute(
+                    f"DELETE FROM cached_resources WHERE resource_id IN ({','.join(['?'] * len(chunk))})",
+                    chunk
+                )
+            if gone:
+                self._release_unreferenced_blobs(conn)
+                
+            conn.execute("DELETE FROM negative_cache WHERE expires_at <= datetime('now')")
             conn.execute("""
-                UPDATE cached_resources 
-                SET last_accessed = datetime('now')
-                WHERE resource_id = ?
-            """, (resource_id,))
+                DELETE FROM negative_cache WHERE resource_id IN (
+                    SELECT resource_id FROM negative_cache
+                    ORDER BY expires_at DESC
+                    LIMIT -1 OFFSET ?
+                )
+            """, (self.negative_max_entries,))
             
-            # Build resource dict
-            resource = dict(row)
+    def evict_resource(self, resource_id: int) -> bool:
+        """
+        Drop everything cached for one resource: metadata, file reference and negative result
+        
+        Returns:
+            True if anything was removed
+        """
+        return self.evict_resources([resource_id]) > 0
+        
+    def evict_resources(self, resource_ids: List[int]) -> int:
+        """
+        Drop everything cached for a set of resources in one transaction
+        
+        Returns:
+            Number of metadata and negative entries removed
+        """
+        removed = 0
+        with self._get_connection() as conn:
+            for chunk in _chunked(list(resource_ids), SQLITE_MAX_BATCH_PARAMS):
+                placeholders = ','.join(['?'] * len(chunk))
+                removed += conn.execute(
+                    f"DELETE FROM cached_resources WHERE resource_id IN ({placeholders})", chunk
+                ).rowcount
+                removed += conn.execute(
+                    f"DELETE FROM negative_cache WHERE resource_id IN ({placeholders})", chunk
+                ).rowcount
+            self._release_unreferenced_blobs(conn)
             
-            # Get metadata
-            metadata_cursor = conn.execute("""
-                SELECT field_id, field_name, value, field_type
-                FROM cached_metadata
-                WHERE resource_id = ?
-                ORDER BY field_id
-            """, (resource_id,))
+        for resource_id in resource_ids:
+            self.partials.remove(resource_id)
+        return removed
+        
+    def find_resource_ids(self, resource_ids: Optional[List[int]] = None,
+                          resource_types: Optional[List[int]] = None,
+                          modified_from: Optional[str] = None,
+                          modified_to: Optional[str] = None,
+                          query: Optional[str] = None) -> List[int]:
+        """
+        Select cached resources (expired ones included) matching every given criterion
+        
+        Args:
+            resource_ids: Restrict to these IDs
+            resource_types: Any of these resource types
+            modified_from: RS modified stamp at or after this ('YYYY-MM-DD HH:MM:SS')
+            modified_to: RS modified stamp at or before this
+            query: Full-text query against the local search index
             
-            resource['metadata'] = [dict(row) for row in metadata_cursor]
+        Returns:
+            Matching resource IDs
             
-            # Get keywords
-            keyword_cursor = conn.execute("""
-                SELECT keyword, field_id, position
-                FROM cached_keywords
-                WHERE resource_id = ?
-                ORDER BY position
-            """, (resource_id,))
+        Raises:
+            ValueError: the query uses syntax the local index can't answer
+        """
+        sql = "SELECT r.resource_id FROM cached_resources r"
+        conditions: List[str] = []
+        params: List[Any] = []
+        
+        if query:
+            match = build_fts_query(query)
+            if not match:
+                raise ValueError(f"Query can't be matched against the local index: {query!r}")
+            sql += " JOIN resource_search ON resource_search.rowid = r.resource_id"
+            conditions.append("resource_search MATCH ?")
+            params.append(match)
+        if resource_types:
+            conditions.append(f"r.resource_type IN ({','.join(['?'] * len(resource_types))})")
+            params.extend(resource_types)
+        if modified_from:
+            conditions.append("r.modified >= ?")
+            params.append(modified_from)
+        if modified_to:
+            conditions.append("r.modified <= ?")
+            params.append(modified_to)
+            
+        if resource_ids is None:
+            if conditions:
+                sql += " WHERE " + " AND ".join(conditions)
+            with self._get_read_connection() as conn:
+                return [row['resource_id'] for row in conn.execute(sql, params)]
+                
+        # Look the given IDs up by primary key, a chunk at a time, rather than scanning
+        found: List[int] = []
+        with self._get_read_connection() as conn:
+            for chunk in _chunked(list(dict.fromkeys(resource_ids)), SQLITE_MAX_BATCH_PARAMS):
+                chunk_conditions = conditions + [f"r.resource_id IN ({','.join(['?'] * len(chunk))})"]
+                found.extend(row['resource_id'] for row in conn.execute(
+                    sql + " WHERE " + " AND ".join(chunk_conditions), params + chunk
+                ))
+        return found
+        
+    def expire_all(self) -> int:
+        """
+        Mark every cached resource as expired so each is revalidated on its next use
+        
+        Returns:
+            Number of entries expired
+        """
+        with self._get_connection() as conn:
+            return conn.execute("""
+                UPDATE cache_status SET expires_at = datetime('now')
+                WHERE expires_at > datetime('now')
+            """).rowcount
             
-            resource['keywords'] = [dict(row) for row in keyword_cursor]
+    def expire_resources(self, resource_ids: List[int]) -> int:
+        """
+        Mark specific cached resources as expired so each is revalidated on its next use
+        
+        Returns:
+            Number of entries expired
+        """
+        expired = 0
+        with self._get_connection() as conn:
+            for chunk in _chunked(list(resource_ids), SQLITE_MAX_BATCH_PARAMS):
+                expired += conn.execute(f"""
+                    UPDATE cache_status SET expires_at = datetime('now')
+                    WHERE expires_at > datetime('now')
+                    AND resource_id IN ({','.join(['?'] * len(chunk))})
+                """, chunk).rowcount
+        return expired
             
-            # Get previews
-            preview_cursor = conn.execute("""
-                SELECT preview_type, preview_path, width, height
-                FROM cached_previews
-                WHERE resource_id = ?
-            """, (resource_id,))
+    def drop_cached_files(self, resource_ids: List[int]) -> int:
+        """
+        Forget the cached originals (and partial downloads) of resources whose file may have changed
+        
+        Returns:
+            Number of cached files dropped
+        """
+        dropped = 0
+        with self._get_connection() as conn:
+            for chunk in _chunked(list(resource_ids), SQLITE_MAX_BATCH_PARAMS):
+                dropped += conn.execute(
+                    f"DELETE FROM cached_files WHERE resource_id IN ({','.join(['?'] * len(chunk))})",
+                    chunk
+                ).rowcount
+            self._release_unreferenced_blobs(conn)
             
-            resource['previews'] = {row['preview_type']: dict(row) for row in preview_cursor}
+        for resource_id in resource_ids:
+            self.partials.remove(resource_id)
+        return dropped
+        
+    def get_sync_state(self, name: str) -> Optional[str]:
+        """Read a background job's progress marker"""
+        with self._get_read_connection() as conn:
+            row = conn.execute("SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return row['value'] if row else None
+        
+    def set_sync_state(self, name: str, value: str):
+        """Persist a background job's progress marker"""
+        with self._get_connection() as conn:
+            conn.execute("""
+                INSERT INTO sync_state (name, value, updated_at) VALUES (?, ?, datetime('now'))
+                ON CONFLICT(name) DO UPDATE SET
+                    value = excluded.value,
+                    updated_at = excluded.updated_at
+            """, (name, value))
             
-            # Get dimensions
-            dim_cursor = conn.execute("""
-                SELECT width, height, file_size, resolution, unit, page_count
-                FROM cached_dimensions
-                WHERE resource_id = ?
-            """, (resource_id,))
+    def get_search_result(self, query_key: str) -> Optional[List[int]]:
+        """Ordered resource IDs of an unexpired cached search, or None"""
+        with self._get_read_connection() as conn:
+            row = conn.execute("""
+                SELECT resource_ids FROM search_results
+                WHERE query_key = ? AND expires_at > datetime('now')
+            """, (query_key,)).fetchone()
+        return json.loads(row['resource_ids']) if row else None
+        
+    def store_search_result(self, query_key: str, query: str, resource_ids: List[int], ttl_seconds: int):
+        """
+        Cache a search's ordered result IDs, replacing any previous entry for the key
+        
+        Expired entries are dropped in the same transaction.
+        """
+        with self._get_connection() as conn:
+            conn.execute("DELETE FROM search_results WHERE expires_at <= datetime('now')")
+            conn.execute("DELETE FROM search_results WHERE query_key = ?", (query_key,))
+            conn.execute("""
+                INSERT INTO search_results (query_key, query, resource_ids, created_at, expires_at)
+                VALUES (?, ?, ?, datetime('now'), datetime('now', ?))
+            """, (query_key, query, json.dumps(resource_ids), f'+{int(ttl_seconds)} seconds'))
+            conn.executemany(
+                "INSERT OR IGNORE INTO search_result_members (query_key, resource_id) VALUES (?, ?)",
+                [(query_key, rid) for rid in resource_ids]
+            )
             
-            dim_row = dim_cursor.fetchone()
-            if dim_row:
-                resource['dimensions'] = dict(dim_row)
+    def invalidate_search_results(self, resource_ids: Optional[List[int]] = None) -> int:
+        """
+        Drop cached searches that list any of these resources
+        
+        Args:
+            resource_ids: Changed resources, or None to drop every cached search
             
-            # Get cached file info
-            file_cursor = conn.execute("""
-                SELECT file_path, file_size, file_hash, last_fetched, expires_at
-                FROM cached_files
-                WHERE resource_id = ?
-                AND expires_at > datetime('now')
-            """, (resource_id,))
+        Returns:
+            Number of cached searches dropped
+        """
+        with self._get_connection() as conn:
+            if resource_ids is None:
+                return conn.execute("DELETE FROM search_results").rowcount
+            dropped = 0
+            for chunk in _chunked(list(resource_ids), SQLITE_MAX_BATCH_PARAMS):
+                dropped += conn.execute(f"""
+                    DELETE FROM search_results WHERE query_key IN (
+                        SELECT query_key FROM search_result_members
+                        WHERE resource_id IN ({','.join(['?'] * len(chunk))})
+                    )
+                """, chunk).rowcount
+            return dropped
             
-            file_row = file_cursor.fetchone()
-            if file_row and Path(file_row['file_path']).exists():
-                resource['cached_file'] = dict(file_row)
-            else:
-                resource['cached_file'] = None
+    def bump_generation(self, resource_type: Optional[int] = None) -> int:
+        """
+        Make every cached resource (or every one of a type) invisible in O(1)
+        
+        Rows stamped before the bump stop being served and are refetched on demand;
+        sweep_old_generations reclaims their space later.
+        
+        Args:
+            resource_type: Only invalidate this resource type (default: everything)
+            
+        Returns:
+            The new generation
+        """
+        scope = 'global' if resource_type is None else f'type:{int(resource_type)}'
+        with self._get_connection() as conn:
+            generation = conn.execute(f"SELECT {CURRENT_GENERATION_SQL} + 1 AS g").fetchone()['g']
+            conn.execute("""
+                INSERT INTO cache_generations (scope, generation, updated_at)
+                VALUES (?, ?, datetime('now'))
+                ON CONFLICT(scope) DO UPDATE SET
+                    generation = excluded.generation,
+                    updated_at = excluded.updated_at
+            """, (scope, generation))
+            
+        self._generation_floors = None
+        logger.info(f"Cache generation bumped to {generation} for {scope}")
+        return generation
+        
+    def generation_floors(self) -> Dict[str, int]:
+        """
+        Current generation floors by scope ('global', 'type:<id>'), briefly memoized
+        
+        Used to check entries held outside SQLite (Redis) without a query per read.
+        """
+        memo = self._generation_floors
+        if memo and time.monotonic() - memo[0] < GENERATION_FLOORS_TTL_SECONDS:
+            return memo[1]
+        with self._get_read_connection() as conn:
+            floors = self._read_generation_floors(conn)
+        self._generation_floors = (time.monotonic(), floors)
+        return floors
+        
+    def current_generation(self) -> int:
+        """Generation entries stored now are stamped with"""
+        return max(self.generation_floors().values(), default=0)
+        
+    def sweep_old_generations(self, batch_size: int = 500, max_batches: int = 20,
+                              pause_seconds: float = 0.05) -> Dict[str, int]:
+        """
+        Delete rows hidden by a generation bump, a batch per transaction
+        
+        Args:
+            batch_size: Rows deleted per transaction
+            max_batches: Most batches per run; the rest waits for the next run
+            pause_seconds: Sleep between batches so readers and writers get the lock
+            
+        Returns:
+            Dict with 'resources_removed', 'blobs_removed' and 'bytes_freed'
+        """
+        stats = {'resources_removed': 0, 'blobs_removed': 0, 'bytes_freed': 0}
+        
+        # New rows are stamped at the highest floor, so nothing becomes hidden
+        # until a floor moves: skip the run if none has since the last full sweep
+        with self._get_read_connection() as conn:
+            floors = self._read_generation_floors(conn)
+        if floors == self._swept_floors:
+            return stats
+            
+        for _ in range(max_batches):
+            with self._get_connection() as conn:
+                ids = self._hidden_resource_ids(conn, floors, batch_size)
+                if not ids:
+                    self._swept_floors = floors
+                    break
+                conn.execute(
+                    f"DELETE FROM cached_resources WHERE resource_id IN ({','.join(['?'] * len(ids))})", ids
+                )
+                blobs_removed, bytes_freed = self._release_unreferenced_blobs(conn)
                 
-            return resource
+            for resource_id in ids:
+                self.partials.remove(resource_id)
+            stats['resources_removed'] += len(ids)
+            stats['blobs_removed'] += blobs_removed
+            stats['bytes_freed'] += bytes_freed
+            if len(ids) < batch_size:
+                self._swept_floors = floors
+                break
+            time.sleep(pause_seconds)
+            
+        return stats
+        
+    @staticmethod
+    def _read_generation_floors(conn: sqlite3.Connection) -> Dict[str, int]:
+        return {row['scope']: row['generation']
+                for row in conn.execute("SELECT scope, generation FROM cache_generations")}
+        
+    @staticmethod
+    def _hidden_resource_ids(conn: sqlite3.Connection, floors: Dict[str, int], limit: int) -> List[int]:
+        """Up to limit rows stamped below their floor, read type by type off the generation index"""
+        global_floor = floors.get('global', 0)
+        ids: List[int] = []
+        if global_floor > 0:
+            ids.extend(row['resource_id'] for row in conn.execute("""
+                SELECT resource_id FROM cached_resources
+                WHERE resource_type IS NULL AND generation < ?
+                LIMIT ?
+            """, (global_floor, limit)))
+            
+        for (resource_type,) in conn.execute(DISTINCT_RESOURCE_TYPES_SQL).fetchall():
+            if len(ids) >= limit:
+                break
+            floor = max(global_floor, floors.get(f'type:{resource_type}', 0))
+            if floor <= 0:
+                continue
+            ids.extend(row['resource_id'] for row in conn.execute("""
+                SELECT resource_id FROM cached_resources
+                WHERE resource_type = ? AND generation < ?
+                LIMIT ?
+            """, (resource_type, floor, limit - len(ids))))
+        return ids
+        
+    def _hydrate_resources(self, conn: sqlite3.Connection, resource_ids: List[int],
+                           grace_seconds: int = 0) -> Dict[int, Dict[str, Any]]:
+        """Load resource rows and their child tables for one chunk of IDs"""
+        placeholders = ','.join(['?'] * len(resource_ids))
+        
+        # Resources that exist and are not expired (or are within the stale grace window)
+        cursor = conn.execute(f"""
+            SELECT r.*, cs.expires_at, cs.expires_at <= datetime('now') AS _stale
+            FROM cached_resources r
+            JOIN cache_status cs ON r.resource_id = cs.resource_id
+            WHERE r.resource_id IN ({placeholders})
+            AND cs.expires_at > datetime('now', ?)
+            AND {VISIBLE_GENERATION_SQL}
+        """, resource_ids + [f'-{grace_seconds} seconds'])
+        
+        resources = {}
+        for row in cursor:
+            resource = dict(row)
+            resource['_stale'] = bool(resource['_stale'])
+            resource['metadata'] = []
+            resource['keywords'] = []
+            resource['previews'] = {}
+            resource['cached_file'] = None
+            resources[row['resource_id']] = resource
+            
+        if not resources:
+            return resources
+            
+        found_ids = list(resources)
+        placeholders = ','.join(['?'] * len(found_ids))
+        
+        # Metadata
+        cursor = conn.execute(f"""
+            SELECT resource_id, field_id, field_name, value, field_type
+            FROM cached_metadata
+            WHERE resource_id IN ({placeholders})
+            ORDER BY resource_id, field_id
+        """, found_ids)
+        for row in cursor:
+            item = dict(row)
+            resources[item.pop('resource_id')]['metadata'].append(item)
+            
+        # Keywords
+        cursor = conn.execute(f"""
+            SELECT resource_id, keyword, field_id, position
+            FROM cached_keywords
+            WHERE resource_id IN ({placeholders})
+            ORDER BY resource_id, position
+        """, found_ids)
+        for row in cursor:
+            item = dict(row)
+            resources[item.pop('resource_id')]['keywords'].append(item)
+            
+        # Previews
+        cursor = conn.execute(f"""
+            SELECT resource_id, preview_type, preview_path, width, height
+            FROM cached_previews
+            WHERE resource_id IN ({placeholders})
+        """, found_ids)
+        for row in cursor:
+            item = dict(row)
+            resources[item.pop('resource_id')]['previews'][item['preview_type']] = item
+            
+        # Dimensions
+        cursor = conn.execute(f"""
+            SELECT resource_id, width, height, file_size, resolution, unit, page_count
+            FROM cached_dimensions
+            WHERE resource_id IN ({placeholders})
+        """, found_ids)
+        for row in cursor:
+            item = dict(row)
+            resources[item.pop('resource_id')]['dimensions'] = item
+            
+        # Cached file info
+        cursor = conn.execute(f"""
+            SELECT resource_id, file_path, file_size, file_hash, last_fetched, expires_at
+            FROM cached_files
+            WHERE resource_id IN ({placeholders})
+            AND expires_at > datetime('now')
+        """, found_ids)
+        for row in cursor:
+            item = dict(row)
+            if Path(item['file_path']).exists():
+                resources[item.pop('resource_id')]['cached_file'] = item
+                
+        return resources
             
     def store_resource(self, resource_data: Dict[str, Any], ttl_override: Optional[timedelta] = None):
         """
@@ -182,23 +905,138 @@ class ResourceSpaceCache:
             resource_data: Complete resource data from RS API
             ttl_override: Optional TTL override for this resource
         """
-        resource_id = resource_data.get('ref')
-        if not resource_id:
-            raise ValueError("Resource data must contain 'ref' field")
+        self.store_resources([resource_data], ttl_override=ttl_override)
+        
+    def store_resources(self, resources: List[Dict[str, Any]],
+                        ttl_override: Optional[timedelta] = None,
+                        batch_size: Optional[int] = None) -> int:
+        """
+        Store many resources with executemany, one transaction per batch
+        
+        Args:
+            resources: Complete resource data dicts from RS API
+            ttl_override: Optional TTL override for these resources
+            batch_size: Resources per transaction (defaults to store_batch_size)
             
-        ttl = ttl_override or self.default_ttl
-        expires_at = datetime.now() + ttl
+        Returns:
+            Number of resources stored
+        """
+        for resource_data in resources:
+            if not resource_data.get('ref'):
+                raise ValueError("Resource data must contain 'ref' field")
+                
+        batch_size = batch_size or self.store_batch_size
+        stored = 0
         
-        with self._get_connection() as conn:
-            # Store main resource data
-            conn.execute("""
-                INSERT OR REPLACE INTO cached_resources (
-                    resource_id, resource_type, title, creation_date,
-                    file_extension, preview_extension, thumb_width, thumb_height,
-                    file_size, disk_usage, archive, access, created_by,
-                    modified, cache_expires_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
+        for batch in _chunked(resources, batch_size):
+            plans = self._plan_expiries(
+                {data['ref']: resource_validator(data) for data in batch}, ttl_override
+            )
+            rows = self._build_store_rows(batch, plans)
+            
+            with self._get_connection() as conn:
+                # Upsert so child rows (cached_files, stats) survive a refresh
+                conn.executemany(f"""
+                    INSERT INTO cached_resources (
+                        resource_id, resource_type, title, creation_date,
+                        file_extension, preview_extension, thumb_width, thumb_height,
+                        file_size, disk_usage, archive, access, created_by,
+                        modified, file_checksum, cache_expires_at, generation
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, {CURRENT_GENERATION_SQL})
+                    ON CONFLICT(resource_id) DO UPDATE SET
+                        resource_type = excluded.resource_type,
+                        title = excluded.title,
+                        creation_date = excluded.creation_date,
+                        file_extension = excluded.file_extension,
+                        preview_extension = excluded.preview_extension,
+                        thumb_width = excluded.thumb_width,
+                        thumb_height = excluded.thumb_height,
+                        file_size = excluded.file_size,
+                        disk_usage = excluded.disk_usage,
+                        archive = excluded.archive,
+                        access = excluded.access,
+                        created_by = excluded.created_by,
+                        modified = excluded.modified,
+                        file_checksum = excluded.file_checksum,
+                        cache_expires_at = excluded.cache_expires_at,
+                        generation = excluded.generation
+                """, rows['resources'])
+                
+                # Store cache status
+                conn.executemany("""
+                    INSERT INTO cache_status (
+                        resource_id, last_fetched, expires_at, is_complete, etag,
+                        ttl_seconds, first_seen_at, last_changed_at, check_count, change_count
+                    ) VALUES (?, datetime('now'), ?, 1, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(resource_id) DO UPDATE SET
+                        last_fetched = excluded.last_fetched,
+                        expires_at = excluded.expires_at,
+                        fetch_count = fetch_count + 1,
+                        is_complete = 1,
+                        etag = excluded.etag,
+                        ttl_seconds = excluded.ttl_seconds,
+                        first_seen_at = excluded.first_seen_at,
+                        last_changed_at = excluded.last_changed_at,
+                        check_count = excluded.check_count,
+                        change_count = excluded.change_count
+                """, rows['status'])
+                
+                # Originals whose RS checksum changed are out of date, whatever their expiry
+                replaced = conn.executemany("""
+                    DELETE FROM cached_files
+                    WHERE resource_id = ? AND source_checksum IS NOT NULL AND source_checksum != ?
+                """, rows['checksums']).rowcount
+                if replaced > 0:
+                    self._release_unreferenced_blobs(conn)
+                
+                # Store metadata fields
+                conn.executemany("""
+                    INSERT OR REPLACE INTO cached_metadata (
+                        resource_id, field_id, value
+                    ) VALUES (?, ?, ?)
+                """, rows['metadata'])
+                
+                # Replace keywords for resources that provided them
+                conn.executemany("DELETE FROM cached_keywords WHERE resource_id = ?",
+                                 rows['keyword_owners'])
+                conn.executemany("""
+                    INSERT INTO cached_keywords (
+                        resource_id, keyword
+                    ) VALUES (?, ?)
+                """, rows['keywords'])
+                
+                # Store preview information
+                conn.executemany("""
+                    INSERT OR REPLACE INTO cached_previews (
+                        resource_id, preview_type, preview_path,
+                        width, height, file_size
+                    ) VALUES (?, ?, ?, ?, ?, ?)
+                """, rows['previews'])
+                
+                self._reindex_search(conn, [data['ref'] for data in batch])
+                
+                # A successful fetch supersedes any remembered refusal
+                conn.executemany("DELETE FROM negative_cache WHERE resource_id = ?",
+                                 [(row[0],) for row in rows['status']])
+                
+            stored += len(batch)
+            
+        logger.info(f"Cached {stored} resources")
+        return stored
+        
+    def _build_store_rows(self, resources: List[Dict[str, Any]],
+                          plans: Dict[int, Tuple]) -> Dict[str, List[tuple]]:
+        """Flatten resource dicts into row lists for each cache table"""
+        rows: Dict[str, List[tuple]] = {
+            'resources': [], 'status': [], 'metadata': [],
+            'keyword_owners': [], 'keywords': [], 'previews': [], 'checksums': []
+        }
+        
+        for resource_data in resources:
+            resource_id = resource_data['ref']
+            expires_at = plans[resource_id][0]
+            
+            rows['resources'].append((
                 resource_id,
                 resource_data.get('resource_type'),
                 resource_data.get('field8', ''),  # title is often field8
@@ -213,53 +1051,35 @@ class ResourceSpaceCache:
                 resource_data.get('access', 0),
                 resource_data.get('created_by'),
                 resource_data.get('modified'),
+                resource_data.get('file_checksum') or None,
                 expires_at
             ))
+            rows['status'].append((resource_id, expires_at, resource_validator(resource_data),
+                                   *plans[resource_id][1:]))
+            if resource_data.get('file_checksum'):
+                rows['checksums'].append((resource_id, resource_data['file_checksum']))
             
-            # Store cache status
-            conn.execute("""
-                INSERT OR REPLACE INTO cache_status (
-                    resource_id, last_fetched, expires_at, is_complete
-                ) VALUES (?, datetime('now'), ?, 1)
-            """, (resource_id, expires_at))
-            
-            # Store metadata fields
             for field_key, value in resource_data.items():
                 if field_key.startswith('field'):
                     try:
                         field_id = int(field_key.replace('field', ''))
-                        conn.execute("""
-                            INSERT OR REPLACE INTO cached_metadata (
-                                resource_id, field_id, value
-                            ) VALUES (?, ?, ?)
-                        """, (resource_id, field_id, str(value)))
                     except ValueError:
-                        pass
-                        
-            # Store keywords if provided
+                        continue
+                    rows['metadata'].append((resource_id, field_id, str(value)))
+                    
             if 'keywords' in resource_data:
+                rows['keyword_owners'].append((resource_id,))
                 for keyword_data in resource_data['keywords']:
                     if isinstance(keyword_data, dict):
                         keyword = keyword_data.get('keyword', keyword_data.get('value', ''))
                     else:
                         keyword = str(keyword_data)
-                        
-                    conn.execute("""
-                        INSERT INTO cached_keywords (
-                            resource_id, keyword
-                        ) VALUES (?, ?)
-                    """, (resource_id, keyword))
+                    rows['keywords'].append((resource_id, keyword))
                     
-            # Store preview information if provided
-            if 'sizes' in resource_data:
+            if isinstance(resource_data.get('sizes'), dict):
                 for size_key, size_info in resource_data['sizes'].items():
                     if isinstance(size_info, dict):
-                        conn.execute("""
-                            INSERT OR REPLACE INTO cached_previews (
-                                resource_id, preview_type, preview_path,
-                                width, height, file_size
-                            ) VALUES (?, ?, ?, ?, ?, ?)
-                        """, (
+                        rows['previews'].append((
                             resource_id,
                             size_key,
                             size_info.get('url', ''),
@@ -268,8 +1088,8 @@ class ResourceSpaceCache:
                             size_info.get('size')
                         ))
                         
-            logger.info(f"Cached resource {resource_id} with TTL {ttl}")
-            
+        return rows
+        
     def update_metadata(self, resource_id: int, metadata: Dict[int, str]):
         """
         Update specific metadata fields for a resource
@@ -286,6 +1106,7 @@ class ResourceSpaceCache:
                     ) VALUES (?, ?, ?)
                 """, (resource_id, field_id, str(value)))
                 
+            self._reindex_search(conn, [resource_id])
             logger.info(f"Updated {len(metadata)} metadata fields for resource {resource_id}")
     
     def _calculate_file_hash(self, file_path: Path, chunk_size: int = 8192) -> str:
@@ -298,7 +1119,7 @@ class ResourceSpaceCache:
     
     def is_cached_file_valid(self, resource_id: int) -> bool:
         """Check if cached file exists and is not expired"""
-        with self._get_connection() as conn:
+        with self._get_read_connection() as conn:
             cursor = conn.execute("""
                 SELECT file_path, expires_at
                 FROM cached_files
@@ -311,27 +1132,414 @@ class ResourceSpaceCache:
                 return True
             return False
     
-    def get_cached_file_path(self, resource_id: int) -> Optional[str]:
-        """Get path to cached file if valid"""
-        with self._get_connection() as conn:
+    def get_cached_file_path(self, resource_id: int, stale_if_error: bool = False) -> Optional[str]:
+        """Get path to cached file if valid (or expired less than stale_if_error ago)"""
+        grace_seconds = int(self.stale_if_error.total_seconds()) if stale_if_error else 0
+        with self._get_read_connection() as conn:
             cursor = conn.execute("""
                 SELECT file_path
                 FROM cached_files
                 WHERE resource_id = ?
-                AND expires_at > datetime('now')
-            """, (resource_id,))
+                AND expires_at > datetime('now', ?)
+            """, (resource_id, f'-{grace_seconds} seconds'))
             
             row = cursor.fetchone()
             if row and Path(row['file_path']).exists():
                 return row['file_path']
             return None
     
+    @property
+    def _retention_grace_seconds(self) -> int:
+        """How long expired entries are kept because a stale window may still serve them"""
+        return int(max(self.stale_grace, self.stale_if_error).total_seconds())
+        
+    def _blob_path(self, file_hash: str) -> Path:
+        """Location of the blob for a SHA-256 digest, fanned out by its first two hex digits"""
+        return self.blobs_dir / file_hash[:2] / file_hash
+        
+    def _store_blob(self, conn: sqlite3.Connection, source_path: Path,
+                    file_hash: str, file_size: int) -> Path:
+        """
+        Move a downloaded file into the blob store, or drop it if the blob already exists
+        
+        Runs inside the caller's writer transaction so the blob row and the
+        cached_files row that references it are committed together.
+        """
+        blob_path = self._blob_path(file_hash)
+        if blob_path.exists():
+            source_path.unlink()
+            file_dedup_hits.labels(stage='hash').inc()
+        else:
+            self.ingest.commit(source_path, blob_path, file_size)
+            
+        conn.execute("""
+            INSERT INTO cached_blobs (file_hash, blob_path, file_size)
+            VALUES (?, ?, ?)
+            ON CONFLICT(file_hash) DO NOTHING
+        """, (file_hash, str(blob_path), file_size))
+        return blob_path
+        
+    def _link_blob(self, conn: sqlite3.Connection, resource_id: int,
+                   file_hash: str, blob_path: str, file_size: int):
+        """Point a resource at a blob (the refcount triggers keep cached_blobs in step)"""
+        expires_at = datetime.now() + self.default_ttl
+        # Remember which RS checksum this content belongs to so expiry can be revalidated
+        conn.execute("""
+            INSERT INTO cached_files (
+                resource_id, file_path, file_size, file_hash, source_checksum,
+                last_fetched, expires_at
+            ) VALUES (
+                ?, ?, ?, ?,
+                (SELECT NULLIF(file_checksum, '') FROM cached_resources WHERE resource_id = ?),
+                datetime('now'), ?
+            )
+            ON CONFLICT(resource_id) DO UPDATE SET
+                file_path = excluded.file_path,
+                file_size = excluded.file_size,
+                file_hash = excluded.file_hash,
+                source_checksum = excluded.source_checksum,
+                last_fetched = excluded.last_fetched,
+                expires_at = excluded.expires_at
+        """, (resource_id, str(blob_path), file_size, file_hash, resource_id, expires_at))
+        
+        # A re-fetch that changed content may have dropped the old blob to zero references
+        self._release_unreferenced_blobs(conn)
+        
+    def _revalidate_cached_file(self, resource_id: int) -> Optional[str]:
+        """
+        Extend an expired cached file whose RS checksum is unchanged, without re-downloading or re-hashing
+        
+        The checksum is only trusted while the resource's metadata is itself fresh.
+        
+        Returns:
+            Path to the revalidated file, or None if it has to be fetched again
+        """
+        with self._get_connection() as conn:
+            row = conn.execute("""
+                SELECT cf.file_path, cf.source_checksum = r.file_checksum AS unchanged
+                FROM cached_files cf
+                JOIN cached_resources r ON r.resource_id = cf.resource_id
+                JOIN cache_status cs ON cs.resource_id = cf.resource_id
+                WHERE cf.resource_id = ?
+                AND cs.expires_at > datetime('now')
+            """, (resource_id,)).fetchone()
+            
+            if not row:
+                return None
+            if not row['unchanged'] or not Path(row['file_path']).exists():
+                cache_revalidations.labels(kind='file', outcome='refetched').inc()
+                return None
+                
+            conn.execute(
+                "UPDATE cached_files SET expires_at = ? WHERE resource_id = ?",
+                (datetime.now() + self.default_ttl, resource_id)
+            )
+            cache_revalidations.labels(kind='file', outcome='revalidated').inc()
+            return row['file_path']
+            
+    def get_seconds_to_expiry(self, resource_ids: List[int]) -> Dict[int, int]:
+        """
+        Seconds until each cached resource expires (negative once expired)
+        
+        Measured the way reads enforce expiry, so copies held elsewhere (Redis) can be
+        given the same lifetime.
+        
+        Returns:
+            Dict of resource_id -> seconds for every cached ID
+        """
+        resource_ids = list(dict.fromkeys(int(rid) for rid in resource_ids))
+        seconds = {}
+        
+        with self._get_read_connection() as conn:
+            for chunk in _chunked(resource_ids, SQLITE_MAX_BATCH_PARAMS):
+                cursor = conn.execute(f"""
+                    SELECT resource_id,
+                           CAST((julianday(expires_at) - julianday('now')) * 86400 AS INTEGER) AS seconds
+                    FROM cache_status
+                    WHERE resource_id IN ({','.join(['?'] * len(chunk))})
+                    AND expires_at IS NOT NULL
+                """, chunk)
+                seconds.update((row['resource_id'], row['seconds']) for row in cursor)
+                
+        return seconds
+        
+    def get_validators(self, resource_ids: List[int]) -> Dict[int, str]:
+        """
+        Change tokens for cached resources, expired or not (see resource_validator)
+        
+        Returns:
+            Dict of resource_id -> token (None if RS gave no modified stamp) for every cached ID
+        """
+        resource_ids = list(dict.fromkeys(int(rid) for rid in resource_ids))
+        validators = {}
+        
+        with self._get_read_connection() as conn:
+            for chunk in _chunked(resource_ids, SQLITE_MAX_BATCH_PARAMS):
+                # Rows cached before tokens were stored fall back to their columns
+                cursor = conn.execute(f"""
+                    SELECT r.resource_id,
+                           COALESCE(cs.etag, r.modified || '/' || COALESCE(r.file_checksum, ''))
+                               AS validator
+                    FROM cached_resources r
+                    JOIN cache_status cs ON cs.resource_id = r.resource_id
+                    WHERE r.resource_id IN ({','.join(['?'] * len(chunk))})
+                    AND {VISIBLE_GENERATION_SQL}
+                """, chunk)
+                validators.update((row['resource_id'], row['validator']) for row in cursor)
+                
+        return validators
+        
+    def extend_expiry(self, resource_ids: List[int], ttl_override: Optional[timedelta] = None) -> int:
+        """
+        Mark cached resources and their files as current again without rewriting them
+        
+        Returns:
+            Number of resources extended
+        """
+        plans = self._plan_expiries({int(rid): None for rid in resource_ids}, ttl_override, unchanged=True)
+        
+        with self._get_connection() as conn:
+            extended = conn.executemany("""
+                UPDATE cache_status SET
+                    expires_at = ?, last_fetched = datetime('now'), ttl_seconds = ?,
+                    first_seen_at = ?, last_changed_at = ?, check_count = ?, change_count = ?
+                WHERE resource_id = ?
+            """, [(*plan, resource_id) for resource_id, plan in plans.items()]).rowcount
+            conn.executemany(
+                "UPDATE cached_files SET expires_at = ? WHERE resource_id = ?",
+                [(plan[0], resource_id) for resource_id, plan in plans.items()]
+            )
+                
+        return extended
+        
+    def _plan_expiries(self, validators: Dict[int, Optional[str]],
+                       ttl_override: Optional[timedelta] = None,
+                       unchanged: bool = False) -> Dict[int, Tuple]:
+        """
+        Record a refresh of each resource and choose its next expiry
+        
+        A refresh counts as a change when the resource's validator differs from the
+        stored one (revalidations pass unchanged=True). With adaptive TTLs on, each
+        resource then gets ttl_change_factor times its observed change interval:
+        the time since it last changed, or its history divided by its changes if
+        that is shorter. The result is clamped to [min_ttl, max_ttl]. Resources
+        never seen to change keep at least the default TTL, growing past it as
+        they stay stable (up to max_ttl).
+        
+        Args:
+            validators: resource_id -> validator just seen upstream
+            ttl_override: Use this TTL instead (history is still recorded)
+            unchanged: The caller has established that nothing changed
+            
+        Returns:
+            resource_id -> (expires_at, ttl_seconds, first_seen_at, last_changed_at,
+            check_count, change_count)
+        """
+        now = datetime.now()
+        history: Dict[int, sqlite3.Row] = {}
+        with self._get_read_connection() as conn:
+            for chunk in _chunked(list(validators), SQLITE_MAX_BATCH_PARAMS):
+                cursor = conn.execute(f"""
+                    SELECT resource_id, etag, first_seen_at, last_changed_at, check_count, change_count
+                    FROM cache_status
+                    WHERE resource_id IN ({','.join(['?'] * len(chunk))})
+                """, chunk)
+                history.update((row['resource_id'], row) for row in cursor)
+                
+        plans = {}
+        for resource_id, validator in validators.items():
+            row = history.get(resource_id)
+            if row is None or not row['first_seen_at']:
+                # First sighting (or a row cached before history was kept)
+                first_seen = last_changed = now
+                checks = changes = 0
+            else:
+                first_seen = _parse_db_time(row['first_seen_at']) or now
+                last_changed = _parse_db_time(row['last_changed_at']) or first_seen
+                checks = (row['check_count'] or 0) + 1
+                changes = row['change_count'] or 0
+                changed = not unchanged and validator != row['etag']
+                if changed:
+                    changes += 1
+                    last_changed = now
+                resource_change_observations.labels(outcome='changed' if changed else 'unchanged').inc()
+                
+            ttl = ttl_override or self._adaptive_ttl(now - first_seen, now - last_changed, changes)
+            adaptive_ttl_seconds.observe(ttl.total_seconds())
+            plans[resource_id] = (now + ttl, int(ttl.total_seconds()), first_seen, last_changed, checks, changes)
+            
+        return plans
+        
+    def _adaptive_ttl(self, history: timedelta, stable: timedelta, changes: int) -> timedelta:
+        """TTL for a resource observed for history, unchanged for stable, with changes seen"""
+        if not self.adaptive_ttl:
+            return self.default_ttl
+        if changes == 0:
+            # Never seen to change: only ever extend the default as it stays stable
+            ttl = max(self.default_ttl, stable * self.ttl_change_factor)
+        else:
+            ttl = min(stable, history / changes) * self.ttl_change_factor
+        return min(max(ttl, self.min_ttl), self.max_ttl)
+        
+    def _link_duplicate_blob(self, resource_id: int) -> Optional[str]:
+        """
+        Reuse the blob of another cached resource with the same RS file checksum
+        
+        Returns:
+            Path to the shared blob, or None if the file still has to be downloaded
+        """
+        with self._get_connection() as conn:
+            row = conn.execute("""
+                SELECT b.file_hash, b.blob_path, b.file_size
+                FROM cached_resources r
+                JOIN cached_resources other
+                    ON other.file_checksum = r.file_checksum AND other.resource_id != r.resource_id
+                JOIN cached_files cf ON cf.resource_id = other.resource_id
+                JOIN cached_blobs b ON b.file_hash = cf.file_hash
+                WHERE r.resource_id = ? AND r.file_checksum != ''
+                LIMIT 1
+            """, (resource_id,)).fetchone()
+            
+            if not row or not Path(row['blob_path']).exists():
+                return None
+                
+            self._link_blob(conn, resource_id, row['file_hash'], row['blob_path'], row['file_size'])
+            file_dedup_hits.labels(stage='checksum').inc()
+            return row['blob_path']
+            
+    def _release_unreferenced_blobs(self, conn: sqlite3.Connection) -> Tuple[int, int]:
+        """
+        Delete blobs that no cached_files row references any more
+        
+        The files themselves are only unlinked once the caller's transaction has
+        committed, so a rollback never leaves rows pointing at missing files.
+        
+        Returns:
+            Tuple of (blobs_removed, bytes_freed)
+        """
+        rows = conn.execute("""
+            SELECT file_hash, blob_path, file_size FROM cached_blobs
+            WHERE ref_count <= 0
+        """).fetchall()
+        if not rows:
+            return 0, 0
+            
+        conn.executemany("DELETE FROM cached_blobs WHERE file_hash = ?",
+                         [(row['file_hash'],) for row in rows])
+        released = [(row['file_hash'], row['blob_path']) for row in rows]
+        self.db.after_commit(lambda: self._unlink_blobs(conn, released))
+        return len(rows), sum(row['file_size'] or 0 for row in rows)
+        
+    @staticmethod
+    def _unlink_blobs(conn: sqlite3.Connection, released: List[Tuple[str, str]]):
+        """Delete released blob files, unless the same content was stored again before the commit"""
+        for file_hash, blob_path in released:
+            if conn.execute("SELECT 1 FROM cached_blobs WHERE file_hash = ?", (file_hash,)).fetchone():
+                continue
+            try:
+                Path(blob_path).unlink(missing_ok=True)
+            except OSError as e:
+                logger.error(f"Failed to remove blob {blob_path}: {e}")
+        
+    def _adopt_legacy_files(self, batch_size: int = 200):
+        """Move originals cached before the blob store existed into it, merging duplicates"""
+        with self._get_read_connection() as conn:
+            rows = conn.execute("""
+                SELECT resource_id, file_path, file_hash FROM cached_files
+                WHERE resource_id NOT IN (
+                    SELECT cf.resource_id FROM cached_files cf
+                    JOIN cached_blobs b ON b.blob_path = cf.file_path
+                )
+            """).fetchall()
+            
+        if not rows:
+            return
+            
+        adopted = 0
+        for batch in _chunked(rows, batch_size):
+            with self._get_connection() as conn:
+                for row in batch:
+                    path = Path(row['file_path'])
+                    if not path.exists():
+                        conn.execute("DELETE FROM cached_files WHERE resource_id = ?", (row['resource_id'],))
+                        continue
+                        
+                    file_hash = row['file_hash'] or self._calculate_file_hash(path)
+                    file_size = path.stat().st_size
+                    blob_path = self._store_blob(conn, path, file_hash, file_size)
+                    conn.execute("""
+                        UPDATE cached_files SET file_path = ?, file_hash = ?, file_size = ?
+                        WHERE resource_id = ?
+                    """, (str(blob_path), file_hash, file_size, row['resource_id']))
+                    adopted += 1
+                    
+        with self._get_connection() as conn:
+            # Blob rows were created after their references, so count them directly
+            conn.execute("""
+                UPDATE cached_blobs SET ref_count = (
+                    SELECT COUNT(*) FROM cached_files cf WHERE cf.file_hash = cached_blobs.file_hash
+                )
+            """)
+            self._release_unreferenced_blobs(conn)
+            
+        logger.info(f"Moved {adopted} cached files into the blob store")
+        
+    def _get_original_file_url(self, resource_id: int, file_extension: str) -> Optional[str]:
+        """Ask the RS API for a download URL for a resource's original file"""
+        if not self.rs_api_url or not self.rs_api_key:
+            logger.error("RS API credentials not configured")
+            return None
+            
+        # Build signed API request
+        ordered_params = [
+            ('user', 'admin'),
+            ('function', 'get_resource_path'),
+            ('param1', str(resource_id)),
+            ('param2', ''),
+            ('param3', ''),  # empty size for original
+            ('param4', '0'), # don't generate
+            ('param5', file_extension),
+            ('param6', '1'),
+            ('param7', '0'),
+            ('param8', '-1')
+        ]
+        
+        query_string = urlencode(ordered_params)
+        signature = hashlib.sha256((self.rs_api_key + query_string).encode()).hexdigest()
+        
+        url = f"{self.rs_api_url}?{query_string}&sign={signature}"
+        
+        def request() -> requests.Response:
+            response = requests.get(url, timeout=30)
+            response.raise_for_status()
+            return response
+            
+        if self.circuit_breaker:
+            response = self.circuit_breaker.call_sync(request, is_failure=is_upstream_failure)
+        else:
+            response = request()
+        
+        # The response might be JSON-encoded, so try to decode it
+        file_url = response.text.strip()
+        if file_url.startswith('"') and file_url.endswith('"'):
+            # It's a JSON string, decode it
+            file_url = json.loads(file_url)
+            
+        if not file_url or not file_url.startswith('http'):
+            logger.error(f"Invalid file URL returned for resource {resource_id}: {file_url}")
+            return None
+            
+        return file_url
+        
     def fetch_and_cache_file(self, resource_id: int, 
                            file_url: Optional[str] = None,
                            file_extension: Optional[str] = None) -> Optional[str]:
         """
         Fetch and cache resource file
         
+        Files are stored once per distinct SHA-256 under blobs/; resources with
+        identical content share a blob instead of holding their own copy.
+        
         Args:
             resource_id: Resource ID
             file_url: Direct URL to file (if available)
@@ -345,11 +1553,93 @@ class ResourceSpaceCache:
         if cached_path:
             logger.info(f"Using existing cached file for resource {resource_id}")
             return cached_path
+            
+        # Expired, but RS still reports the checksum it was fetched under: keep it
+        revalidated_path = self._revalidate_cached_file(resource_id)
+        if revalidated_path:
+            logger.info(f"Revalidated cached file for resource {resource_id}")
+            return revalidated_path
+            
+        # Same RS checksum as a resource we already hold: link to its blob, skip the download
+        linked_path = self._link_duplicate_blob(resource_id)
+        if linked_path:
+            logger.info(f"Linked resource {resource_id} to existing blob {linked_path}")
+            return linked_path
         
-        # Determine file extension
+        file_extension = self._resolve_file_extension(resource_id, file_extension)
+        
+        # An earlier download was interrupted or ranges were already served: fill in the rest
+        partial = self.partials.get(resource_id)
+        if partial:
+            try:
+                partial = self._fetch_partial_range(resource_id, partial, 0, None, file_extension)
+                return self._finalize_partial(partial) if partial else None
+            except RangeNotSupported as e:
+                logger.warning(f"Cannot resume download for resource {resource_id} ({e}), starting over")
+                self.partials.remove(resource_id)
+            except Exception as e:
+                # Keep what we have; a later request resumes from the last complete chunk
+                logger.error(f"Failed to resume download for resource {resource_id}: {e}")
+                file_download_failures.inc()
+                return None
+                
+        result = None
+        response = None
+        try:
+            if not file_url:
+                file_url = self._get_original_file_url(resource_id, file_extension)
+                if not file_url:
+                    return None
+                logger.info(f"Downloading file from: {file_url[:100]}...")
+                
+            response = open_download(file_url, 30, self.circuit_breaker)
+            
+            # Single pass: hash and size are computed while the temp file is written
+            with response:
+                result = self.ingest.ingest(response.iter_content(chunk_size=self.ingest.chunk_size),
+                                            prefix=f"{resource_id}.",
+                                            keep_partial=response.headers.get('Accept-Ranges') == 'bytes')
+                
+            with self._get_connection() as conn:
+                blob_path = self._store_blob(conn, result.temp_path, result.file_hash, result.file_size)
+                self._link_blob(conn, resource_id, result.file_hash, str(blob_path), result.file_size)
+                
+            file_download_bytes.inc(result.file_size)
+            file_download_throughput.observe(result.throughput_bytes_per_second)
+            logger.info(f"Cached file for resource {resource_id} at {blob_path} "
+                        f"({result.file_size:,} bytes, {result.throughput_bytes_per_second / 1e6:.1f} MB/s)")
+            return str(blob_path)
+            
+        except IngestInterrupted as e:
+            logger.error(f"Failed to cache file for resource {resource_id}: {e}")
+            file_download_failures.inc()
+            # Keep whole chunks received so far; the next request resumes with Range requests
+            total_size = int(response.headers.get('Content-Length') or 0)
+            kept = None
+            try:
+                kept = self.partials.adopt(resource_id, e.temp_path, e.bytes_written, total_size, file_url,
+                                           response.headers.get('ETag') or response.headers.get('Last-Modified'))
+            except Exception as adopt_error:
+                logger.error(f"Failed to keep partial download for resource {resource_id}: {adopt_error}")
+            if kept is None:
+                e.temp_path.unlink(missing_ok=True)
+            return None
+            
+        except CircuitOpenError as e:
+            logger.warning(f"Not downloading file for resource {resource_id}: {e}")
+            return None
+            
+        except Exception as e:
+            logger.error(f"Failed to cache file for resource {resource_id}: {e}")
+            file_download_failures.inc()
+            self.ingest.discard(result)  # Clean up a download that never reached the blob store
+            return None
+            
+    def _resolve_file_extension(self, resource_id: int, file_extension: Optional[str]) -> str:
+        """Use the given extension, else the cached resource's, else 'bin'"""
         if not file_extension:
             # Try to get from resource metadata
-            with self._get_connection() as conn:
+            with self._get_read_connection() as conn:
                 cursor = conn.execute("""
                     SELECT file_extension FROM cached_resources
                     WHERE resource_id = ?
@@ -358,168 +1648,169 @@ class ResourceSpaceCache:
                 if row:
                     file_extension = row['file_extension']
                     
-        if not file_extension:
-            file_extension = 'bin'  # default binary
-            
-        # Prepare local file path
-        local_path = self.originals_dir / f"{resource_id}.{file_extension}"
+        return file_extension or 'bin'  # default binary
         
-        try:
-            # If we have a direct URL, download from it
-            if file_url:
-                response = requests.get(file_url, stream=True, timeout=30)
-                response.raise_for_status()
-                
-                # Download file in chunks
-                with open(local_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                        
-            else:
-                # Use RS API to get file
-                if not self.rs_api_url or not self.rs_api_key:
-                    logger.error("RS API credentials not configured")
-                    return None
-                    
-                # Build signed API request
-                ordered_params = [
-                    ('user', 'admin'),
-                    ('function', 'get_resource_path'),
-                    ('param1', str(resource_id)),
-                    ('param2', ''),
-                    ('param3', ''),  # empty size for original
-                    ('param4', '0'), # don't generate
-                    ('param5', file_extension),
-                    ('param6', '1'),
-                    ('param7', '0'),
-                    ('param8', '-1')
-                ]
-                
-                query_string = urlencode(ordered_params)
-                signature = hashlib.sha256((self.rs_api_key + query_string).encode()).hexdigest()
-                
-                url = f"{self.rs_api_url}?{query_string}&sign={signature}"
-                response = requests.get(url, timeout=30)
-                response.raise_for_status()
-                
-                # The response might be JSON-encoded, so try to decode it
-                file_url = response.text.strip()
-                if file_url.startswith('"') and file_url.endswith('"'):
-                    # It's a JSON string, decode it
-                    file_url = json.loads(file_url)
-                
-                if not file_url or not file_url.startswith('http'):
-                    logger.error(f"Invalid file URL returned for resource {resource_id}: {file_url}")
-                    return None
-                    
-                logger.info(f"Downloading file from: {file_url[:100]}...")
-                
-                # Download the file
-                file_response = requests.get(file_url, stream=True, timeout=30)
-                file_response.raise_for_status()
-                
-                with open(local_path, 'wb') as f:
-                    for chunk in file_response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+    def get_file_range(self, resource_id: int, first_byte: int, last_byte: int,
+                       file_extension: Optional[str] = None) -> Optional[Tuple[str, int, bool]]:
+        """
+        Make bytes first_byte..last_byte of a resource's original available locally
+        
+        Fully cached files are used as they are. Otherwise only the chunks covering
+        the range are downloaded (with Range requests) into a partial file, which
+        becomes a normal cached file once every chunk is present.
+        
+        Args:
+            resource_id: Resource ID
+            first_byte: First byte the client asked for
+            last_byte: Last byte the client asked for (clamped to the file size)
+            file_extension: File extension
             
-            # Calculate file hash and size
-            file_size = local_path.stat().st_size
-            file_hash = self._calculate_file_hash(local_path)
+        Returns:
+            Tuple of (path to read the range from, total file size, whether the whole
+            file is cached) or None if failed
+        """
+        cached_path = self.get_cached_file_path(resource_id)
+        if cached_path:
+            return cached_path, os.path.getsize(cached_path), True
             
-            # Store in database with current TTL
-            expires_at = datetime.now() + self.default_ttl
+        partial = self.partials.get(resource_id)
+        if partial and first_byte >= partial.total_size:
+            return str(partial.path), partial.total_size, False
             
-            with self._get_connection() as conn:
-                conn.execute("""
-                    INSERT OR REPLACE INTO cached_files (
-                        resource_id, file_path, file_size, file_hash,
-                        last_fetched, expires_at
-                    ) VALUES (?, ?, ?, ?, datetime('now'), ?)
-                """, (resource_id, str(local_path), file_size, file_hash, expires_at))
-                
-            logger.info(f"Cached file for resource {resource_id} at {local_path}")
-            return str(local_path)
+        try:
+            partial = self._fetch_partial_range(resource_id, partial, first_byte, last_byte, file_extension)
+            if partial is None:
+                return None
+        except RangeNotSupported as e:
+            logger.warning(f"Range caching unavailable for resource {resource_id} ({e}), downloading whole file")
+            self.partials.remove(resource_id)
+            path = self.fetch_and_cache_file(resource_id, file_extension=file_extension)
+            return (path, os.path.getsize(path), True) if path else None
+            
+        except CircuitOpenError as e:
+            logger.warning(f"Not fetching range of resource {resource_id}: {e}")
+            return None
             
         except Exception as e:
-            logger.error(f"Failed to cache file for resource {resource_id}: {e}")
-            if local_path.exists():
-                local_path.unlink()  # Clean up partial download
+            logger.error(f"Failed to cache range {first_byte}-{last_byte} of resource {resource_id}: {e}")
+            file_download_failures.inc()
             return None
-    
+            
+        if partial.is_complete:
+            path = self._finalize_partial(partial)
+            if path:
+                return path, partial.total_size, True
+                
+        return str(partial.path), partial.total_size, False
+        
+    def _fetch_partial_range(self, resource_id: int, partial: Optional[PartialFile],
+                             first_byte: int, last_byte: Optional[int],
+                             file_extension: Optional[str]) -> Optional[PartialFile]:
+        """Fetch missing chunks for a byte range, refreshing an expired download URL once"""
+        if partial:
+            file_url = partial.file_url
+        else:
+            file_url = self._get_original_file_url(
+                resource_id, self._resolve_file_extension(resource_id, file_extension))
+            if not file_url:
+                return None
+                
+        try:
+            return self.partials.fetch_range(resource_id, file_url, first_byte, last_byte, partial)
+        except requests.HTTPError as e:
+            if partial is None or e.response is None or e.response.status_code not in (401, 403, 404, 410):
+                raise
+                
+        # Signed download URLs expire; ask RS for a fresh one and retry once
+        partial.file_url = self._get_original_file_url(
+            resource_id, self._resolve_file_extension(resource_id, file_extension))
+        if not partial.file_url:
+            return None
+        return self.partials.fetch_range(resource_id, partial.file_url, first_byte, last_byte, partial)
+        
+    def _finalize_partial(self, partial: PartialFile) -> Optional[str]:
+        """Hash a completed partial file and turn it into a normal cached file"""
+        if not partial.is_complete:
+            return None
+            
+        file_hash = self._calculate_file_hash(partial.path, chunk_size=self.ingest.chunk_size)
+        with self._get_connection() as conn:
+            deleted = conn.execute(
+                "DELETE FROM cached_partials WHERE resource_id = ?", (partial.resource_id,)
+            ).rowcount
+            if not deleted:
+                # Another request finalized it first
+                return self.get_cached_file_path(partial.resource_id)
+            blob_path = self._store_blob(conn, partial.path, file_hash, partial.total_size)
+            self._link_blob(conn, partial.resource_id, file_hash, str(blob_path), partial.total_size)
+            
+        logger.info(f"Completed ranged download for resource {partial.resource_id} at {blob_path}")
+        return str(blob_path)
+        
     def evict_cached_files(self, force: bool = False, max_cache_size_mb: Optional[int] = None) -> Tuple[int, int]:
         """
         Remove expired cached files
         
+        Dropping a resource's file only releases its reference; a blob's bytes are
+        freed once no resource points at it any more.
+        
         Args:
             force: If True, remove all files regardless of expiry
-            max_cache_size_mb: Maximum cache size in MB, if exceeded, remove oldest files
+            max_cache_size_mb: Maximum cache size in MB, if exceeded, remove least recently used blobs
             
         Returns:
             Tuple of (files_removed, bytes_freed)
         """
-        files_removed = 0
-        bytes_freed = 0
+        # Partial originals nobody has extended recently
+        files_removed, bytes_freed = self.partials.evict_idle(self.partial_idle_hours, force=force)
+        partial_size = self.partials.stats()['partial_size']
         
         with self._get_connection() as conn:
             if force:
-                cursor = conn.execute("SELECT resource_id, file_path, file_size FROM cached_files")
+                cursor = conn.execute("DELETE FROM cached_files")
             else:
-                cursor = conn.execute("""
-                    SELECT resource_id, file_path, file_size 
-                    FROM cached_files
-                    WHERE expires_at < datetime('now')
-                """)
-                
-            files_to_remove = cursor.fetchall()
+                # Expired files are kept for stale-if-error serving until size pressure evicts them
+                cursor = conn.execute(
+                    "DELETE FROM cached_files WHERE expires_at < datetime('now', ?)",
+                    (f'-{self._retention_grace_seconds} seconds',)
+                )
+            files_removed += cursor.rowcount
             
-            for row in files_to_remove:
-                file_path = Path(row['file_path'])
-                if file_path.exists():
-                    try:
-                        bytes_freed += file_path.stat().st_size
-                        file_path.unlink()
-                        files_removed += 1
-                    except Exception as e:
-                        logger.error(f"Failed to remove file {file_path}: {e}")
-                        
-                # Remove from database
-                conn.execute("DELETE FROM cached_files WHERE resource_id = ?", 
-                           (row['resource_id'],))
+            _, freed = self._release_unreferenced_blobs(conn)
+            bytes_freed += freed
                            
             # Check if we need to remove more files due to size constraints
             if max_cache_size_mb:
                 max_cache_bytes = max_cache_size_mb * 1024 * 1024
                 
-                # Get current cache size
-                cursor = conn.execute("SELECT SUM(file_size) as total_size FROM cached_files")
-                current_size = cursor.fetchone()['total_size'] or 0
+                # Get current cache size (bytes actually on disk, not per-resource sizes)
+                cursor = conn.execute("SELECT total_bytes FROM cache_ledger WHERE name = 'blobs'")
+                current_size = (cursor.fetchone()['total_bytes'] or 0) + partial_size
                 
                 if current_size > max_cache_bytes:
-                    # Remove oldest files until we're under the limit
-                    cursor = conn.execute("""
-                        SELECT resource_id, file_path, file_size 
-                        FROM cached_files
-                        ORDER BY last_fetched ASC
-                    """)
+                    # A shared blob is as recent as the most recently used resource pointing at it
+                    candidates = conn.execute("""
+                        SELECT b.file_hash, b.file_size
+                        FROM cached_blobs b
+                        JOIN cached_files cf ON cf.file_hash = b.file_hash
+                        LEFT JOIN cached_resources r ON r.resource_id = cf.resource_id
+                        GROUP BY b.file_hash
+                        ORDER BY MAX(COALESCE(r.last_accessed, cf.last_fetched)) ASC,
+                                 MAX(cf.last_fetched) ASC
+                    """).fetchall()
                     
-                    for row in cursor:
+                    evicted = []
+                    for row in candidates:
                         if current_size <= max_cache_bytes:
                             break
-                            
-                        file_path = Path(row['file_path'])
-                        if file_path.exists():
-                            try:
-                                file_size = file_path.stat().st_size
-                                file_path.unlink()
-                                files_removed += 1
-                                bytes_freed += file_size
-                                current_size -= file_size
-                                
-                                # Remove from database
-                                conn.execute("DELETE FROM cached_files WHERE resource_id = ?", 
-                                           (row['resource_id'],))
-                            except Exception as e:
-                                logger.error(f"Failed to remove file {file_path}: {e}")
+                        evicted.append((row['file_hash'],))
+                        current_size -= row['file_size'] or 0
+                        
+                    if evicted:
+                        cursor = conn.executemany("DELETE FROM cached_files WHERE file_hash = ?", evicted)
+                        files_removed += cursor.rowcount
+                        _, freed = self._release_unreferenced_blobs(conn)
+                        bytes_freed += freed
                            
         logger.info(f"Evicted {files_removed} cached files, freed {bytes_freed:,} bytes")
         return files_removed, bytes_freed
@@ -542,18 +1833,36 @@ class ResourceSpaceCache:
             if force:
                 cursor = conn.execute("DELETE FROM cached_resources")
             else:
+                # Entries inside a stale window can still be served while they refresh
+                # or while upstream is unavailable
                 cursor = conn.execute("""
                     DELETE FROM cached_resources
                     WHERE resource_id IN (
                         SELECT resource_id FROM cache_status
-                        WHERE expires_at < datetime('now')
+                        WHERE expires_at < datetime('now', ?)
                     )
-                """)
+                """, (f'-{self._retention_grace_seconds} seconds',))
                 
             metadata_removed = cursor.rowcount
             
+            if force:
+                cursor = conn.execute("DELETE FROM negative_cache")
+            else:
+                cursor = conn.execute("DELETE FROM negative_cache WHERE expires_at <= datetime('now')")
+            negative_removed = cursor.rowcount
+            
+            if force:
+                conn.execute("DELETE FROM search_results")
+            else:
+                conn.execute("DELETE FROM search_results WHERE expires_at <= datetime('now')")
+            
+            # Cascaded cached_files deletes may have left blobs unreferenced
+            _, freed = self._release_unreferenced_blobs(conn)
+            bytes_freed += freed
+            
         stats = {
             'metadata_entries_removed': metadata_removed,
+            'negative_entries_removed': negative_removed,
             'files_removed': files_removed,
             'bytes_freed': bytes_freed
         }
@@ -564,7 +1873,9 @@ class ResourceSpaceCache:
     def search_cached_resources(self, 
                               resource_type: Optional[int] = None,
                               keywords: Optional[List[str]] = None,
-                              limit: int = 100) -> List[Dict[str, Any]]:
+                              limit: int = 100,
+                              query: Optional[str] = None,
+                              resource_types: Optional[List[int]] = None) -> List[Dict[str, Any]]:
         """
         Search cached resources
         
@@ -572,25 +1883,35 @@ class ResourceSpaceCache:
             resource_type: Filter by resource type
             keywords: Filter by keywords
             limit: Maximum results to return
+            query: Full-text query (words, prefix*, "phrases", AND/OR/NOT), ranked by bm25
+            resource_types: Filter by any of these resource types
             
         Returns:
             List of matching resources
         """
-        query = """
+        resource_types = list(resource_types or [])
+        if resource_type is not None:
+            resource_types.append(resource_type)
+            
+        if query and query.strip():
+            return self._search_full_text(query, resource_types, limit)
+            
+        sql = f"""
             SELECT DISTINCT r.*
             FROM cached_resources r
             JOIN cache_status cs ON r.resource_id = cs.resource_id
             WHERE cs.expires_at > datetime('now')
+            AND {VISIBLE_GENERATION_SQL}
         """
         
         params = []
         
-        if resource_type is not None:
-            query += " AND r.resource_type = ?"
-            params.append(resource_type)
+        if resource_types:
+            sql += " AND r.resource_type IN ({})".format(','.join(['?'] * len(resource_types)))
+            params.extend(resource_types)
             
         if keywords:
-            query += """
+            sql += """
                 AND r.resource_id IN (
                     SELECT resource_id FROM cached_keywords
                     WHERE keyword IN ({})
@@ -598,21 +1919,58 @@ class ResourceSpaceCache:
             """.format(','.join(['?'] * len(keywords)))
             params.extend(keywords)
             
-        query += " ORDER BY r.last_accessed DESC LIMIT ?"
+        sql += " ORDER BY r.last_accessed DESC LIMIT ?"
         params.append(limit)
         
-        with self._get_connection() as conn:
-            cursor = conn.execute(query, params)
+        with self._get_read_connection() as conn:
+            cursor = conn.execute(sql, params)
             return [dict(row) for row in cursor]
             
+    def _search_full_text(self, query: str, resource_types: List[int], limit: int) -> List[Dict[str, Any]]:
+        """Search the FTS5 index; returns [] when the query can't be answered locally"""
+        match = build_fts_query(query)
+        if not match:
+            return []
+            
+        sql = f"""
+            SELECT r.*, bm25(resource_search, {', '.join(map(str, SEARCH_RANK_WEIGHTS))}) AS search_rank
+            FROM resource_search
+            JOIN cached_resources r ON r.resource_id = resource_search.rowid
+            JOIN cache_status cs ON cs.resource_id = r.resource_id
+            WHERE resource_search MATCH ?
+            AND cs.expires_at > datetime('now')
+            AND {VISIBLE_GENERATION_SQL}
+        """
+        params: List[Any] = [match]
+        
+        if resource_types:
+            sql += " AND r.resource_type IN ({})".format(','.join(['?'] * len(resource_types)))
+            params.extend(resource_types)
+            
+        sql += " ORDER BY search_rank LIMIT ?"
+        params.append(limit)
+        
+        try:
+            with self._get_read_connection() as conn:
+                return [dict(row) for row in conn.execute(sql, params)]
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Full-text search failed for {query!r} ({match}): {e}")
+            return []
+            
+    def resource_count(self) -> int:
+        """Number of cached resources, from the trigger-maintained ledger (no table scan)"""
+        with self._get_read_connection() as conn:
+            row = conn.execute("SELECT item_count FROM cache_ledger WHERE name = 'resources'").fetchone()
+        return row['item_count'] if row else 0
+        
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get cache statistics"""
-        with self._get_connection() as conn:
+        """Get cache statistics (scans several tables; keep it off hot paths like /health)"""
+        with self._get_read_connection() as conn:
             stats = {}
+            ledger = {row['name']: row for row in conn.execute("SELECT * FROM cache_ledger")}
             
             # Total cached resources
-            cursor = conn.execute("SELECT COUNT(*) as count FROM cached_resources")
-            stats['total_resources'] = cursor.fetchone()['count']
+            stats['total_resources'] = ledger['resources']['item_count']
             
             # Expired resources
             cursor = conn.execute("""
@@ -623,46 +1981,218 @@ class ResourceSpaceCache:
             
             # Cached files statistics
             cursor = conn.execute("""
-                SELECT 
-                    COUNT(*) as count,
-                    SUM(file_size) as total_size,
-                    COUNT(CASE WHEN expires_at < datetime('now') THEN 1 END) as expired_count
-                FROM cached_files
+                SELECT COUNT(*) as expired_count FROM cached_files
+                WHERE expires_at < datetime('now')
             """)
-            file_stats = cursor.fetchone()
             stats['cached_files'] = {
-                'count': file_stats['count'],
-                'total_size': file_stats['total_size'] or 0,
-                'expired_count': file_stats['expired_count'] or 0
+                'count': ledger['files']['item_count'],
+                'total_size': ledger['files']['total_bytes'],
+                'expired_count': cursor.fetchone()['expired_count'] or 0,
+                # Deduplicated store: what the files above actually occupy on disk
+                'blob_count': ledger['blobs']['item_count'],
+                'stored_size': ledger['blobs']['total_bytes']
             }
+            stats['cached_files'].update(self.partials.stats())
             
-            # Cache size (metadata)
+            # Negative results by reason
             cursor = conn.execute("""
-                SELECT SUM(file_size) as total_size FROM cached_resources
+                SELECT reason, COUNT(*) AS count FROM negative_cache
+                WHERE expires_at > datetime('now')
+                GROUP BY reason
             """)
-            stats['metadata_size'] = cursor.fetchone()['total_size'] or 0
+            stats['negative_entries'] = {row['reason']: row['count'] for row in cursor}
+            
+            # Cache size (metadata)
+            stats['metadata_size'] = ledger['resources']['total_bytes']
             
             # Most accessed resources
             cursor = conn.execute("""
-                SELECT r.resource_id, r.title, r.last_accessed,
+                SELECT r.resource_id, r.title, r.last_accessed, r.hit_count,
                        cf.file_path IS NOT NULL as has_cached_file
                 FROM cached_resources r
                 LEFT JOIN cached_files cf ON r.resource_id = cf.resource_id
-                ORDER BY r.last_accessed DESC
+                ORDER BY r.hit_count DESC, r.last_accessed DESC
                 LIMIT 10
             """)
             stats['most_accessed'] = [dict(row) for row in cursor]
             
-            # Calculate cache directory size
-            cache_dir_size = 0
-            if self.cache_dir.exists():
-                for file in self.cache_dir.rglob('*'):
-                    if file.is_file():
-                        cache_dir_size += file.stat().st_size
-            stats['cache_directory_size'] = cache_dir_size
+            stats['ledger_reconciled_at'] = ledger['files']['reconciled_at']
             
-            return stats
+            # Adaptive TTLs: spread of assigned TTLs and how often refreshes found a change
+            row = conn.execute("""
+                SELECT MIN(ttl_seconds) AS min_seconds, AVG(ttl_seconds) AS avg_seconds,
+                       MAX(ttl_seconds) AS max_seconds,
+                       SUM(check_count) AS checks, SUM(change_count) AS changes
+                FROM cache_status
+            """).fetchone()
+            stats['ttl'] = {
+                'min_seconds': row['min_seconds'],
+                'avg_seconds': int(row['avg_seconds']) if row['avg_seconds'] is not None else None,
+                'max_seconds': row['max_seconds'],
+                'staleness_rate': (row['changes'] or 0) / row['checks'] if row['checks'] else 0.0
+            }
+            
+            # Generation floors, and whether rows hidden by them still await the sweep
+            stats['generations'] = self._read_generation_floors(conn)
+            stats['generation_sweep_pending'] = stats['generations'] != self._swept_floors
             
+        # Cache directory size: stored blobs plus the database itself
+        stats['cache_directory_size'] = (stats['cached_files']['stored_size'] +
+                                         stats['cached_files']['partial_size'] +
+                                         self._database_size())
+        
+        return stats
+        
+    def _database_size(self) -> int:
+        """Size of the SQLite database including its WAL and shared-memory files"""
+        total = 0
+        for suffix in ('', '-wal', '-shm'):
+            try:
+                total += os.stat(self.db_path + suffix).st_size
+            except OSError:
+                pass
+        return total
+        
+    def reconcile_size_ledger(self, check_files: bool = True,
+                              throttle_every: int = 500,
+                              throttle_seconds: float = 0.05,
+                              orphan_grace_seconds: int = 3600) -> Dict[str, Any]:
+        """
+        Correct drift in the size ledger (low priority, run periodically)
+        
+        Args:
+            check_files: Also compare cached_blobs with the blob store on disk
+            throttle_every: Sleep after this many filesystem operations
+            throttle_seconds: How long to sleep so request threads are not starved
+            orphan_grace_seconds: Only delete untracked files older than this (in-flight downloads)
+            
+        Returns:
+            Dict with ledger drift and repair counts
+        """
+        result = {'missing_files_removed': 0, 'orphan_files_removed': 0, 'orphan_bytes_removed': 0}
+        
+        if check_files:
+            result.update(self._remove_missing_file_rows(throttle_every, throttle_seconds))
+            result.update(self._remove_orphan_files(throttle_every, throttle_seconds, orphan_grace_seconds))
+            
+        with self._get_connection() as conn:
+            cursor = conn.execute("""
+                UPDATE cached_blobs SET ref_count = (
+                    SELECT COUNT(*) FROM cached_files cf WHERE cf.file_hash = cached_blobs.file_hash
+                )
+                WHERE ref_count != (
+                    SELECT COUNT(*) FROM cached_files cf WHERE cf.file_hash = cached_blobs.file_hash
+                )
+            """)
+            result['blob_refcounts_fixed'] = cursor.rowcount
+            
+            before = {row['name']: (row['total_bytes'], row['item_count'])
+                      for row in conn.execute("SELECT * FROM cache_ledger")}
+            totals = {
+                'files': conn.execute(
+                    "SELECT COALESCE(SUM(file_size), 0), COUNT(*) FROM cached_files"
+                ).fetchone(),
+                'blobs': conn.execute(
+                    "SELECT COALESCE(SUM(file_size), 0), COUNT(*) FROM cached_blobs"
+                ).fetchone(),
+                'resources': conn.execute(
+                    "SELECT COALESCE(SUM(file_size), 0), COUNT(*) FROM cached_resources"
+                ).fetchone()
+            }
+            conn.executemany("""
+                UPDATE cache_ledger
+                SET total_bytes = ?, item_count = ?, reconciled_at = datetime('now')
+                WHERE name = ?
+            """, [(row[0], row[1], name) for name, row in totals.items()])
+            
+        for name, row in totals.items():
+            bytes_before, count_before = before.get(name, (0, 0))
+            result[f'{name}_bytes_drift'] = row[0] - bytes_before
+            result[f'{name}_count_drift'] = row[1] - count_before
+            
+        logger.info(f"Size ledger reconciled: {result}")
+        return result
+        
+    def _remove_missing_file_rows(self, throttle_every: int, throttle_seconds: float) -> Dict[str, int]:
+        """Delete blobs whose file no longer exists on disk, along with the rows that reference them"""
+        removed = 0
+        last_hash = ''
+        
+        while True:
+            with self._get_read_connection() as conn:
+                rows = conn.execute("""
+                    SELECT file_hash, blob_path FROM cached_blobs
+                    WHERE file_hash > ? ORDER BY file_hash LIMIT ?
+                """, (last_hash, throttle_every)).fetchall()
+            if not rows:
+                break
+                
+            last_hash = rows[-1]['file_hash']
+            missing = [(row['file_hash'],) for row in rows if not Path(row['blob_path']).exists()]
+            if missing:
+                with self._get_connection() as conn:
+                    cursor = conn.executemany("DELETE FROM cached_files WHERE file_hash = ?", missing)
+                    removed += cursor.rowcount
+                    conn.executemany("DELETE FROM cached_blobs WHERE file_hash = ?", missing)
+            time.sleep(throttle_seconds)
+            
+        with self._get_read_connection() as conn:
+            partials = conn.execute("SELECT resource_id, partial_path FROM cached_partials").fetchall()
+        for row in partials:
+            if not Path(row['partial_path']).exists():
+                self.partials.remove(row['resource_id'])
+                removed += 1
+                
+        return {'missing_files_removed': removed}
+        
+    def _remove_orphan_files(self, throttle_every: int, throttle_seconds: float,
+                             orphan_grace_seconds: int) -> Dict[str, int]:
+        """Delete blob, partial and leftover download files that no table row points at"""
+        removed = 0
+        removed_bytes = 0
+        cutoff = time.time() - orphan_grace_seconds
+        
+        def check(batch: List[os.DirEntry]):
+            nonlocal removed, removed_bytes
+            paths = [entry.path for entry in batch]
+            with self._get_read_connection() as conn:
+                placeholders = ','.join(['?'] * len(paths))
+                known = {row[0] for row in conn.execute(
+                    f"""SELECT blob_path FROM cached_blobs WHERE blob_path IN ({placeholders})
+                        UNION ALL
+                        SELECT partial_path FROM cached_partials WHERE partial_path IN ({placeholders})""",
+                    paths + paths
+                )}
+            for entry in batch:
+                if entry.path in known:
+                    continue
+                try:
+                    stat = entry.stat()
+                    if stat.st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        removed += 1
+                        removed_bytes += stat.st_size
+                except OSError as e:
+                    logger.error(f"Failed to remove orphan file {entry.path}: {e}")
+                    
+        batch: List[os.DirEntry] = []
+        pending = [str(self.blobs_dir), str(self.originals_dir), str(self.partials_dir)]
+        while pending:
+            with os.scandir(pending.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        batch.append(entry)
+                        if len(batch) >= throttle_every:
+                            check(batch)
+                            batch = []
+                            time.sleep(throttle_seconds)
+        if batch:
+            check(batch)
+            
+        return {'orphan_files_removed': removed, 'orphan_bytes_removed': removed_bytes}
+        
     def cache_resource_types(self, resource_types: List[Dict[str, Any]]):
         """Cache resource type definitions"""
         with self._get_connection() as conn:
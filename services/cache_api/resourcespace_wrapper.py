@@ -8,7 +8,8 @@ import os
 import json
 import httpx
 import hashlib
-from typing import Optional, Dict, List, Any
+import time
+from typing import Optional, Dict, List, Any, Tuple
 from pathlib import Path
 from datetime import timedelta
 import logging
@@ -16,7 +17,19 @@ import asyncio
 from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 
-from resourcespace_cache import ResourceSpaceCache
+from resourcespace_cache import ResourceSpaceCache, resource_validator, is_visible_generation
+from access_tracker import AccessTracker
+from l1_cache import L1Cache
+from search_query import search_cache_key
+from redis_cache import xfetch_due
+from singleflight import SingleFlight
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from negative_cache import (ResourceUnavailable, classify_api_result, classify_http_error,
+                            NOT_FOUND, FORBIDDEN, ERROR)
+from metrics import (stale_served, stale_revalidations, stale_if_error_served,
+                     negative_cache_hits, negative_cache_stores, cache_revalidations,
+                     cache_tier_lookups, search_result_cache_lookups, search_result_cache_invalidations,
+                     redis_early_refreshes, redis_stampede_reads_avoided)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -26,6 +39,18 @@ logger = logging.getLogger(__name__)
 thread_pool = ThreadPoolExecutor(max_workers=4)
 
 
+def _is_upstream_failure(error: BaseException) -> bool:
+    """Whether an API error says ResourceSpace is unhealthy (as opposed to a bad request)"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code >= 500
+    return isinstance(error, httpx.TransportError)
+
+
+def _is_hydrated(resource_data: Dict[str, Any]) -> bool:
+    """Whether a resource dict is in the cache's shape (as opposed to raw API data)"""
+    return 'resource_id' in resource_data and 'previews' in resource_data
+
+
 class ResourceSpaceWrapper:
     """High-level wrapper for ResourceSpace with caching"""
     
@@ -35,7 +60,26 @@ class ResourceSpaceWrapper:
                  cache_dir: str = "cache",
                  cache_ttl_days: int = 7,
                  rs_user: str = "admin",
-                 redis_cache=None):
+                 redis_cache=None,
+                 db_options: Optional[Dict[str, Any]] = None,
+                 access_tracker: Optional[AccessTracker] = None,
+                 store_batch_size: int = 500,
+                 ingest_concurrency: int = 4,
+                 file_ingest_options: Optional[Dict[str, Any]] = None,
+                 file_chunk_size: int = 4 * 1024 * 1024,
+                 partial_idle_hours: float = 24,
+                 singleflight_redis_locks: bool = False,
+                 singleflight_lock_timeout: int = 30,
+                 stale_while_revalidate_seconds: int = 0,
+                 stale_if_error_seconds: int = 0,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 negative_ttls: Optional[Dict[str, int]] = None,
+                 negative_max_entries: int = 10000,
+                 adaptive_ttl_options: Optional[Dict[str, Any]] = None,
+                 l1_cache: Optional[L1Cache] = None,
+                 search_cache_ttl_seconds: int = 0,
+                 early_refresh_beta: float = 0.0,
+                 search_local_complete: bool = False):
         """
         Initialize the wrapper
         
@@ -46,18 +90,69 @@ class ResourceSpaceWrapper:
             cache_ttl_days: Default cache TTL in days
             rs_user: ResourceSpace username
             redis_cache: Optional Redis cache instance
+            db_options: Optional SQLite connection tuning passed to the cache
+            access_tracker: Optional write-behind access log shared with the cache
+            store_batch_size: Resources written per transaction during bulk ingestion
+            ingest_concurrency: Maximum concurrent API fetches during bulk ingestion
+            file_ingest_options: Optional original-file download tuning passed to the cache
+            file_chunk_size: Byte range size for partially cached originals
+            partial_idle_hours: Drop partial originals not extended for this long
+            singleflight_redis_locks: Also coalesce misses across replicas with Redis locks
+            singleflight_lock_timeout: Longest a replica waits on another replica's fetch
+            stale_while_revalidate_seconds: Grace window in which expired metadata is still
+                served while it is refreshed in the background (0 disables)
+            stale_if_error_seconds: How long past expiry metadata and files may still be
+                served when ResourceSpace can't be reached (0 disables)
+            circuit_breaker: Optional breaker guarding ResourceSpace calls and file downloads
+            negative_ttls: Seconds to remember each kind of refusal ('not_found',
+                'forbidden', 'error')
+            negative_max_entries: Most refused resource IDs kept in SQLite
+            adaptive_ttl_options: Optional per-resource TTL learning passed to the cache
+                (adaptive_ttl, min_ttl_seconds, max_ttl_seconds, ttl_change_factor)
+            l1_cache: Optional in-process cache consulted before Redis for metadata
+            search_cache_ttl_seconds: How long a search's result IDs are reused (0 disables)
+            early_refresh_beta: XFetch eagerness for renewing hot Redis copies before they
+                expire (1.0 is the usual choice, 0 disables)
+            search_local_complete: The cache holds the whole collection (kept current by
+                the change feed), so the local index answers searches even with fewer
+                hits than the limit; otherwise only a full page is answered locally
         """
         self.api_url = api_url
         self.api_key = api_key
         self.rs_user = rs_user
         self.redis_cache = redis_cache
+        self.l1_cache = l1_cache
+        self.search_cache_ttl = search_cache_ttl_seconds
+        self.early_refresh_beta = early_refresh_beta
+        self.search_local_complete = search_local_complete
+        self.ingest_concurrency = ingest_concurrency
+        self.negative_ttls = {NOT_FOUND: 300, FORBIDDEN: 60, ERROR: 15, **(negative_ttls or {})}
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
         self.cache = ResourceSpaceCache(
             cache_dir=cache_dir,
             default_ttl_days=cache_ttl_days,
             rs_api_url=api_url,
-            rs_api_key=api_key
+            rs_api_key=api_key,
+            db_options=db_options,
+            access_tracker=access_tracker,
+            store_batch_size=store_batch_size,
+            file_ingest_options=file_ingest_options,
+            file_chunk_size=file_chunk_size,
+            partial_idle_hours=partial_idle_hours,
+            stale_grace_seconds=stale_while_revalidate_seconds,
+            stale_if_error_seconds=stale_if_error_seconds,
+            negative_max_entries=negative_max_entries,
+            circuit_breaker=self.circuit_breaker,
+            **(adaptive_ttl_options or {})
+        )
+        self.singleflight = SingleFlight(
+            redis_cache=redis_cache if singleflight_redis_locks else None,
+            lock_timeout=singleflight_lock_timeout
         )
         self.client = httpx.AsyncClient(timeout=30.0)
+        self._access_flush_task: Optional[asyncio.Task] = None
+        self._revalidating: Dict[int, asyncio.Task] = {}
+        self._refreshing_early: Dict[int, asyncio.Task] = {}
         
     async def _make_api_call(self, function: str, params: Dict[str, Any] = None) -> Any:
         """Make an async ResourceSpace API call with proper authentication"""
@@ -90,11 +185,15 @@ class ResourceSpaceWrapper:
         logger.info(f"URL: {self.api_url}")
         logger.info(f"Query params: {ordered_params}")
         
-        try:
-            # Use GET request with signed URL
+        async def request() -> httpx.Response:
             response = await self.client.get(url)
             logger.info(f"Response status: {response.status_code}")
             response.raise_for_status()
+            return response
+            
+        try:
+            # Use GET request with signed URL, failing fast while ResourceSpace is down
+            response = await self.circuit_breaker.call(request, is_failure=_is_upstream_failure)
             
             # Try to parse as JSON, otherwise return text
             try:
@@ -106,24 +205,28 @@ class ResourceSpaceWrapper:
                 logger.info(f"Response (Text): {text_data[:500]}...")
                 return text_data
                 
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.error(f"API call failed: {e}")
             logger.error(f"Full error: {type(e).__name__}: {str(e)}")
             raise
             
-    def get_resource(self, resource_id: int, fetch_file: bool = False) -> Optional[Dict[str, Any]]:
+    def get_resource(self, resource_id: int, fetch_file: bool = False,
+                     allow_stale: bool = False) -> Optional[Dict[str, Any]]:
         """
         Get resource with caching (sync wrapper for compatibility)
         
         Args:
             resource_id: Resource ID
             fetch_file: Whether to also fetch and cache the original file
+            allow_stale: Also return a recently expired entry (marked '_stale')
             
         Returns:
             Resource data with metadata, previews, and optional file path
         """
         # First check cache
-        cached = self.cache.get_cached_resource(resource_id)
+        cached = self.cache.get_cached_resource(resource_id, allow_stale=allow_stale)
         if cached:
             logger.info(f"Resource {resource_id} loaded from cache")
             
@@ -144,50 +247,495 @@ class ResourceSpaceWrapper:
     async def get_resource_async(self, resource_id: int, fetch_file: bool = False) -> Optional[Dict[str, Any]]:
         """
         Get resource with caching (async version)
+        
+        Metadata is looked up in the in-process L1 cache, then Redis (L2), then SQLite (L3).
         """
-        # First check Redis if enabled
+        # In-process copy first: no I/O at all
+        if self.l1_cache is not None and not fetch_file:
+            l1_data = self.l1_cache.get(resource_id)
+            cache_tier_lookups.labels(tier='l1', result='hit' if l1_data else 'miss').inc()
+            if l1_data:
+                self.cache.access_tracker.record([resource_id])
+                self._maybe_flush_access_log()
+                l1_data.update({'_from_cache': True, '_from_l1': True})
+                return l1_data
+                
+        # Then check Redis if enabled
         if self.redis_cache and self.redis_cache.enabled:
-            redis_data = await self.redis_cache.get_resource(resource_id)
+            redis_data = await self._get_redis(resource_id)
+            cache_tier_lookups.labels(tier='l2', result='hit' if redis_data else 'miss').inc()
             if redis_data:
                 logger.info(f"Redis hit for resource {resource_id}")
-                # For lightweight metadata, return immediately
-                if not fetch_file:
+                # Metadata is served as is; a full record also serves file requests
+                if not fetch_file or redis_data.get('_full_record'):
+                    self.cache.access_tracker.record([resource_id])
+                    self._maybe_flush_access_log()
+                    if self.l1_cache is not None:
+                        self.l1_cache.put(resource_id, redis_data)
                     redis_data['_from_cache'] = True
                     redis_data['_from_redis'] = True
+                    if redis_data.get('_full_record'):
+                        # The cached file lives on this replica's disk, not in Redis
+                        redis_data['cached_file'] = None
+                        if fetch_file:
+                            redis_data['cached_file'] = await self._fetch_file_or_stale(
+                                resource_id, redis_data.get('file_extension')
+                            )
                     return redis_data
                     
-        # Then try sync SQLite cache check
+        # Then try sync SQLite cache check (files are fetched below so concurrent misses coalesce)
         loop = asyncio.get_event_loop()
-        cached = await loop.run_in_executor(thread_pool, self.get_resource, resource_id, fetch_file)
+        started = time.monotonic()
+        cached = await loop.run_in_executor(thread_pool, self.get_resource, resource_id, False, True)
+        compute_seconds = time.monotonic() - started
+        cache_tier_lookups.labels(tier='l3', result='hit' if cached else 'miss').inc()
         
         if cached:
-            # Update Redis if we got from SQLite
-            if self.redis_cache and self.redis_cache.enabled:
-                await self.redis_cache.set_resource(resource_id, cached)
+            if self.l1_cache is not None and not cached.get('_stale'):
+                self.l1_cache.put(resource_id, cached)
+            self._maybe_flush_access_log()
+            if fetch_file and not cached.get('cached_file'):
+                cached_file = await self._fetch_file_or_stale(resource_id, cached.get('file_extension'))
+                if cached_file:
+                    cached['cached_file'] = cached_file
+            if cached.get('_stale'):
+                # Serve the expired copy now; the refresh rewrites SQLite and Redis
+                self._revalidate_in_background([resource_id])
+            elif self.redis_cache and self.redis_cache.enabled:
+                # Update Redis if we got from SQLite
+                await self._set_redis(resource_id, cached, compute_seconds)
             return cached
             
-        # Fetch from API
-        logger.info(f"Fetching resource {resource_id} from API")
+        try:
+            # IDs ResourceSpace refused a moment ago are answered locally
+            negative = await self._get_negative(resource_id)
+            if negative:
+                raise ResourceUnavailable(resource_id, negative['reason'], negative.get('detail') or '', cached=True)
+                
+            # Fetch from API and store, once for all concurrent callers
+            resource_data = await self.singleflight.do(
+                'metadata', resource_id,
+                lambda: self._fetch_and_store_resource(resource_id),
+                wait_for=lambda: self._wait_for_shared_resource(resource_id)
+            )
+        except ResourceUnavailable as e:
+            if e.reason == NOT_FOUND:
+                return None
+            if e.reason != ERROR:
+                raise
+            resource_data = await self._stale_if_error(resource_id, e)
+        except (CircuitOpenError, httpx.HTTPError) as e:
+            resource_data = await self._stale_if_error(resource_id, e)
+            
+        if resource_data is None:
+            return None
+        resource_data = dict(resource_data)
+            
+        # Fetch file if requested
+        if fetch_file:
+            logger.info(f"Attempting to fetch file for resource {resource_id}")
+            cached_file = await self._fetch_file_or_stale(resource_id, resource_data.get('file_extension'))
+            if cached_file:
+                resource_data['cached_file'] = cached_file
+                logger.info(f"Successfully cached file at: {cached_file['file_path']}")
+            else:
+                logger.warning(f"Failed to cache file for resource {resource_id}")
+                
+        return resource_data
         
-        # Get resource metadata
-        resource_data = await self._make_api_call('get_resource_data', {'param1': resource_id})
+    async def _get_redis(self, resource_id: int) -> Optional[Dict[str, Any]]:
+        """Redis copy of a resource, unless a generation bump has hidden it"""
+        redis_data = await self.redis_cache.get_resource(resource_id)
+        if not redis_data:
+            return None
+        loop = asyncio.get_event_loop()
+        floors = await loop.run_in_executor(thread_pool, self.cache.generation_floors)
+        if not is_visible_generation(floors, redis_data.get('generation'), redis_data.get('resource_type')):
+            return None
+        self._refresh_early_if_due({resource_id: redis_data})
+        return redis_data
         
-        # Check for API errors
-        if isinstance(resource_data, dict) and resource_data.get('success') == False:
-            error_msg = resource_data.get('error', 'Unknown error')
-            logger.error(f"RS API returned error for resource {resource_id}: {error_msg}")
+    async def _set_redis(self, resource_id: int, resource_data: Dict[str, Any], compute_seconds: float = 0.0,
+                         changed: bool = False):
+        """Write the Redis copy, stamped with the generation it was cached under"""
+        await self._set_redis_many({resource_id: resource_data}, compute_seconds,
+                                   changed=[resource_id] if changed else None)
+        
+    async def _set_redis_many(self, resources: Dict[int, Dict[str, Any]], compute_seconds: float = 0.0,
+                              renewed_from: Optional[Dict[int, float]] = None,
+                              changed: Optional[List[int]] = None):
+        """
+        Write several Redis copies in one pipelined call, each stamped with its generation
+        
+        Each copy expires when its SQLite entry does (adaptive TTLs included), capped
+        at the Redis TTL; entries already expired in SQLite (served stale) are not copied.
+        
+        Args:
+            resources: Dict of resource_id -> resource data
+            compute_seconds: Average time it took to produce each one (drives early refresh)
+            renewed_from: For early refreshes, the expiry of each copy being replaced
+            changed: IDs whose data is new; only these are announced to other replicas
+        """
+        loop = asyncio.get_event_loop()
+        expiries = await loop.run_in_executor(thread_pool, self.cache.get_seconds_to_expiry, list(resources))
+        ttls = {rid: min(seconds, self.redis_cache.ttl) for rid, seconds in expiries.items()}
+        resources = {rid: data for rid, data in resources.items() if ttls.get(rid, 1) > 0}
+        if not resources and not changed:
+            return
+            
+        if self.redis_cache.full_records:
+            # Full records hold the shape SQLite serves, never raw API data
+            raw_ids = [rid for rid, data in resources.items() if not _is_hydrated(data)]
+            if raw_ids:
+                hydrated = await loop.run_in_executor(
+                    thread_pool, lambda: self.cache.get_cached_resources(raw_ids, track_access=False)
+                )
+                resources = {rid: hydrated.get(rid) if rid in raw_ids else data
+                             for rid, data in resources.items()}
+                resources = {rid: data for rid, data in resources.items() if data is not None}
+                
+        if any(data.get('generation') is None for data in resources.values()):
+            generation = await loop.run_in_executor(thread_pool, self.cache.current_generation)
+            resources = {rid: data if data.get('generation') is not None else {**data, 'generation': generation}
+                         for rid, data in resources.items()}
+        await self.redis_cache.set_resources(resources, ttls=ttls, compute_seconds=compute_seconds,
+                                             renewed_from=renewed_from, changed=changed)
+        
+    def _refresh_early_if_due(self, records: Dict[int, Dict[str, Any]]):
+        """
+        Renew Redis copies in the background when XFetch says so
+        
+        Each reader of a copy nearing expiry renews it with a small probability that
+        grows as expiry approaches, so a hot key is usually renewed once, shortly before
+        it would expire, rather than missed by every concurrent reader at once.
+        """
+        if not self.early_refresh_beta:
+            return
+        now = time.time()
+        due: Dict[int, float] = {}
+        for resource_id, record in records.items():
+            if not record.get('_xfetch'):
+                continue
+            delta, expiry, renewed_from = record['_xfetch']
+            if renewed_from is not None and now >= renewed_from:
+                # Without the early renewal this read would have missed
+                redis_stampede_reads_avoided.inc()
+            if xfetch_due(delta, expiry, self.early_refresh_beta, now):
+                due[resource_id] = expiry
+        if not due:
+            return
+            
+        pending = {rid: expiry for rid, expiry in due.items() if rid not in self._refreshing_early}
+        redis_early_refreshes.labels(outcome='deduplicated').inc(len(due) - len(pending))
+        if not pending:
+            return
+        task = asyncio.ensure_future(self._refresh_early(pending))
+        for resource_id in pending:
+            self._refreshing_early[resource_id] = task
+            
+    async def _refresh_early(self, expiries: Dict[int, float]):
+        """Rewrite Redis copies from SQLite, or from upstream where SQLite has expired too"""
+        resource_ids = list(expiries)
+        try:
+            loop = asyncio.get_event_loop()
+            started = time.monotonic()
+            cached = await loop.run_in_executor(
+                thread_pool, lambda: self.cache.get_cached_resources(resource_ids, track_access=False)
+            )
+            if cached:
+                await self._set_redis_many(cached, (time.monotonic() - started) / len(cached),
+                                           renewed_from={rid: expiries[rid] for rid in cached})
+            refreshed = len(cached)
+            
+            expired = [rid for rid in resource_ids if rid not in cached]
+            if expired and not self.circuit_breaker.is_open:
+                refreshed += len(await self._ingest_resources(expired))
+            redis_early_refreshes.labels(outcome='refreshed').inc(refreshed)
+            redis_early_refreshes.labels(outcome='failed').inc(len(resource_ids) - refreshed)
+        except Exception as e:
+            redis_early_refreshes.labels(outcome='failed').inc(len(resource_ids))
+            logger.error(f"Early refresh of Redis copies {resource_ids} failed: {e}")
+        finally:
+            for resource_id in resource_ids:
+                self._refreshing_early.pop(resource_id, None)
+        
+    def _invalidate_l1(self, resource_ids: List[int]):
+        """Drop this replica's L1 copies; Redis writes of changed data and deletes announce it to the others"""
+        if self.l1_cache is not None:
+            self.l1_cache.invalidate(resource_ids)
+            
+    def apply_remote_invalidation(self, resource_ids: Optional[List[int]]):
+        """Handler for invalidations announced by other replicas (None: everything)"""
+        if self.l1_cache is None:
+            return
+        if resource_ids is None:
+            self.l1_cache.clear()
+        else:
+            self.l1_cache.invalidate(resource_ids)
+            
+    async def _stale_if_error(self, resource_id: int, error: Exception) -> Dict[str, Any]:
+        """ResourceSpace is down or failing: an expired copy beats an error (re-raises without one)"""
+        loop = asyncio.get_event_loop()
+        resource_data = await loop.run_in_executor(
+            thread_pool, lambda: self.cache.get_cached_resource(resource_id, stale_if_error=True)
+        )
+        if resource_data is None:
+            raise error
+        logger.warning(f"Serving stale resource {resource_id}: {error}")
+        stale_if_error_served.labels(kind='metadata').inc()
+        resource_data.update({'_from_cache': True, '_stale': True, '_stale_if_error': True})
+        return resource_data
+        
+    async def _get_negative(self, resource_id: int) -> Optional[Dict[str, Any]]:
+        """Cached refusal for a resource ID (Redis first, then SQLite), or None"""
+        if self.redis_cache and self.redis_cache.enabled:
+            negative = await self.redis_cache.get_negative(resource_id)
+            if negative:
+                negative_cache_hits.labels(reason=negative['reason'], tier='redis').inc()
+                return negative
+                
+        loop = asyncio.get_event_loop()
+        negative = (await loop.run_in_executor(
+            thread_pool, self.cache.get_negative_results, [resource_id]
+        )).get(resource_id)
+        if negative:
+            negative_cache_hits.labels(reason=negative['reason'], tier='sqlite').inc()
+        return negative
+        
+    async def _remember_unavailable(self, errors: List[ResourceUnavailable]):
+        """Cache refusals from ResourceSpace in SQLite and Redis, each with its reason's TTL"""
+        results = [(e.resource_id, e.reason, e.detail, self.negative_ttls[e.reason])
+                   for e in errors if not e.cached]
+        if not results:
+            return
+        self._invalidate_l1([result[0] for result in results])
+        await self.invalidate_search_results([result[0] for result in results if result[1] != ERROR])
+            
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(thread_pool, self.cache.store_negative_results, results)
+        except Exception as e:
+            logger.error(f"Failed to store {len(results)} negative results: {e}")
+            
+        for resource_id, reason, detail, ttl in results:
+            negative_cache_stores.labels(reason=reason).inc()
+            if self.redis_cache and self.redis_cache.enabled:
+                await self.redis_cache.set_negative(resource_id, reason, detail, ttl)
+                
+    async def _fetch_and_store_resource(self, resource_id: int) -> Optional[Dict[str, Any]]:
+        """Miss path for one resource: fetch (or revalidate) from the API, then write SQLite and Redis"""
+        loop = asyncio.get_event_loop()
+        started = time.monotonic()
+        validators = await loop.run_in_executor(thread_pool, self.cache.get_validators, [resource_id])
+        try:
+            resource_data = await self._revalidate_or_fetch(resource_id, validators.get(resource_id))
+        except ResourceUnavailable as e:
+            await self._remember_unavailable([e])
+            raise
+        if resource_data is None:
             return None
             
-        if not resource_data or isinstance(resource_data, str):
-            logger.error(f"Failed to get resource data for {resource_id}: Invalid response type")
+        if resource_data.get('_from_cache'):
+            # Unchanged upstream: only the expiry moved
+            if self.redis_cache and self.redis_cache.enabled:
+                await self._set_redis(resource_id, resource_data, time.monotonic() - started)
+            return resource_data
+            
+        # Store in cache (sync operation in thread pool)
+        try:
+            await loop.run_in_executor(thread_pool, self.cache.store_resource, resource_data)
+            logger.info(f"Stored resource {resource_id} in cache")
+        except Exception as e:
+            logger.error(f"Failed to store resource {resource_id} in cache: {e}")
+        self._invalidate_l1([resource_id])
+        await self.invalidate_search_results([resource_id])
+        
+        if self.redis_cache and self.redis_cache.enabled and self.redis_cache.full_records:
+            # Answer in the same shape as every cache tier, and reuse it for the Redis copy
+            hydrated = await loop.run_in_executor(
+                thread_pool, lambda: self.cache.get_cached_resource(resource_id, track_access=False)
+            )
+            if hydrated:
+                resource_data = hydrated
+            
+        # Mark as not from cache (freshly fetched)
+        resource_data['_from_cache'] = False
+        
+        # Update Redis if enabled
+        if self.redis_cache and self.redis_cache.enabled:
+            await self._set_redis(resource_id, resource_data, time.monotonic() - started, changed=True)
+            
+        return resource_data
+        
+    def _revalidate_in_background(self, resource_ids: List[int]):
+        """Refresh expired entries that were just served stale, at most once per resource at a time"""
+        stale_served.inc(len(resource_ids))
+        if self.circuit_breaker.is_open:
+            # Upstream is known to be down; the next request after the cool-down retries
+            stale_revalidations.labels(outcome='skipped').inc(len(resource_ids))
+            return
+            
+        pending = [rid for rid in dict.fromkeys(resource_ids) if rid not in self._revalidating]
+        stale_revalidations.labels(outcome='deduplicated').inc(len(resource_ids) - len(pending))
+        if not pending:
+            return
+            
+        task = asyncio.ensure_future(self._revalidate(pending))
+        for resource_id in pending:
+            self._revalidating[resource_id] = task
+            
+    async def _revalidate(self, resource_ids: List[int]):
+        try:
+            # Shares the singleflight with foreground misses for the same resources
+            refreshed = await self._ingest_resources(resource_ids)
+            stale_revalidations.labels(outcome='refreshed').inc(len(refreshed))
+            stale_revalidations.labels(outcome='failed').inc(len(resource_ids) - len(refreshed))
+            if len(refreshed) < len(resource_ids):
+                logger.warning(f"Background refresh failed for {len(resource_ids) - len(refreshed)} "
+                               f"of {len(resource_ids)} stale resources")
+        except Exception as e:
+            stale_revalidations.labels(outcome='failed').inc(len(resource_ids))
+            logger.error(f"Background refresh of stale resources {resource_ids} failed: {e}")
+        finally:
+            for resource_id in resource_ids:
+                self._revalidating.pop(resource_id, None)
+                
+    async def _wait_for_shared_resource(self, resource_id: int) -> Optional[Dict[str, Any]]:
+        """Look for a resource another replica has just fetched (shared SQLite volume, then Redis)"""
+        loop = asyncio.get_event_loop()
+        cached = await loop.run_in_executor(thread_pool, self.cache.get_cached_resource, resource_id)
+        if cached:
+            cached['_from_cache'] = True
+            return cached
+        if self.redis_cache and self.redis_cache.enabled:
+            redis_data = await self._get_redis(resource_id)
+            if redis_data:
+                redis_data['_from_cache'] = True
+                redis_data['_from_redis'] = True
+                return redis_data
+        return None
+        
+    async def fetch_file_async(self, resource_id: int, file_extension: Optional[str] = None) -> Optional[str]:
+        """Fetch and cache a resource's original file, once for all concurrent callers"""
+        loop = asyncio.get_event_loop()
+        
+        if self.circuit_breaker.is_open:
+            # Don't start a download that can't reach ResourceSpace
+            return await loop.run_in_executor(thread_pool, self.cache.get_cached_file_path, resource_id)
+            
+        async def fetch() -> Optional[str]:
+            return await loop.run_in_executor(
+                thread_pool,
+                self.cache.fetch_and_cache_file,
+                resource_id,
+                None,
+                file_extension
+            )
+            
+        async def wait_for() -> Optional[str]:
+            return await loop.run_in_executor(thread_pool, self.cache.get_cached_file_path, resource_id)
+            
+        return await self.singleflight.do('file', resource_id, fetch, wait_for=wait_for)
+        
+    async def _fetch_file_or_stale(self, resource_id: int,
+                                   file_extension: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a resource's original, falling back to an expired copy if that fails
+        
+        Returns:
+            Dict with 'file_path' (and 'stale': True for an expired copy) or None
+        """
+        file_path = await self.fetch_file_async(resource_id, file_extension)
+        if file_path:
+            return {'file_path': file_path}
+            
+        loop = asyncio.get_event_loop()
+        file_path = await loop.run_in_executor(
+            thread_pool, lambda: self.cache.get_cached_file_path(resource_id, stale_if_error=True)
+        )
+        if not file_path:
             return None
+        logger.warning(f"Serving stale file for resource {resource_id}")
+        stale_if_error_served.labels(kind='file').inc()
+        return {'file_path': file_path, 'stale': True}
+        
+    async def _revalidate_or_fetch(self, resource_id: int, validator: Optional[str]) -> Dict[str, Any]:
+        """
+        Fetch a resource, or only confirm the cached copy if RS says it hasn't changed
+        
+        get_resource_data alone carries the modified stamp and file checksum; when they
+        still match validator, the cached entry and its file get a new expiry instead of
+        fetching fields, previews and the original again.
+        
+        Returns:
+            The revalidated cached resource ('_from_cache' set) or raw RS data not yet stored
+            
+        Raises:
+            ResourceUnavailable: RS refused the resource (not found, forbidden or erroring)
+        """
+        resource_data = await self._fetch_resource_data(resource_id)
+        
+        if validator:
+            if resource_validator(resource_data) == validator:
+                loop = asyncio.get_event_loop()
+                cached = await loop.run_in_executor(thread_pool, self._extend_and_load, resource_id)
+                if cached:
+                    logger.info(f"Resource {resource_id} unchanged upstream, expiry extended")
+                    cache_revalidations.labels(kind='metadata', outcome='revalidated').inc()
+                    cached['_from_cache'] = True
+                    return cached
+            cache_revalidations.labels(kind='metadata', outcome='refetched').inc()
+            
+        return await self._fetch_resource_details(resource_id, resource_data)
+        
+    def _extend_and_load(self, resource_id: int) -> Optional[Dict[str, Any]]:
+        self.cache.extend_expiry([resource_id])
+        return self.cache.get_cached_resource(resource_id, track_access=False)
+        
+    async def _fetch_resource_from_api(self, resource_id: int) -> Dict[str, Any]:
+        """
+        Fetch a resource's data, fields and preview sizes from the API without caching it
+        
+        Returns:
+            Raw resource data as returned by RS (with fieldN keys and sizes)
+            
+        Raises:
+            ResourceUnavailable: RS refused the resource (not found, forbidden or erroring)
+        """
+        resource_data = await self._fetch_resource_data(resource_id)
+        return await self._fetch_resource_details(resource_id, resource_data)
+        
+    async def _fetch_resource_data(self, resource_id: int) -> Dict[str, Any]:
+        """Fetch just the resource row (get_resource_data), raising ResourceUnavailable on a refusal"""
+        logger.info(f"Fetching resource {resource_id} from API")
+        
+        # Get resource metadata
+        try:
+            resource_data = await self._make_api_call('get_resource_data', {'param1': resource_id})
+        except httpx.HTTPStatusError as e:
+            raise ResourceUnavailable(
+                resource_id, classify_http_error(e), f"HTTP {e.response.status_code}"
+            ) from e
+            
+        # Check for API errors
+        reason = classify_api_result(resource_data)
+        if reason:
+            if isinstance(resource_data, dict):
+                detail = str(resource_data.get('error', 'Unknown error'))
+            else:
+                detail = f"Invalid response: {str(resource_data)[:200]}"
+            logger.error(f"RS API refused resource {resource_id} ({reason}): {detail}")
+            raise ResourceUnavailable(resource_id, reason, detail)
             
         # If resource_data is a list with one item, extract it
         if isinstance(resource_data, list) and len(resource_data) == 1:
             resource_data = resource_data[0]
             
         logger.info(f"Successfully fetched resource {resource_id} from RS API")
-            
+        return resource_data
+        
+    async def _fetch_resource_details(self, resource_id: int, resource_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Add field values and preview sizes to a resource row"""
         # Get resource field data
         field_data = await self._make_api_call('get_resource_field_data', {'param1': resource_id})
         
@@ -214,37 +762,75 @@ class ResourceSpaceWrapper:
         if isinstance(sizes, dict):
             resource_data['sizes'] = sizes
             
-        # Store in cache (sync operation in thread pool)
-        try:
-            await loop.run_in_executor(thread_pool, self.cache.store_resource, resource_data)
-            logger.info(f"Stored resource {resource_id} in cache")
-        except Exception as e:
-            logger.error(f"Failed to store resource {resource_id} in cache: {e}")
-            
-        # Fetch file if requested
-        if fetch_file:
-            logger.info(f"Attempting to fetch file for resource {resource_id}")
-            file_path = await loop.run_in_executor(
-                thread_pool,
-                self.cache.fetch_and_cache_file,
-                resource_id,
-                None,
-                resource_data.get('file_extension')
-            )
-            if file_path:
-                resource_data['cached_file'] = {'file_path': file_path}
-                logger.info(f"Successfully cached file at: {file_path}")
-            else:
-                logger.warning(f"Failed to cache file for resource {resource_id}")
+        return resource_data
+        
+    async def _ingest_resources(self, resource_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Fetch resources from the API concurrently and store them with one bulk write
+        
+        Expired entries that are unchanged upstream are revalidated instead of refetched.
+        
+        Returns:
+            Dict of resource_id -> freshly fetched (or revalidated) resource data
+        """
+        semaphore = asyncio.Semaphore(self.ingest_concurrency)
+        loop = asyncio.get_event_loop()
+        started = time.monotonic()
+        refused: List[ResourceUnavailable] = []
+        
+        # Skip IDs ResourceSpace refused recently
+        negative = await loop.run_in_executor(thread_pool, self.cache.get_negative_results, resource_ids)
+        for result in negative.values():
+            negative_cache_hits.labels(reason=result['reason'], tier='sqlite').inc()
+        resource_ids = [rid for rid in resource_ids if rid not in negative]
+        validators = await loop.run_in_executor(thread_pool, self.cache.get_validators, resource_ids)
+        
+        async def fetch_one(resource_id: int) -> Optional[Dict[str, Any]]:
+            async with semaphore:
+                return await self._revalidate_or_fetch(resource_id, validators.get(resource_id))
                 
-        # Mark as not from cache (freshly fetched)
-        resource_data['_from_cache'] = False
+        async def fetch(resource_id: int) -> Optional[Dict[str, Any]]:
+            try:
+                # Shares an in-flight fetch by a concurrent batch rather than repeating it.
+                # Not the 'metadata' key: single-resource leaders return hydrated records,
+                # while this path needs raw API data (or a revalidated cache record).
+                return await self.singleflight.do('metadata-batch', resource_id, lambda: fetch_one(resource_id))
+            except CircuitOpenError:
+                return None
+            except ResourceUnavailable as e:
+                refused.append(e)
+                return None
+            except Exception as e:
+                logger.error(f"Failed to fetch resource {resource_id}: {e}")
+                return None
+                    
+        fetched = await asyncio.gather(*(fetch(rid) for rid in resource_ids))
+        revalidated = {rid: data for rid, data in zip(resource_ids, fetched)
+                       if isinstance(data, dict) and data.get('_from_cache')}
+        resources = {rid: data for rid, data in zip(resource_ids, fetched)
+                     if isinstance(data, dict) and data.get('ref') and rid not in revalidated}
+        await self._remember_unavailable(refused)
         
-        # Update Redis if enabled
-        if self.redis_cache and self.redis_cache.enabled:
-            await self.redis_cache.set_resource(resource_id, resource_data)
+        if resources:
+            try:
+                await loop.run_in_executor(thread_pool, self.cache.store_resources, list(resources.values()))
+            except Exception as e:
+                logger.error(f"Failed to store {len(resources)} resources in cache: {e}")
+            self._invalidate_l1(list(resources))
+            await self.invalidate_search_results(list(resources))
+                
+        for resource_id, resource_data in resources.items():
+            resource_data['_from_cache'] = False
             
-        return resource_data
+        changed = list(resources)
+        resources.update(revalidated)
+        if resources and self.redis_cache and self.redis_cache.enabled:
+            # Fetches ran ingest_concurrency at a time, so each took about this long
+            concurrency = min(self.ingest_concurrency, len(resources))
+            compute_seconds = (time.monotonic() - started) * concurrency / len(resources)
+            await self._set_redis_many(resources, compute_seconds, changed=changed)
+                
+        return resources
         
     def search_resources(self, search: str, 
                         resource_types: Optional[List[int]] = None,
@@ -252,10 +838,10 @@ class ResourceSpaceWrapper:
         """
         Search resources with caching (sync for compatibility)
         """
-        # First check cached resources
-        keywords = search.lower().split() if search else []
+        # First check the local full-text index
         cached_results = self.cache.search_cached_resources(
-            keywords=keywords,
+            query=search,
+            resource_types=resource_types,
             limit=limit
         )
         
@@ -268,34 +854,55 @@ class ResourceSpaceWrapper:
         
     async def search_resources_async(self, search: str,
                                    resource_types: Optional[List[int]] = None,
-                                   limit: int = 100) -> List[Dict[str, Any]]:
+                                   limit: int = 100,
+                                   sort: str = 'relevance') -> List[Dict[str, Any]]:
         """
         Search resources with caching (async version)
+        
+        A repeated search (same normalized query, types, sort and limit) reuses the
+        cached result IDs and only hydrates them.
         """
+        query_key = search_cache_key(search, resource_types, sort, limit)
+        if self.search_cache_ttl:
+            resource_ids = await self._get_search_result(query_key)
+            search_result_cache_lookups.labels(result='hit' if resource_ids is not None else 'miss').inc()
+            if resource_ids is not None:
+                return await self._hydrate_results(resource_ids)
+                
+        resource_ids = await self._run_search(search, resource_types, limit, sort)
+        if resource_ids is None:
+            return []
+            
+        results = await self._hydrate_results(resource_ids)
+        # Stored after hydration: storing the listed resources drops searches that list them
+        if self.search_cache_ttl:
+            await self._store_search_result(query_key, search, resource_ids)
+        return results
+        
+    async def _run_search(self, search: str, resource_types: Optional[List[int]],
+                          limit: int, sort: str) -> Optional[List[int]]:
+        """Ordered result IDs from the local index (relevance sort only) or do_search, None on failure"""
         # First try sync cache search
         loop = asyncio.get_event_loop()
-        cached_results = await loop.run_in_executor(
-            thread_pool,
-            self.search_resources,
-            search,
-            resource_types,
-            limit
-        )
-        
-        if cached_results:
-            # Enrich with full data
-            results = []
-            for res in cached_results:
-                full_res = await self.get_resource_async(res.get('resource_id', res.get('ref')))
-                if full_res:
-                    results.append(full_res)
-            return results
+        if sort == 'relevance':
+            cached_results = await loop.run_in_executor(
+                thread_pool,
+                self.search_resources,
+                search,
+                resource_types,
+                limit
+            )
+            
+            # Fewer local hits than the limit may just mean matches upstream that aren't
+            # cached, so a partial page is only trusted when the cache mirrors everything
+            if cached_results and (len(cached_results) >= limit or self.search_local_complete):
+                return [int(res.get('resource_id', res.get('ref'))) for res in cached_results]
             
         # Search via API
         params = {
             'param1': search,
             'param2': '',  # resource types string
-            'param3': 'relevance',
+            'param3': sort,
             'param4': 0,  # archive
             'param5': limit
         }
@@ -306,18 +913,157 @@ class ResourceSpaceWrapper:
         search_results = await self._make_api_call('do_search', params)
         
         if not isinstance(search_results, list):
-            return []
+            return None
             
-        # Cache the results
-        results = []
-        for res in search_results[:limit]:
-            if isinstance(res, dict) and 'ref' in res:
-                # Get full resource data
-                full_res = await self.get_resource_async(res['ref'])
-                if full_res:
-                    results.append(full_res)
-                    
-        return results
+        return [int(res['ref']) for res in search_results[:limit] if isinstance(res, dict) and 'ref' in res]
+        
+    async def _get_search_result(self, query_key: str) -> Optional[List[int]]:
+        """Cached result IDs for a search (Redis first, then SQLite), or None"""
+        if self.redis_cache and self.redis_cache.enabled:
+            resource_ids = await self.redis_cache.get_search_result(query_key)
+            if resource_ids is not None:
+                return resource_ids
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(thread_pool, self.cache.get_search_result, query_key)
+        
+    async def _store_search_result(self, query_key: str, search: str, resource_ids: List[int]):
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(
+                thread_pool, self.cache.store_search_result,
+                query_key, search, resource_ids, self.search_cache_ttl
+            )
+        except Exception as e:
+            logger.error(f"Failed to cache results of search '{search}': {e}")
+        if self.redis_cache and self.redis_cache.enabled:
+            await self.redis_cache.set_search_result(query_key, resource_ids, self.search_cache_ttl)
+            
+    async def invalidate_search_results(self, resource_ids: Optional[List[int]] = None) -> int:
+        """
+        Drop cached searches listing any of these resources, in SQLite and Redis
+        
+        Args:
+            resource_ids: Changed resources, or None to drop every cached search
+            
+        Returns:
+            Number of cached searches dropped from SQLite
+        """
+        if not self.search_cache_ttl or (resource_ids is not None and not resource_ids):
+            return 0
+        loop = asyncio.get_event_loop()
+        try:
+            dropped = await loop.run_in_executor(thread_pool, self.cache.invalidate_search_results, resource_ids)
+        except Exception as e:
+            logger.error(f"Failed to invalidate cached searches: {e}")
+            dropped = 0
+        if self.redis_cache and self.redis_cache.enabled:
+            await self.redis_cache.delete_search_results(resource_ids)
+        search_result_cache_invalidations.labels(scope='all' if resource_ids is None else 'resources').inc(dropped)
+        return dropped
+        
+    async def _hydrate_results(self, resource_ids: List[int]) -> List[Dict[str, Any]]:
+        """
+        Resolve an ordered list of resource IDs to full resource data
+        
+        Everything is resolved in batches (see get_resources_async); the order is kept.
+        """
+        resource_ids = [int(rid) for rid in resource_ids if rid is not None]
+        resources = await self.get_resources_async(resource_ids)
+        return [resources[rid] for rid in resource_ids if rid in resources]
+        
+    async def get_resources_async(self, resource_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Resolve a set of resource IDs tier by tier: L1, Redis, SQLite, then the API
+        
+        Each tier is asked once, for whatever the tiers before it missed. L1 and Redis
+        only count as hits when they hold the full record, so results keep the SQLite
+        shape (resources fetched just now keep the API shape unless full records are on).
+        SQLite hits are written back to L1 and Redis, again in one batch.
+        
+        Returns:
+            Dict of resource_id -> resource data for every ID that could be resolved
+        """
+        pending = list(dict.fromkeys(int(rid) for rid in resource_ids if rid is not None))
+        loop = asyncio.get_event_loop()
+        resolved: Dict[int, Dict[str, Any]] = {}
+        
+        if pending and self.l1_cache is not None:
+            for resource_id in pending:
+                resource = self.l1_cache.get(resource_id)
+                if resource and _is_hydrated(resource):
+                    resource.update({'_from_cache': True, '_from_l1': True})
+                    resolved[resource_id] = resource
+            cache_tier_lookups.labels(tier='l1', result='hit').inc(len(resolved))
+            cache_tier_lookups.labels(tier='l1', result='miss').inc(len(pending) - len(resolved))
+            pending = [rid for rid in pending if rid not in resolved]
+            
+        if pending and self.redis_cache and self.redis_cache.enabled:
+            records = await self.redis_cache.get_resources(pending)
+            floors = await loop.run_in_executor(thread_pool, self.cache.generation_floors)
+            hits = {rid: record for rid, record in records.items()
+                    if record.get('_full_record')
+                    and is_visible_generation(floors, record.get('generation'), record.get('resource_type'))}
+            self._refresh_early_if_due(hits)
+            for resource_id, resource in hits.items():
+                if self.l1_cache is not None:
+                    self.l1_cache.put(resource_id, resource)
+                # The cached file lives on this replica's disk, not in Redis
+                resource.update({'_from_cache': True, '_from_redis': True, 'cached_file': None})
+            cache_tier_lookups.labels(tier='l2', result='hit').inc(len(hits))
+            cache_tier_lookups.labels(tier='l2', result='miss').inc(len(pending) - len(hits))
+            resolved.update(hits)
+            pending = [rid for rid in pending if rid not in hits]
+            
+        if resolved:
+            # SQLite counts its own hits below
+            self.cache.access_tracker.record(list(resolved))
+            
+        if pending:
+            batch = pending
+            started = time.monotonic()
+            cached = await loop.run_in_executor(
+                thread_pool, lambda: self.cache.get_cached_resources(batch, allow_stale=True)
+            )
+            compute_seconds = (time.monotonic() - started) / max(len(cached), 1)
+            cache_tier_lookups.labels(tier='l3', result='hit').inc(len(cached))
+            cache_tier_lookups.labels(tier='l3', result='miss').inc(len(pending) - len(cached))
+            
+            fresh = {rid: resource for rid, resource in cached.items() if not resource.get('_stale')}
+            if self.l1_cache is not None:
+                for resource_id, resource in fresh.items():
+                    self.l1_cache.put(resource_id, resource)
+            if fresh and self.redis_cache and self.redis_cache.enabled:
+                await self._set_redis_many(fresh, compute_seconds)
+                
+            for resource in cached.values():
+                resource['_from_cache'] = True
+            stale = [rid for rid, resource in cached.items() if resource.get('_stale')]
+            if stale:
+                self._revalidate_in_background(stale)
+            resolved.update(cached)
+            pending = [rid for rid in pending if rid not in cached]
+            
+        self._maybe_flush_access_log()
+        if not pending:
+            return resolved
+            
+        # Fetch everything else from the API and store it in one bulk write
+        fetched = await self._ingest_resources(pending)
+        
+        # Whatever couldn't be fetched may still have an expired copy worth serving
+        unresolved = [rid for rid in pending if rid not in fetched]
+        if unresolved and self.cache.stale_if_error:
+            stale = await loop.run_in_executor(
+                thread_pool, lambda: self.cache.get_cached_resources(unresolved, stale_if_error=True)
+            )
+            for resource in stale.values():
+                resource.update({'_from_cache': True, '_stale': True, '_stale_if_error': True})
+            if stale:
+                stale_if_error_served.labels(kind='metadata').inc(len(stale))
+            fetched.update(stale)
+            
+        resolved.update(fetched)
+        return resolved
         
     def resource_view(self, resource_id: int, include_file: bool = True) -> Dict[str, Any]:
         """Get complete resource view data (sync)"""
@@ -352,17 +1098,212 @@ class ResourceSpaceWrapper:
             
         return view_data
         
+    def _maybe_flush_access_log(self):
+        """Start a background access log flush once the buffer is over its threshold"""
+        if not self.cache.access_tracker.should_flush():
+            return
+        if self._access_flush_task and not self._access_flush_task.done():
+            return
+        self._access_flush_task = asyncio.create_task(self.flush_access_log())
+        
+    async def flush_access_log(self):
+        """Write buffered access times to SQLite and hit counts to Redis"""
+        try:
+            loop = asyncio.get_event_loop()
+            batch = await loop.run_in_executor(thread_pool, self.cache.flush_access_log)
+            if batch and self.redis_cache and self.redis_cache.enabled:
+                await self.redis_cache.record_access_batch(batch)
+        except Exception as e:
+            logger.error(f"Failed to flush access log: {e}")
+            
+    async def get_file_range_async(self, resource_id: int, first_byte: int, last_byte: int,
+                                   file_extension: Optional[str] = None) -> Optional[Tuple[str, int, bool]]:
+        """
+        Cache just the chunks of an original needed for a byte range
+        
+        Returns:
+            Tuple of (path, total file size, whether the whole file is cached) or None
+        """
+        loop = asyncio.get_event_loop()
+        if self.circuit_breaker.is_open:
+            # Only a fully cached original can be served without ResourceSpace
+            path = await loop.run_in_executor(thread_pool, self.cache.get_cached_file_path, resource_id)
+            if not path:
+                raise CircuitOpenError(self.circuit_breaker.name, self.circuit_breaker.retry_after())
+            return path, os.path.getsize(path), True
+            
+        return await loop.run_in_executor(
+            thread_pool,
+            self.cache.get_file_range,
+            resource_id,
+            first_byte,
+            last_byte,
+            file_extension
+        )
+        
+    async def refresh_changed_resources(self, resource_ids: List[int]) -> Dict[str, int]:
+        """
+        Bring the cached copies of resources that changed upstream up to date
+        
+        Only resources already cached are fetched; the rest are picked up on their next
+        miss. A resource that can't be refreshed is evicted rather than served out of date.
+        
+        Returns:
+            Dict with 'refreshed', 'unchanged', 'evicted' and 'uncached' counts
+            
+        Raises:
+            CircuitOpenError: ResourceSpace is unavailable; nothing was evicted
+        """
+        if self.circuit_breaker.is_open:
+            raise CircuitOpenError(self.circuit_breaker.name, self.circuit_breaker.retry_after())
+            
+        loop = asyncio.get_event_loop()
+        resource_ids = list(dict.fromkeys(int(rid) for rid in resource_ids))
+        validators = await loop.run_in_executor(thread_pool, self.cache.get_validators, resource_ids)
+        cached_ids = [rid for rid in resource_ids if rid in validators]
+        if not cached_ids:
+            return {'refreshed': 0, 'unchanged': 0, 'evicted': 0, 'uncached': len(resource_ids)}
+            
+        fetched = await self._ingest_resources(cached_ids)
+        unchanged = [rid for rid, data in fetched.items() if data.get('_from_cache')]
+        refreshed = [rid for rid, data in fetched.items() if not data.get('_from_cache')]
+        failed = [rid for rid in cached_ids if rid not in fetched]
+        
+        if failed and self.circuit_breaker.state != 'closed':
+            # Failures caused by an outage: keep the entries and let the next run retry
+            raise CircuitOpenError(self.circuit_breaker.name, self.circuit_breaker.retry_after())
+            
+        # Without a checksum RS can't tell us whether the original changed along with the metadata
+        no_checksum = [rid for rid in refreshed if not fetched[rid].get('file_checksum')]
+        if no_checksum:
+            await loop.run_in_executor(thread_pool, self.cache.drop_cached_files, no_checksum)
+            
+        if failed:
+            await self.evict_resources(failed)
+            
+        return {
+            'refreshed': len(refreshed),
+            'unchanged': len(unchanged),
+            'evicted': len(failed),
+            'uncached': len(resource_ids) - len(cached_ids)
+        }
+        
+    async def evict_resource(self, resource_id: int) -> bool:
+        """Drop a resource from every tier, including any cached refusal"""
+        loop = asyncio.get_event_loop()
+        removed = await loop.run_in_executor(thread_pool, self.cache.evict_resource, resource_id)
+        self._invalidate_l1([resource_id])
+        await self.invalidate_search_results([resource_id])
+        if self.redis_cache and self.redis_cache.enabled:
+            await self.redis_cache.delete_resource(resource_id)
+        return removed
+        
+    async def invalidate_generation(self, resource_type: Optional[int] = None) -> int:
+        """
+        Hide every cached resource (or every one of a type) from reads at once
+        
+        Returns:
+            The new generation
+        """
+        loop = asyncio.get_event_loop()
+        generation = await loop.run_in_executor(thread_pool, self.cache.bump_generation, resource_type)
+        await self._invalidate_all_copies()
+        return generation
+        
+    async def expire_all(self) -> int:
+        """
+        Expire every cached resource so each revalidates on its next read
+        
+        Returns:
+            Number of entries expired
+        """
+        loop = asyncio.get_event_loop()
+        expired = await loop.run_in_executor(thread_pool, self.cache.expire_all)
+        await self._invalidate_all_copies()
+        return expired
+        
+    async def _invalidate_all_copies(self):
+        """Empty the L1 cache and cached searches, here and on every other replica"""
+        await self.invalidate_search_results()
+        if self.l1_cache is not None:
+            self.l1_cache.clear()
+        if self.redis_cache and self.redis_cache.enabled:
+            await self.redis_cache.publish_invalidation(None)
+        
+    async def sweep_old_generations(self, batch_size: int = 500, max_batches: int = 20) -> Dict[str, int]:
+        """Reclaim space held by resources hidden by a generation bump"""
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            thread_pool, self.cache.sweep_old_generations, batch_size, max_batches
+        )
+        
+    async def evict_resources(self, resource_ids: List[int]) -> int:
+        """Drop a set of resources from every tier with one SQLite transaction and one Redis call"""
+        if not resource_ids:
+            return 0
+        loop = asyncio.get_event_loop()
+        removed = await loop.run_in_executor(thread_pool, self.cache.evict_resources, resource_ids)
+        self._invalidate_l1(resource_ids)
+        await self.invalidate_search_results(resource_ids)
+        if self.redis_cache and self.redis_cache.enabled:
+            await self.redis_cache.delete_resources(resource_ids)
+        return removed
+        
+    async def apply_resource_changes(self, evict_ids: List[int], refresh_ids: List[int],
+                                     file_changed_ids: List[int]) -> Dict[str, int]:
+        """
+        Apply a batch of upstream change notifications across every tier
+        
+        Args:
+            evict_ids: Resources deleted upstream, or newly created (clears cached refusals)
+            refresh_ids: Resources whose metadata changed
+            file_changed_ids: Resources with a new original; their cached files are dropped
+            
+        Returns:
+            Dict of counts per action taken
+        """
+        loop = asyncio.get_event_loop()
+        stats = {'evicted': 0, 'files_dropped': 0}
+        
+        if evict_ids:
+            await self.evict_resources(evict_ids)
+            stats['evicted'] = len(evict_ids)
+        if file_changed_ids:
+            stats['files_dropped'] = await loop.run_in_executor(
+                thread_pool, self.cache.drop_cached_files, file_changed_ids
+            )
+        if refresh_ids:
+            try:
+                stats.update(await self.refresh_changed_resources(refresh_ids))
+            except CircuitOpenError:
+                # Can't refresh now: expire the entries so they revalidate once RS is back,
+                # and stop Redis serving the old copy meanwhile
+                stats['expired'] = await loop.run_in_executor(
+                    thread_pool, self.cache.expire_resources, refresh_ids
+                )
+                self._invalidate_l1(refresh_ids)
+                await self.invalidate_search_results(refresh_ids)
+                if self.redis_cache and self.redis_cache.enabled:
+                    await self.redis_cache.delete_resources(refresh_ids)
+        return stats
+        
     def cleanup_cache(self, force: bool = False, max_cache_size_mb: Optional[int] = None) -> Dict[str, Any]:
         """Clean up expired cache entries"""
         # Pass max cache size to eviction if provided
         if max_cache_size_mb:
             self.cache.evict_cached_files(force=force, max_cache_size_mb=max_cache_size_mb)
-        return self.cache.evict_stale_entries(force=force)
+        stats = self.cache.evict_stale_entries(force=force)
+        self.cache.optimize_search_index()
+        return stats
         
     def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         return self.cache.get_cache_stats()
         
+    def get_resource_count(self) -> int:
+        """Number of cached resources (cheap enough for health checks)"""
+        return self.cache.resource_count()
+        
     def prefetch_resources(self, resource_ids: List[int], include_files: bool = False):
         """Prefetch multiple resources into cache"""
         logger.info(f"Prefetching {len(resource_ids)} resources...")
@@ -373,6 +1314,30 @@ class ResourceSpaceWrapper:
             except Exception as e:
                 logger.error(f"Failed to prefetch resource {resource_id}: {e}")
                 
+    async def prefetch_resources_async(self, resource_ids: List[int], include_files: bool = False):
+        """Prefetch multiple resources into cache using bulk ingestion"""
+        logger.info(f"Prefetching {len(resource_ids)} resources...")
+        loop = asyncio.get_event_loop()
+        
+        missing = await loop.run_in_executor(thread_pool, self.cache.get_uncached_ids, resource_ids)
+        batch_size = self.cache.store_batch_size
+        for i in range(0, len(missing), batch_size):
+            stored = await self._ingest_resources(missing[i:i + batch_size])
+            logger.info(f"Prefetched {len(stored)} resources ({i + len(stored)}/{len(missing)} missing)")
+            
+        if include_files:
+            for resource_id in resource_ids:
+                try:
+                    await self.fetch_file_async(resource_id)
+                except Exception as e:
+                    logger.error(f"Failed to prefetch file for resource {resource_id}: {e}")
+                
     async def close(self):
-        """Close async client"""
-        await self.client.aclose()
\ No newline at end of file
+        """Close async client and pooled database connections"""
+        if self._revalidating:
+            await asyncio.gather(*set(self._revalidating.values()), return_exceptions=True)
+        if self._refreshing_early:
+            await asyncio.gather(*set(self._refreshing_early.values()), return_exceptions=True)
+        await self.flush_access_log()
+        await self.client.aclose()
+        self.cache.close()
\ No newline at end of file
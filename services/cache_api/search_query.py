@@ -0,0 +1,105 @@
+"""
+Translate user search strings into SQLite FTS5 MATCH expressions
+Supports bare words, prefix (word*), "quoted phrases", AND/OR/NOT, -exclusions and parentheses
+"""
+
+import re
+import json
+import hashlib
+from typing import List, Optional
+
+# Quoted phrase (optionally prefixed), parenthesis, or run of non-space characters
+_TOKEN_RE = re.compile(r'-?"[^"]*"\*?|[()]|[^\s()]+')
+
+_OPERATORS = {'AND', 'OR', 'NOT'}
+
+# ResourceSpace special searches (!collection12, field:value, @@ranges...) can't be answered locally
+_UNSUPPORTED_RE = re.compile(r'^!|:|@@')
+
+
+def _quote(term: str) -> str:
+    """Quote a term so FTS5 treats punctuation as text, not syntax"""
+    return '"' + term.replace('"', '') + '"'
+
+
+def build_fts_query(search: str) -> Optional[str]:
+    """
+    Build an FTS5 MATCH expression for a search string
+
+    Args:
+        search: User search string
+
+    Returns:
+        MATCH expression, or None if the query is empty or uses syntax the local index can't answer
+    """
+    if not search or not search.strip():
+        return None
+
+    parts: List[str] = []
+    depth = 0
+    expect_operand = True
+
+    for token in _TOKEN_RE.findall(search.replace(',', ' ')):
+        if token == '(':
+            if not expect_operand:
+                parts.append('AND')
+            parts.append(token)
+            depth += 1
+            continue
+
+        if token == ')':
+            if depth == 0 or expect_operand:
+                return None
+            parts.append(token)
+            depth -= 1
+            continue
+
+        if token in _OPERATORS:
+            if expect_operand:
+                return None
+            parts.append(token)
+            expect_operand = True
+            continue
+
+        negated = token.startswith('-') and len(token) > 1
+        if negated:
+            token = token[1:]
+            # FTS5 NOT is binary, so an exclusion needs something on its left
+            if not parts or expect_operand:
+                return None
+
+        if _UNSUPPORTED_RE.search(token):
+            return None
+
+        prefix = token.endswith('*')
+        term = token.rstrip('*').strip('"') if token.startswith('"') else token.rstrip('*')
+        if not term.strip():
+            continue
+
+        if negated:
+            parts.append('NOT')
+        elif not expect_operand:
+            parts.append('AND')
+        parts.append(_quote(term) + ('*' if prefix else ''))
+        expect_operand = False
+
+    if depth != 0 or expect_operand:
+        return None
+
+    return ' '.join(parts)
+
+
+def normalize_query(search: str) -> str:
+    """
+    Canonical form of a search string for caching: collapsed whitespace, lowercase terms
+
+    Operators keep their case, since lowercase and/or/not are plain words.
+    """
+    return ' '.join(token if token in _OPERATORS else token.lower() for token in search.split())
+
+
+def search_cache_key(search: str, resource_types: Optional[List[int]] = None,
+                     sort: str = 'relevance', limit: int = 100) -> str:
+    """Key identifying one result list: normalized query, resource types, sort and limit"""
+    parts = [normalize_query(search), sorted(set(resource_types or [])), sort, limit]
+    return hashlib.sha256(json.dumps(parts).encode()).hexdigest()[:32]
@@ -0,0 +1,115 @@
+"""
+Request coalescing for cache misses
+Concurrent callers asking for the same resource and operation share one upstream fetch
+"""
+
+import asyncio
+import time
+import uuid
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from metrics import singleflight_requests, upstream_calls_saved
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    In-process singleflight keyed by (operation, resource_id)
+
+    With a Redis cache, the leader also takes a short Redis lock so other replicas
+    wait for its result instead of fetching the same resource themselves.
+    """
+
+    def __init__(self, redis_cache=None, lock_timeout: int = 30,
+                 poll_interval: float = 0.05, max_poll_interval: float = 0.5):
+        """
+        Initialize the coalescer
+
+        Args:
+            redis_cache: Optional RedisCache used for cross-replica locks
+            lock_timeout: Seconds a Redis lock is held at most (and how long followers wait)
+            poll_interval: First delay between checks for another replica's result
+            max_poll_interval: Upper bound for the backed-off polling delay
+        """
+        self.redis_cache = redis_cache
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self._inflight: Dict[Tuple[str, int], asyncio.Future] = {}
+
+    @property
+    def inflight_count(self) -> int:
+        """Number of fetches currently running"""
+        return len(self._inflight)
+
+    async def do(self, operation: str, resource_id: int,
+                 fetch: Callable[[], Awaitable[Any]],
+                 wait_for: Optional[Callable[[], Awaitable[Any]]] = None) -> Any:
+        """
+        Run fetch once for all concurrent callers with the same key
+
+        Args:
+            operation: Kind of fetch ('metadata', 'file', ...)
+            resource_id: Resource ID
+            fetch: Coroutine factory doing the upstream work
+            wait_for: Optional coroutine factory that returns the result once another
+                replica has stored it (or None); enables the Redis-lock variant
+
+        Returns:
+            Whatever fetch returned (the same object for every caller)
+        """
+        key = (operation, resource_id)
+        task = self._inflight.get(key)
+
+        if task is None:
+            task = asyncio.ensure_future(self._run(operation, resource_id, fetch, wait_for))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            singleflight_requests.labels(operation=operation, role='leader').inc()
+        else:
+            singleflight_requests.labels(operation=operation, role='follower').inc()
+            upstream_calls_saved.labels(operation=operation).inc()
+
+        # Shield so one caller giving up doesn't cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Tuple[str, int], task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller was cancelled
+            task.exception()
+
+    async def _run(self, operation: str, resource_id: int,
+                   fetch: Callable[[], Awaitable[Any]],
+                   wait_for: Optional[Callable[[], Awaitable[Any]]]) -> Any:
+        if wait_for is None or not self.redis_cache or not self.redis_cache.enabled:
+            return await fetch()
+
+        token = uuid.uuid4().hex
+        if await self.redis_cache.acquire_lock(resource_id, timeout=self.lock_timeout,
+                                               scope=operation, token=token):
+            try:
+                return await fetch()
+            finally:
+                await self.redis_cache.release_lock(resource_id, scope=operation, token=token)
+
+        # Another replica holds the lock: wait for its result to reach the shared cache
+        deadline = time.monotonic() + self.lock_timeout
+        delay = self.poll_interval
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            result = await wait_for()
+            if result is not None:
+                singleflight_requests.labels(operation=operation, role='remote').inc()
+                upstream_calls_saved.labels(operation=operation).inc()
+                return result
+            if not await self.redis_cache.lock_exists(resource_id, scope=operation):
+                # The other replica finished without producing a result (or died)
+                break
+            delay = min(delay * 2, self.max_poll_interval)
+
+        logger.info(f"No shared {operation} result for resource {resource_id}, fetching locally")
+        return await fetch()